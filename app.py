@@ -7,8 +7,10 @@ import os
 # Añadir el directorio raíz al path
 sys.path.append(str(Path(__file__).parent))
 
-from config.settings import CONFIGURACION, COLORES
-from utils.data_loader import cargar_datos, validar_archivos
+from config.settings import COLORES
+from utils.streamlit_adaptadores import activar_streamlit, ejercicio_sesion
+from utils.data_loader import validar_archivos, ejercicio_configurado
+from utils.almacen_ejercicios import cargar_almacen, datos_ejercicio, ejercicios_disponibles
 
 # Configuración de la página
 st.set_page_config(
@@ -18,6 +20,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+activar_streamlit()
+
 # CSS personalizado
 st.markdown(f"""
     <style>
@@ -58,20 +62,33 @@ def hay_datos_por_defecto() -> bool:
     return all(ruta.exists() for ruta in RUTAS_DEFAULT.values())
 
 
+def activar_ejercicio(almacen, ejercicio):
+    """Deriva del almacén los datos del ejercicio y los deja activos en session_state."""
+    datos = datos_ejercicio(almacen, ejercicio)
+    st.session_state['datos'] = datos
+    st.session_state['validacion'] = validar_archivos(datos)
+    # Solo en la sesión: CONFIGURACION es común a todas las sesiones del servidor
+    st.session_state['ejercicio_seleccionado'] = ejercicio
+    # Los análisis precalculados corresponden al ejercicio anterior
+    st.session_state.pop('analisis', None)
+
+
 def procesar_archivos(archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados, origen: str):
-    """Carga, valida y guarda los datos en session_state."""
+    """Carga todos los ejercicios, valida el auditado y guarda los datos en session_state."""
     with st.spinner("Procesando archivos..."):
         try:
-            datos = cargar_datos(
+            almacen = cargar_almacen(
                 archivo_rcf,
                 archivo_face,
                 archivo_anulaciones,
                 archivo_estados
             )
-            validacion = validar_archivos(datos)
+            ejercicio = ejercicio_configurado()
+            activar_ejercicio(almacen, int(float(ejercicio)) if ejercicio else None)
 
-            st.session_state['datos'] = datos
-            st.session_state['validacion'] = validacion
+            st.session_state['almacen'] = almacen
+            # Para releer con todas las columnas al exportar el RCF completo
+            st.session_state['archivos_origen'] = (archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados)
             st.session_state['datos_procesados'] = True
             st.session_state['origen_datos'] = origen
 
@@ -81,6 +98,24 @@ def procesar_archivos(archivo_rcf, archivo_face, archivo_anulaciones, archivo_es
             st.sidebar.error(f"❌ Error al procesar: {str(e)}")
 
 
+def selector_ejercicio():
+    """Permite cambiar de ejercicio sin volver a leer los archivos."""
+    almacen = st.session_state.get('almacen')
+    if almacen is None:
+        return
+    ejercicios = ejercicios_disponibles(almacen)
+    actual = st.session_state.get('ejercicio_seleccionado')
+    if len(ejercicios) < 2 or actual not in ejercicios:
+        return
+    elegido = st.sidebar.selectbox(
+        "📅 Ejercicio auditado", ejercicios, index=ejercicios.index(actual),
+        help="Los archivos se leen una vez; al cambiar de ejercicio solo se vuelven a seleccionar las facturas"
+    )
+    if elegido != actual:
+        activar_ejercicio(almacen, elegido)
+        st.rerun()
+
+
 def main():
     # Título principal
     st.title("🏛️ Sistema de Auditoría de Facturas Electrónicas")
@@ -115,12 +150,13 @@ def main():
     if st.session_state.get('datos_procesados'):
         origen = st.session_state.get('origen_datos', 'manual')
         if origen == 'default':
-            st.sidebar.success("🏠 Usando datos por defecto (2025)")
+            st.sidebar.success(f"🏠 Usando datos por defecto ({ejercicio_sesion()})")
         else:
             st.sidebar.info("📤 Usando archivos subidos manualmente")
+        selector_ejercicio()
 
     def obtener_archivo_y_estado(clave, etiqueta, help_text):
-        archivo_subido = st.sidebar.file_uploader(etiqueta, type=['xlsx'], help=help_text)
+        archivo_subido = st.sidebar.file_uploader(etiqueta, type=['xlsx', 'csv', 'parquet'], help=help_text)
         ruta_local = RUTAS_DEFAULT[clave]
         existe_local = ruta_local.exists()
 
@@ -159,7 +195,8 @@ def main():
 
     with col_btn2:
         if st.button("🗑️ Inicializar", width="stretch", help="Limpia los datos cargados en memoria y vuelve al estado inicial"):
-            for key in ['datos', 'validacion', 'datos_procesados', 'origen_datos', 'intento_autocarga']:
+            for key in ['datos', 'validacion', 'datos_procesados', 'origen_datos', 'intento_autocarga',
+                        'almacen', 'archivos_origen', 'ejercicio_seleccionado', 'analisis']:
                 if key in st.session_state:
                     del st.session_state[key]
             st.rerun()
@@ -0,0 +1,153 @@
+"""
+Ejecución de la auditoría completa sin Streamlit, para lanzamientos programados.
+
+Carga los cuatro archivos de entrada, calcula todos los análisis (papel, anotación,
+validaciones, tramitación, obligaciones y morosidad) y genera los informes Word y
+PDF y un Excel con las tablas de resultados. No importa Streamlit.
+
+Uso:
+    python -m auditoria_cli --datos datos --ejercicio 2025 --salida informes
+    python -m auditoria_cli --rcf rcf.xlsx --face face.xlsx --anulaciones anul.xlsx \\
+        --estados estados.xlsx --formatos word excel --anexos
+    python -m auditoria_cli --por-entidad --procesos 4
+
+Con --por-entidad se genera un juego de informes por cada entidad del RCF y otro
+consolidado, repartidos en un pool de procesos (ver utils/lote_entidades.py).
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent))
+
+from config.settings import CONFIGURACION
+from utils.data_loader import cargar_datos, validar_archivos, exportar_resultados_excel, comprobar_esquemas
+from utils.analisis import precalcular_analisis_faltantes
+from utils.ciclo_vida import ejercicio_auditado
+
+# Nombres de los archivos de entrada dentro de --datos
+ARCHIVOS_POR_DEFECTO = {
+    'rcf': '1-ftras-RCF.xlsx',
+    'face': '2-Ftras FACe.xlsx',
+    'anulaciones': '3-Anulacion de ftras.xlsx',
+    'estados': '4-Cambio de estado de facturas.xlsx',
+}
+
+FORMATOS = ('word', 'pdf', 'excel')
+
+
+def _argumentos(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='python -m auditoria_cli',
+        description='Auditoría del Registro Contable de Facturas sin interfaz gráfica.',
+    )
+    parser.add_argument('--datos', type=Path, default=Path('datos'),
+                        help='Directorio con los archivos de entrada (nombres por defecto)')
+    for clave, archivo in ARCHIVOS_POR_DEFECTO.items():
+        parser.add_argument(f'--{clave}', type=Path, help=f'Archivo {clave} (por defecto <datos>/{archivo})')
+    parser.add_argument('--ejercicio', help='Ejercicio auditado (por defecto el de la configuración)')
+    parser.add_argument('--fecha-corte', help='Fecha de corte del análisis de obligaciones (AAAA-MM-DD)')
+    parser.add_argument('--salida', type=Path, default=Path('informes'), help='Directorio de salida')
+    parser.add_argument('--formatos', nargs='+', choices=FORMATOS, default=list(FORMATOS))
+    parser.add_argument('--anexos', action='store_true', help='Incluir los anexos con las relaciones completas')
+    parser.add_argument('--procesos', type=int,
+                        help='Procesos para generar las secciones del informe (o las entidades con --por-entidad)')
+    parser.add_argument('--por-entidad', action='store_true',
+                        help='Auditar cada entidad por separado, además del consolidado')
+    parser.add_argument('--entidades', nargs='+', help='Con --por-entidad, limitar a estas entidades')
+    parser.add_argument('--almacen', type=Path, nargs='?', const=Path(CONFIGURACION['directorio_almacen']),
+                        help='Reutilizar (o crear) el almacén de ejercicios de este directorio en lugar de '
+                             'volver a leer los Excel')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _argumentos(argv)
+    inicio = time.perf_counter()
+
+    archivos = {clave: getattr(args, clave) or args.datos / archivo for clave, archivo in ARCHIVOS_POR_DEFECTO.items()}
+    faltan = [str(ruta) for ruta in archivos.values() if not ruta.exists()]
+    if faltan:
+        print(f"No se encuentran los archivos: {', '.join(faltan)}", file=sys.stderr)
+        return 2
+
+    comprobacion = comprobar_esquemas(archivos)
+    if not comprobacion['valido']:
+        for error in comprobacion['errores']:
+            print(f"  Error: {error}", file=sys.stderr)
+        return 1
+
+    ejercicio = ejercicio_auditado(args.ejercicio)
+
+    print(f"Cargando datos del ejercicio {ejercicio}...")
+    if args.almacen:
+        from utils.almacen_ejercicios import almacen_desde_archivos, datos_ejercicio
+        from utils.notificaciones import notificar_stderr
+
+        almacen = almacen_desde_archivos(archivos['rcf'], archivos['face'], archivos['anulaciones'],
+                                         archivos['estados'], args.almacen, notificar_stderr)
+        datos = datos_ejercicio(almacen, ejercicio)
+    else:
+        datos = cargar_datos(
+            archivos['rcf'], archivos['face'], archivos['anulaciones'], archivos['estados'],
+            ejercicio_auditado=ejercicio,
+        )
+    validacion = validar_archivos(datos)
+    for aviso in validacion['warnings']:
+        print(f"  Aviso: {aviso}", file=sys.stderr)
+    if not validacion['valido']:
+        for error in validacion['errores']:
+            print(f"  Error: {error}", file=sys.stderr)
+        return 1
+    print(f"  {len(datos['rcf']):,} facturas RCF, {len(datos['face']):,} FACe, "
+          f"{len(datos['anulaciones']):,} anulaciones, {len(datos['estados']):,} cambios de estado")
+
+    fecha_corte = pd.Timestamp(args.fecha_corte) if args.fecha_corte else None
+
+    if args.por_entidad:
+        from utils.lote_entidades import auditar_entidades
+
+        print("Auditando por entidad...")
+        resumen = auditar_entidades(datos, args.salida, args.formatos, args.anexos, fecha_corte,
+                                    args.procesos, args.entidades, ejercicio=ejercicio)
+        for fila in resumen.to_dict('records'):
+            print(f"  {fila['Entidad']:<14} {fila['Facturas RCF']:>8,} facturas RCF  "
+                  f"{fila['Tiempo (s)']:>7.1f} s  {len(fila['Archivos'])} archivos")
+        print(f"Completado en {time.perf_counter() - inicio:.1f} s")
+        return 0
+
+    print("Calculando análisis...")
+    analisis = precalcular_analisis_faltantes(datos, {}, fecha_corte, ejercicio)
+
+    args.salida.mkdir(parents=True, exist_ok=True)
+    sufijo = f"{ejercicio}_{datetime.now().strftime('%Y%m%d')}"
+
+    informes = [f for f in args.formatos if f in ('word', 'pdf')]
+    if informes:
+        # Importación diferida: python-docx y reportlab solo si se generan informes
+        from utils.report_generator import generar_informes
+
+        print(f"Generando informes: {', '.join(informes)}...")
+        resultado = generar_informes(datos, analisis, tuple(informes), args.anexos, args.procesos, ejercicio)
+        nombres = {'word': f'Informe_Auditoria_RCF_{sufijo}.docx', 'pdf': f'Informe_Auditoria_RCF_Ejecutivo_{sufijo}.pdf'}
+        for formato in informes:
+            ruta = args.salida / nombres[formato]
+            ruta.write_bytes(resultado[formato])
+            print(f"  {ruta}")
+
+    if 'excel' in args.formatos:
+        ruta = args.salida / f'Resultados_Auditoria_RCF_{sufijo}.xlsx'
+        exportar_resultados_excel(analisis, ruta)
+        print(f"  {ruta}")
+
+    print(f"Completado en {time.perf_counter() - inicio:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Compara la exportación a Excel en flujo (utils/escritor_xlsx.py) con la anterior
+basada en pd.ExcelWriter (motor openpyxl) en función del número de filas.
+
+Cada medición se ejecuta en un proceso nuevo. El pico de memoria (RSS máximo)
+se reinicia justo antes de exportar, de modo que el incremento que se indica
+es el de la exportación sobre la memoria que ya ocupaba la relación de facturas.
+La exportación con openpyxl guarda el libro completo en memoria, por lo que por
+encima de LIMITE_OPENPYXL filas solo se mide con --openpyxl-completo.
+
+Uso:
+    python benchmark_exportacion_excel.py [filas ...] [--openpyxl-completo]
+"""
+
+import io
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent))
+
+from benchmark_informe_anexos import relacion_sintetica
+from utils.escritor_xlsx import escribir_xlsx
+
+TAMANOS_POR_DEFECTO = [10_000, 100_000, 1_000_000]
+LIMITE_OPENPYXL = 100_000
+
+
+def exportar_flujo(df: pd.DataFrame) -> bytes:
+    salida = io.BytesIO()
+    escribir_xlsx({'Datos': df}, salida)
+    return salida.getvalue()
+
+
+def exportar_openpyxl(df: pd.DataFrame) -> bytes:
+    salida = io.BytesIO()
+    with pd.ExcelWriter(salida, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='Datos')
+    return salida.getvalue()
+
+
+MODOS = {'flujo': exportar_flujo, 'openpyxl': exportar_openpyxl}
+
+
+def _memoria_mb(campo: str) -> float:
+    """VmRSS (actual) o VmHWM (pico) del proceso; fuera de Linux, el pico de getrusage."""
+    try:
+        with open('/proc/self/status') as estado:
+            for linea in estado:
+                if linea.startswith(campo + ':'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource  # no existe en Windows
+    except ImportError:
+        return float('nan')
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _reiniciar_pico() -> None:
+    try:
+        with open('/proc/self/clear_refs', 'w') as refs:
+            refs.write('5')
+    except OSError:
+        pass
+
+
+def _medir(modo: str, n: int):
+    df = relacion_sintetica(n)
+    base = _memoria_mb('VmRSS')
+    _reiniciar_pico()
+    inicio = time.perf_counter()
+    contenido = MODOS[modo](df)
+    segundos = time.perf_counter() - inicio
+    pico = _memoria_mb('VmHWM')
+    return segundos, len(contenido), pico, pico - base
+
+
+def medir(modo: str, n: int):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_medir, (modo, n))
+
+
+def main():
+    argumentos = sys.argv[1:]
+    openpyxl_completo = '--openpyxl-completo' in argumentos
+    tamanos = [int(x) for x in argumentos if x.isdigit()] or TAMANOS_POR_DEFECTO
+    print(f"{'Filas':>9} | {'Modo':<8} | {'Tiempo (s)':>10} | {'Tamaño (KB)':>11} | {'Pico RSS (MB)':>13} | {'Incremento (MB)':>15}")
+    print('-' * 83)
+    for n in tamanos:
+        for modo in MODOS:
+            if modo == 'openpyxl' and n > LIMITE_OPENPYXL and not openpyxl_completo:
+                print(f"{n:>9,} | {modo:<8} | {'omitido (ver --openpyxl-completo)':>45}")
+                continue
+            segundos, tamano, pico, incremento = medir(modo, n)
+            print(f"{n:>9,} | {modo:<8} | {segundos:>10.2f} | {tamano / 1024:>11,.0f} | {pico:>13,.0f} | {incremento:>15,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Mide el coste del modo anexos de los informes Word y PDF en función del número de filas.
+
+Para cada tamaño se sintetiza una relación de facturas con las columnas habituales
+del RCF y se genera un documento con esa relación como anexo:
+  - Word: escritura por bloques (guardar_con_tablas_diferidas) frente a insertar
+    la tabla completa en el árbol del documento (insertar_tabla).
+  - PDF: LongTable por páginas con anchos precalculados (tabla_pdf) frente a una
+    única Table con anchos automáticos (solo hasta LIMITE_PDF_TABLA_UNICA filas).
+Se registra el tiempo, el tamaño del archivo y el pico de memoria (tracemalloc).
+
+Uso:
+    python benchmark_informe_anexos.py [filas ...]
+"""
+
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from docx import Document
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+
+sys.path.append(str(Path(__file__).parent))
+
+from utils.docx_tablas import insertar_tabla, reservar_tabla, guardar_con_tablas_diferidas, formatear_columna
+from utils.pdf_tablas import tabla_pdf
+
+TAMANOS_POR_DEFECTO = [10_000, 50_000, 100_000]
+LIMITE_PDF_TABLA_UNICA = 20_000
+
+
+def relacion_sintetica(n: int, semilla: int = 0) -> pd.DataFrame:
+    """Relación de facturas con la forma de los detalles del informe."""
+    rng = np.random.default_rng(semilla)
+    fechas = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D')
+    return pd.DataFrame({
+        'entidad': rng.choice(['DIPUTACION', 'OPAEF', 'PRODETUR', 'SEVILLA ACTIVA'], n),
+        'id_fra_rcf': np.arange(1, n + 1),
+        'numero_factura': [f'F-{i:07d}' for i in range(n)],
+        'nif_emisor': [f'B{i % 99_999_999:08d}' for i in range(n)],
+        'razon_social': rng.choice(['SUMINISTROS DEL SUR SL', 'OBRAS Y SERVICIOS SA',
+                                    'CONSULTORA ANDALUZA SL', 'LIMPIEZAS SEVILLA SCA'], n),
+        'importe_total': rng.gamma(2.0, 800.0, n).round(2),
+        'fecha_emision': fechas,
+        'codigo_oc': rng.choice(['LA0002847', 'LA0002848', 'LA0002849'], n),
+    })
+
+
+def _documento_base() -> Document:
+    doc = Document()
+    doc.add_heading('9. ANEXOS', 1)
+    doc.add_heading('Anexo I. Relacion de facturas', 2)
+    return doc
+
+
+def generar_por_bloques(df: pd.DataFrame) -> bytes:
+    doc = _documento_base()
+    tablas = {}
+    reservar_tabla(doc, tablas, df)
+    return guardar_con_tablas_diferidas(doc, tablas)
+
+
+def generar_en_arbol(df: pd.DataFrame) -> bytes:
+    doc = _documento_base()
+    insertar_tabla(doc, df)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _construir_pdf(flowables: list) -> bytes:
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
+    doc.build(flowables)
+    return buffer.getvalue()
+
+
+def generar_pdf_por_bloques(df: pd.DataFrame) -> bytes:
+    return _construir_pdf(tabla_pdf(df))
+
+
+def generar_pdf_tabla_unica(df: pd.DataFrame) -> bytes:
+    filas = [list(df.columns)] + [list(fila) for fila in zip(*[formatear_columna(df[c]).tolist() for c in df.columns])]
+    tabla = Table(filas, repeatRows=1)
+    tabla.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 6.5),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCCCCC')),
+    ]))
+    return _construir_pdf([tabla])
+
+
+def medir(funcion, df: pd.DataFrame):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    contenido = funcion(df)
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return segundos, len(contenido), pico
+
+
+def main():
+    tamanos = [int(x) for x in sys.argv[1:]] or TAMANOS_POR_DEFECTO
+    print(f"{'Filas':>9} | {'Modo':<12} | {'Tiempo (s)':>10} | {'Tamaño (KB)':>11} | {'Pico mem. (MB)':>14}")
+    print('-' * 69)
+    for n in tamanos:
+        df = relacion_sintetica(n)
+        modos = [
+            ('docx bloques', generar_por_bloques),
+            ('docx arbol', generar_en_arbol),
+            ('pdf bloques', generar_pdf_por_bloques),
+        ]
+        if n <= LIMITE_PDF_TABLA_UNICA:
+            modos.append(('pdf tabla', generar_pdf_tabla_unica))
+        for modo, funcion in modos:
+            segundos, tamano, pico = medir(funcion, df)
+            print(f"{n:>9,} | {modo:<12} | {segundos:>10.2f} | {tamano / 1024:>11,.0f} | {pico / 1024**2:>14,.1f}")
+
+
+if __name__ == '__main__':
+    main()
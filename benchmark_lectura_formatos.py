@@ -0,0 +1,74 @@
+"""
+Mide la lectura de los archivos de entrada según su formato.
+
+Cada Excel de datos/ se convierte a CSV (como lo exporta SICAL: separador ';',
+coma decimal y fechas DD/MM/YYYY) y a Parquet en un directorio temporal, y se
+mide el tiempo de lectura con pd.read_excel y con utils.lectores.leer_tabla
+para cada formato. Al final se compara cargar_datos completo con los tres
+formatos.
+
+Uso:
+    python benchmark_lectura_formatos.py [directorio_datos]
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent))
+
+from utils.data_loader import cargar_datos
+from utils.lectores import leer_tabla
+
+ARCHIVOS = {
+    'rcf': '1-ftras-RCF.xlsx',
+    'face': '2-Ftras FACe.xlsx',
+    'anulaciones': '3-Anulacion de ftras.xlsx',
+    'estados': '4-Cambio de estado de facturas.xlsx',
+}
+
+
+def convertir(df: pd.DataFrame, destino: Path) -> dict:
+    """Escribe df como CSV y como Parquet junto a destino; devuelve {formato: ruta}."""
+    csv = destino.with_suffix('.csv')
+    df.to_csv(csv, sep=';', decimal=',', date_format='%d/%m/%Y %H:%M:%S', index=False)
+    parquet = destino.with_suffix('.parquet')
+    # Parquet exige un tipo por columna: las columnas mixtas de Excel se guardan como texto
+    mixtas = {col: df[col].astype(str).where(df[col].notna()) for col in df.columns if df[col].dtype == object}
+    df.assign(**mixtas).to_parquet(parquet)
+    return {'csv': csv, 'parquet': parquet}
+
+
+def medir(funcion, *args) -> float:
+    inicio = time.perf_counter()
+    funcion(*args)
+    return time.perf_counter() - inicio
+
+
+def main():
+    datos = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / 'datos'
+    with tempfile.TemporaryDirectory() as temporal:
+        rutas = {'xlsx': {}, 'csv': {}, 'parquet': {}}
+        print(f"{'Archivo':<12} | {'Filas':>7} | {'read_excel':>10} | {'xlsx':>7} | {'csv':>7} | {'parquet':>7}")
+        print('-' * 66)
+        for clave, nombre in ARCHIVOS.items():
+            origen = datos / nombre
+            df = leer_tabla(origen)
+            rutas['xlsx'][clave] = origen
+            for formato, ruta in convertir(df, Path(temporal) / clave).items():
+                rutas[formato][clave] = ruta
+            tiempos = [medir(pd.read_excel, origen)] + [medir(leer_tabla, rutas[f][clave]) for f in ('xlsx', 'csv', 'parquet')]
+            print(f"{clave:<12} | {len(df):>7,} | " + ' | '.join(f'{t:>{w}.2f}' for t, w in zip(tiempos, (10, 7, 7, 7))))
+
+        print()
+        silencio = lambda nivel, mensaje: None  # noqa: E731
+        for formato, archivos in rutas.items():
+            segundos = medir(lambda: cargar_datos(*archivos.values(), _notificar=silencio))
+            print(f"cargar_datos ({formato}): {segundos:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Comprueba el coste de importación de app.py y de cada página en un arranque en frío.
+
+Cada script se ejecuta en un proceso nuevo con `python -X importtime`, a través de
+streamlit.testing (AppTest), y se suma el tiempo de las importaciones que provoca
+el propio script, descontando las que hace cualquier página (Streamlit y pandas,
+medidas con una página vacía). Falla si:
+  - el tiempo de importación supera el presupuesto del modo, o
+  - se importa alguna librería pesada no permitida en ese modo.
+
+Modos:
+  - sin datos: primera visita, antes de cargar archivos (sin la autocarga de
+    datos/ de app.py). No debe importarse plotly.express, python-docx,
+    reportlab ni matplotlib.
+  - con datos (--con-datos): con los archivos de datos/ cargados; las páginas
+    dibujan sus gráficos (plotly.express, y matplotlib para los degradados de las tablas),
+    pero python-docx y reportlab solo deben importarse al generar un informe.
+
+Uso:
+    python comprobar_importaciones.py [--con-datos] [scripts ...]
+"""
+
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).parent
+sys.path.append(str(RAIZ))
+
+# Presupuesto de importación propio de cada script, en milisegundos
+PRESUPUESTO_MS = {'sin datos': 150, 'con datos': 1000}
+
+# Streamlit ya importa plotly.graph_objects al arrancar; lo costoso es plotly.express
+PESADAS = ('plotly.express', 'docx', 'reportlab', 'matplotlib')
+PROHIBIDAS = {
+    'sin datos': PESADAS,
+    'con datos': ('docx', 'reportlab'),
+}
+
+MARCA_INICIO = '@@inicio_script'
+MARCA_FIN = '@@fin_script'
+
+
+def scripts_por_defecto() -> list:
+    return [RAIZ / 'app.py'] + sorted((RAIZ / 'pages').glob('*.py'))
+
+
+def _ejecutar_hijo(script: str, archivo_datos: str = None) -> None:
+    """Proceso hijo: ejecuta el script con AppTest entre las dos marcas de stderr."""
+    from streamlit.testing.v1 import AppTest
+
+    datos = None
+    if archivo_datos:
+        with open(archivo_datos, 'rb') as f:
+            datos = pickle.load(f)
+
+    os.chdir(RAIZ)
+    print(MARCA_INICIO, file=sys.stderr, flush=True)
+    at = AppTest.from_file(script, default_timeout=300)
+    if datos is not None:
+        at.session_state['datos'] = datos
+    else:
+        at.session_state['intento_autocarga'] = True
+    at.run()
+    print(MARCA_FIN, file=sys.stderr, flush=True)
+
+    cargadas = sorted({nombre for nombre in PESADAS for modulo in sys.modules
+                       if modulo == nombre or modulo.startswith(nombre + '.')})
+    print(json.dumps({'excepciones': [str(e.value) for e in at.exception], 'pesadas': cargadas}))
+
+
+def _importaciones(stderr: str) -> dict:
+    """Tiempo acumulado (µs) de cada importación de primer nivel entre las marcas."""
+    importaciones, dentro = {}, False
+    for linea in stderr.splitlines():
+        if linea.startswith(MARCA_INICIO):
+            dentro = True
+        elif linea.startswith(MARCA_FIN):
+            break
+        elif dentro and linea.startswith('import time:') and 'cumulative' not in linea:
+            _, acumulado, nombre = linea.split('|')
+            # Las importaciones anidadas llevan sangría adicional
+            if len(nombre) - len(nombre.lstrip()) == 1:
+                importaciones[nombre.strip()] = int(acumulado)
+    return importaciones
+
+
+def medir(script: str, archivo_datos: str = None) -> dict:
+    comando = [sys.executable, '-X', 'importtime', str(Path(__file__).resolve()), '--hijo', str(script)]
+    if archivo_datos:
+        comando += ['--archivo-datos', archivo_datos]
+    proceso = subprocess.run(comando, capture_output=True, text=True, cwd=RAIZ)
+    if proceso.returncode != 0 or not proceso.stdout.strip():
+        raise RuntimeError(f"Error al ejecutar {script}:\n{proceso.stderr[-2000:]}")
+    resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+    resultado['importaciones'] = _importaciones(proceso.stderr)
+    return resultado
+
+
+def _guardar_datos_de_prueba(directorio: str) -> str:
+    """Carga los archivos por defecto de datos/ y los serializa para los procesos hijo."""
+    from auditoria_cli import ARCHIVOS_POR_DEFECTO
+    from utils.data_loader import cargar_datos
+
+    rutas = [RAIZ / 'datos' / archivo for archivo in ARCHIVOS_POR_DEFECTO.values()]
+    faltan = [str(r) for r in rutas if not r.exists()]
+    if faltan:
+        raise SystemExit(f"--con-datos necesita los archivos: {', '.join(faltan)}")
+    archivo = os.path.join(directorio, 'datos.pkl')
+    with open(archivo, 'wb') as f:
+        pickle.dump(cargar_datos(*rutas), f)
+    return archivo
+
+
+def comprobar(scripts: list, con_datos: bool) -> bool:
+    correcto = True
+    with tempfile.TemporaryDirectory() as directorio:
+        # Línea base: lo que importan Streamlit y pandas para una página cualquiera
+        vacia = Path(directorio) / 'pagina_vacia.py'
+        vacia.write_text("import streamlit as st\nimport pandas as pd\n"
+                         "st.set_page_config(page_icon='📊')\nst.write('')\n", encoding='utf-8')
+        medida_base = medir(vacia)
+        base = set(medida_base['importaciones'])
+
+        modos = [('sin datos', None)]
+        if con_datos:
+            modos.append(('con datos', _guardar_datos_de_prueba(directorio)))
+
+        print(f"{'Script':<32} | {'Modo':<9} | {'Import. (ms)':>12} | {'Presup.':>7} | {'Pesadas':<22} | Estado")
+        print('-' * 102)
+        for modo, archivo_datos in modos:
+            for script in scripts:
+                resultado = medir(script, archivo_datos)
+                propias = {m: us for m, us in resultado['importaciones'].items() if m not in base}
+                ms = sum(propias.values()) / 1000
+                pesadas = [m for m in resultado['pesadas'] if m not in medida_base['pesadas']]
+                prohibidas = [m for m in pesadas if m in PROHIBIDAS[modo]]
+                fallos = []
+                if ms > PRESUPUESTO_MS[modo]:
+                    fallos.append('presupuesto')
+                if prohibidas:
+                    fallos.append('importa ' + ', '.join(prohibidas))
+                if resultado['excepciones']:
+                    fallos.append('excepcion')
+                correcto &= not fallos
+                print(f"{Path(script).relative_to(RAIZ) if Path(script).is_absolute() else script!s:<32} | "
+                      f"{modo:<9} | {ms:>12,.0f} | {PRESUPUESTO_MS[modo]:>7,} | "
+                      f"{', '.join(pesadas) or '-':<22} | {'; '.join(fallos) or 'OK'}")
+                if fallos:
+                    mayores = sorted(propias.items(), key=lambda x: -x[1])[:5]
+                    print('    ' + ', '.join(f'{m} {us / 1000:,.0f} ms' for m, us in mayores))
+    return correcto
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Presupuesto de importación de app.py y las páginas.')
+    parser.add_argument('scripts', nargs='*', type=Path)
+    parser.add_argument('--con-datos', action='store_true', help='Medir también con los datos de datos/ cargados')
+    parser.add_argument('--hijo', help=argparse.SUPPRESS)
+    parser.add_argument('--archivo-datos', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        _ejecutar_hijo(args.hijo, args.archivo_datos)
+        return
+
+    scripts = [s.resolve() for s in args.scripts] or scripts_por_defecto()
+    sys.exit(0 if comprobar(scripts, args.con_datos) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,16 @@ CONFIGURACION = {
     'fecha_inicio_validaciones': '2025-01-01',
     'importe_minimo_obligatorio': 3000,
     'meses_alerta_morosidad': 3,
+    'plazo_legal_pago_dias': 30,
+    'tramos_antiguedad_dias': [30, 60, 90, 180],
+    'procesos_informe': None,  # procesos para renderizar secciones del informe (None = nº de CPU)
+    'procesos_lote': None,  # procesos para auditar las entidades en lote (None = nº de CPU)
+    'hilos_exportacion': None,  # archivos del ZIP de exportación generados a la vez (None = nº de CPU)
+    'columnas_completas': False,  # leer todas las columnas de los Excel (no solo las que usan los análisis)
+    'directorio_almacen': '.almacen_ejercicios',  # ejercicios particionados reutilizables (CLI --almacen)
+    'directorio_cache_informes': '.cache_informes',  # informes generados reutilizables
+    'max_informes_cache': 20,
+    'max_mb_cache_informes': 200,
 }
 
 # Colores corporativos
@@ -94,6 +104,25 @@ COLUMNAS_ESPERADAS = {
     ]
 }
 
+# Columnas sin las que no se puede cargar cada archivo (se comprueban en el
+# encabezado antes de leer el libro completo)
+COLUMNAS_OBLIGATORIAS = {
+    'rcf': ['fecha_emision', 'importe_total'],
+    'face': ['registro', 'fecha_registro'],
+    'anulaciones': ['registro', 'fecha_solicitud_anulacion'],
+    'estados': ['registro', 'codigo', 'insertado'],
+}
+
+# Formato de los archivos CSV de entrada (exportaciones de SICAL y FACe): una
+# columna se convierte a número o a fecha solo si todos sus valores lo son
+FORMATO_CSV = {
+    'decimal': ',',
+    'miles': '.',
+    'formatos_fecha': ['%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'],
+    'codificaciones': ['utf-8', 'cp1252'],  # se usa la primera que decodifica el inicio del archivo
+    'separadores': [';', ',', '\t', '|'],  # se elige el más frecuente en la línea de encabezados
+}
+
 # Parámetros de transición del ejercicio 2025
 # El ejercicio 2025 coexistieron dos procedimientos de anotación en el RCF:
 #   - Procedimiento anterior (S→F): hasta el 20 de octubre de 2025
@@ -4,9 +4,6 @@ Dashboard Ejecutivo - Vista general de todas las métricas
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import sys
 from pathlib import Path
 
@@ -14,7 +11,18 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config.settings import COLORES, COLORES_GRAFICOS, CONFIGURACION
-from utils.data_loader import filtrar_por_periodo, es_persona_juridica
+from utils.streamlit_adaptadores import activar_streamlit, ejercicio_sesion
+from utils.importacion_diferida import modulo_diferido, funcion_diferida
+from utils.filtros import indice_filtros, seleccionar_filas, oficinas_presentes
+from utils.nif import mascara_persona_juridica
+from utils.analisis import resumen_por_entidad, facturas_papel_por_area
+from utils.almacen_ejercicios import comparar_ejercicios, ejercicios_disponibles
+from utils.tablas_html import tabla_html
+
+# plotly se importa al dibujar el primer gráfico
+px = modulo_diferido('plotly.express')
+go = modulo_diferido('plotly.graph_objects')
+make_subplots = funcion_diferida('plotly.subplots', 'make_subplots')
 
 st.set_page_config(
     page_title="Dashboard - Auditoría RCF",
@@ -22,6 +30,24 @@ st.set_page_config(
     layout="wide"
 )
 
+activar_streamlit()
+
+# Cabecera agrupada del cuadro de distribución por entidad
+CABECERA_TABLA_ENTIDAD = """
+  <tr style="background:#1f4e79;color:white;text-align:center;">
+    <th rowspan="2" style="padding:8px;border:1px solid #888;text-align:left;">ENTIDAD</th>
+    <th rowspan="2" style="padding:8px;border:1px solid #888;">TOTAL</th>
+    <th colspan="2" style="padding:8px;border:1px solid #888;">PAPEL</th>
+    <th colspan="2" style="padding:8px;border:1px solid #888;">FACe</th>
+    <th rowspan="2" style="padding:8px;border:1px solid #888;">% Ftras.<br>Papel</th>
+  </tr>
+  <tr style="background:#2e75b6;color:white;text-align:center;">
+    <th style="padding:6px;border:1px solid #888;">Tramitadas</th>
+    <th style="padding:6px;border:1px solid #888;">Anuladas/<br>Rechazadas</th>
+    <th style="padding:6px;border:1px solid #888;">Tramitadas</th>
+    <th style="padding:6px;border:1px solid #888;">Anuladas/<br>Rechazadas</th>
+  </tr>"""
+
 # CSS personalizado
 st.markdown(f"""
     <style>
@@ -58,18 +84,22 @@ def main():
     
     datos = st.session_state['datos']
     
-    # Datos RCF filtrando BORRADAS para el análisis general
-    df_rcf = datos['rcf'].copy()
-    if 'estado' in df_rcf.columns:
-        df_rcf = df_rcf[df_rcf['estado'].astype(str).str.upper() != 'BORRADA'].copy()
+    # Datos RCF filtrando BORRADAS para el análisis general. El índice de
+    # filtrado (fechas ordenadas y códigos de oficina) se construye una vez por
+    # conjunto de datos; cada filtro devuelve posiciones de fila memoizadas.
+    indice = indice_filtros(datos['rcf'], 'fecha_anotacion_rcf', 'codigo_oc', excluir_estados=('BORRADA',))
+    df_rcf = datos['rcf'].take(indice['incluidas'])
 
     # Filtros
     st.sidebar.title("🔍 Filtros")
     
     # Filtro de fecha
+    # Para evitar perder registros sin fecha (como los 'PDTE DE ACEPTAR'),
+    # el filtro de fecha solo actúa si hay fecha.
+    fecha_inicio = fecha_fin = None
     if 'fecha_anotacion_rcf' in df_rcf.columns:
-        fecha_min = pd.to_datetime(df_rcf['fecha_anotacion_rcf']).min()
-        fecha_max = pd.to_datetime(df_rcf['fecha_anotacion_rcf']).max()
+        fecha_min = indice['fecha_min']
+        fecha_max = indice['fecha_max']
         
         fecha_inicio = st.sidebar.date_input(
             "Fecha inicio",
@@ -84,32 +114,18 @@ def main():
             min_value=fecha_min,
             max_value=fecha_max
         )
-        
-        # Aplicar filtro
-        # Para evitar perder registros sin fecha (como los 'PDTE DE ACEPTAR'),
-        # el filtro de fecha solo actúa si hay fecha.
-        df_con_fecha = df_rcf[df_rcf['fecha_anotacion_rcf'].notna()]
-        df_sin_fecha = df_rcf[df_rcf['fecha_anotacion_rcf'].isna()]
-        
-        df_filtrado_con = filtrar_por_periodo(
-            df_con_fecha,
-            'fecha_anotacion_rcf',
-            fecha_inicio,
-            fecha_fin
-        )
-        
-        # Unimos los filtrados por fecha con los que no tienen fecha (pero que pasaron el filtro de ejercicio)
-        df_filtrado = pd.concat([df_filtrado_con, df_sin_fecha]).drop_duplicates().copy()
-    else:
-        df_filtrado = df_rcf.copy()
+    
+    posiciones = seleccionar_filas(indice, fecha_inicio, fecha_fin)
     
     # Filtro por unidad
-    if 'codigo_oc' in df_filtrado.columns:
-        oficinas = ['Todas'] + sorted(df_filtrado['codigo_oc'].dropna().unique().tolist())
+    if 'codigo_oc' in df_rcf.columns:
+        oficinas = ['Todas'] + oficinas_presentes(indice, posiciones)
         oficina_sel = st.sidebar.selectbox("Oficina Contable", oficinas)
         
         if oficina_sel != 'Todas':
-            df_filtrado = df_filtrado[df_filtrado['codigo_oc'] == oficina_sel]
+            posiciones = seleccionar_filas(indice, fecha_inicio, fecha_fin, oficina_sel)
+    
+    df_filtrado = datos['rcf'].take(posiciones)
     
     # === MÉTRICAS PRINCIPALES ===
     st.markdown("### 📈 Métricas Principales")
@@ -300,23 +316,12 @@ def main():
     with col1:
         st.markdown("### 🏛️ Top 10 Áreas - Facturas en Papel")
 
-        # Buscar la columna ÁREA/UNIDAD/SERVICIO de forma flexible
-        _area_col_graf = None
-        for _c in df_filtrado.columns:
-            _cu = _c.upper().replace('Á', 'A').replace('É', 'E')
-            if any(kw in _cu for kw in ['AREA', 'UNIDAD', 'SERVICIO']):
-                _area_col_graf = _c
-                break
-
-        df_papel_graf = df_filtrado[df_filtrado['es_papel'] == True].copy()
-
-        if _area_col_graf and not df_papel_graf.empty:
-            df_papel_graf['_area'] = (
-                df_papel_graf[_area_col_graf]
-                .astype(str).str.strip()
-                .apply(lambda x: x[:2] if x and x.lower() not in ['nan', '', 'none'] else None)
-            )
-            top_area = df_papel_graf['_area'].dropna().value_counts().head(10)
+        # El código de área ('area_cod') se calcula al cargar los datos
+        df_papel_graf = df_filtrado[df_filtrado['es_papel'] == True]
+
+        if 'area_cod' in df_papel_graf.columns and not df_papel_graf.empty:
+            top_area = df_papel_graf['area_cod'].value_counts().loc[lambda conteo: conteo > 0].head(10)
+            top_area.index = top_area.index.astype(str)
 
             if not top_area.empty:
                 fig = px.bar(
@@ -378,7 +383,7 @@ def main():
             condicion_papel_alto &= (df_filtrado['tipo_persona'] == 'J')
         else:
             # Fallback a NIF
-            condicion_papel_alto &= (df_filtrado['nif_emisor'].apply(es_persona_juridica))
+            condicion_papel_alto &= mascara_persona_juridica(df_filtrado)
             
         # Excluir facturas RECHAZADAS o ANULADAS (para consistencia con Facturas Papel)
         if 'estado' in df_filtrado.columns:
@@ -432,12 +437,7 @@ def main():
     st.markdown("### 📜 Facturas de años anteriores registradas en el ejercicio")
     st.info("Estas facturas han sido registradas en el año auditado pero su fecha de expedición/emisión es de años anteriores.")
 
-    import toml
-    try:
-        config_toml = toml.load(str(Path(__file__).parent.parent / ".streamlit" / "config.toml"))
-        ejercicio_auditado = int(config_toml.get('auditoria', {}).get('ejercicio_auditado', 2025))
-    except:
-        ejercicio_auditado = 2025
+    ejercicio_auditado = ejercicio_sesion()
 
     if 'fecha_emision' in df_filtrado.columns and 'fecha_anotacion_rcf' in df_filtrado.columns:
         # Una factura es de "años anteriores" si:
@@ -479,78 +479,53 @@ def main():
 
     _df_rcf_all = datos['rcf']
 
-    # Buscar la columna de área de forma flexible (el nombre puede variar por codificación)
-    _area_col = None
-    if 'area_unidad_servicio' in _df_rcf_all.columns and _df_rcf_all['area_unidad_servicio'].notna().any():
-        _area_col = 'area_unidad_servicio'
-    else:
-        for _c in _df_rcf_all.columns:
-            if any(kw in _c.upper().replace('Á', 'A').replace('É', 'E') for kw in ['AREA', 'UNIDAD', 'SERVICIO']):
-                _area_col = _c
-                break
-
-    if _area_col is None:
+    # La columna de área y su código ('area_cod') se resuelven al cargar los datos
+    if 'area_cod' not in _df_rcf_all.columns:
         st.info("La columna 'ÁREA/UNIDAD/SERVICIO' no está disponible en los datos del RCF.")
     elif 'entidad' not in _df_rcf_all.columns:
         st.info("La columna 'entidad' no está disponible en los datos del RCF.")
     else:
-        df_papel_diput = _df_rcf_all[
-            (_df_rcf_all['es_papel'] == True) &
-            (_df_rcf_all['entidad'].astype(str).str.upper().str.contains('DIPU', na=False))
-        ].copy()
-
-        df_papel_diput['_area_cod'] = (
-            df_papel_diput[_area_col]
-            .astype(str).str.strip()
-            .apply(lambda x: x[:2] if x and x.lower() not in ['nan', '', 'none'] else None)
-        )
-        df_con_area = df_papel_diput[df_papel_diput['_area_cod'].notna()].copy()
+        papel_por_area = facturas_papel_por_area(_df_rcf_all)
+        tabla_area = papel_por_area['tabla']
 
-        if df_con_area.empty:
+        if tabla_area.empty:
             st.info(
                 f"No hay facturas en papel con área asignada para esta entidad "
-                f"(total facturas en papel de DIPU: {len(df_papel_diput):,}, "
-                f"columna usada: '{_area_col}')."
+                f"(total facturas en papel de DIPU: {papel_por_area['total_papel']:,})."
             )
         else:
-            tabla_area = (
-                df_con_area.groupby('_area_cod')
-                .size()
-                .reset_index(name='Nº Facturas')
-                .rename(columns={'_area_cod': 'Área'})
-                .sort_values('Área')
-            )
             total_row = pd.DataFrame([{'Área': 'TOTAL', 'Nº Facturas': int(tabla_area['Nº Facturas'].sum())}])
             tabla_area_display = pd.concat([tabla_area, total_row], ignore_index=True)
 
-            def _html_tabla_area(df):
-                thead = """
-                <thead>
-                  <tr style="background:#1f4e79;color:white;text-align:center;">
-                    <th style="padding:8px;border:1px solid #888;text-align:left;">ÁREA</th>
-                    <th style="padding:8px;border:1px solid #888;">Nº FACTURAS EN PAPEL</th>
-                  </tr>
-                </thead>"""
-                rows = ""
-                for _, row in df.iterrows():
-                    bold = row['Área'] == 'TOTAL'
-                    fw = "font-weight:bold;" if bold else ""
-                    bg = "background:#dce6f1;" if bold else ""
-                    rows += (
-                        f'<tr style="{bg}">'
-                        f'<td style="padding:7px;border:1px solid #ddd;{fw}">{row["Área"]}</td>'
-                        f'<td style="padding:7px;border:1px solid #ddd;text-align:right;{fw}">{int(row["Nº Facturas"]):,}</td>'
-                        f'</tr>'
-                    )
-                return (
-                    '<table style="width:40%;border-collapse:collapse;font-size:14px;">'
-                    f'{thead}<tbody>{rows}</tbody></table>'
-                )
-
-            st.markdown(_html_tabla_area(tabla_area_display), unsafe_allow_html=True)
+            tabla_area_display = tabla_area_display.rename(columns={'Área': 'ÁREA', 'Nº Facturas': 'Nº FACTURAS EN PAPEL'})
+            st.markdown(
+                tabla_html(tabla_area_display, {'Nº FACTURAS EN PAPEL': 'entero'}, estilo='resumen', ancho='40%'),
+                unsafe_allow_html=True
+            )
 
     st.markdown("---")
 
+    # === COMPARATIVA INTERANUAL ===
+    almacen = st.session_state.get('almacen')
+    ejercicios = ejercicios_disponibles(almacen) if almacen is not None else []
+    if len(ejercicios) >= 2:
+        st.markdown("### 📆 Comparativa interanual")
+        st.caption("Indicadores del ejercicio completo (sin filtros), calculados a partir de los agregados de cada año.")
+        anteriores = [e for e in ejercicios if e != ejercicio_auditado]
+        referencia = st.selectbox("Comparar con el ejercicio", anteriores, key='ejercicio_referencia')
+        comparativa = comparar_ejercicios(almacen, ejercicio_auditado, referencia)
+        st.dataframe(
+            comparativa.style.format({
+                str(referencia): '{:,.2f}',
+                str(ejercicio_auditado): '{:,.2f}',
+                'Variacion': '{:+,.2f}',
+                'Variacion %': '{:+.1f}%',
+            }, na_rep='-'),
+            width="stretch",
+            hide_index=True
+        )
+        st.markdown("---")
+
     # === RESUMEN PARA INFORME ===
     st.markdown("### 📝 Resumen para el Informe de Auditoría")
     st.info(
@@ -614,87 +589,19 @@ def main():
     # --- Cuadro de desglose por entidad ---
     st.markdown("#### Distribución según las distintas entidades (eliminando las facturas rechazadas)")
     if 'entidad' in df_rcf_total.columns:
-        estados_neg = ['BORRADA', 'RECHAZADA', 'ANULADA']
-
-        def _fila_entidad(g):
-            papel = g[g['es_papel'] == True]
-            face  = g[g['es_papel'] == False]
-            papel_neg = papel['estado'].astype(str).str.upper().isin(estados_neg)
-            face_neg  = face['estado'].astype(str).str.upper().isin(estados_neg)
-            p_tram = int((~papel_neg).sum())
-            p_anul = int(papel_neg.sum())
-            f_tram = int((~face_neg).sum())
-            f_anul = int(face_neg.sum())
-            total  = p_tram + p_anul + f_tram + f_anul
-            porc   = (p_tram + p_anul) / total * 100 if total > 0 else 0
-            return pd.Series({
-                'Total':      total,
-                'Papel_Tram': p_tram,
-                'Papel_Anul': p_anul,
-                'Face_Tram':  f_tram,
-                'Face_Anul':  f_anul,
-                'Porc_Papel': porc,
-            })
-
-        tabla_entidad = (
-            df_rcf_total.groupby('entidad')
-            .apply(_fila_entidad)
-            .reset_index()
-            .rename(columns={'entidad': 'Entidad'})
-            .sort_values('Total', ascending=False)
+        tabla_display = resumen_por_entidad(df_rcf_total)
+
+        columnas_entidad = ['Entidad', 'Total', 'Papel_Tram', 'Papel_Anul', 'Face_Tram', 'Face_Anul', 'Porc_Papel']
+        st.markdown(
+            tabla_html(
+                tabla_display[columnas_entidad],
+                {**{col: 'entero' for col in columnas_entidad[1:-1]}, 'Porc_Papel': 'porcentaje'},
+                estilo='resumen',
+                negrita_total=['Entidad', 'Total', 'Porc_Papel'],
+                cabecera=CABECERA_TABLA_ENTIDAD
+            ),
+            unsafe_allow_html=True
         )
-
-        tot = {
-            'Entidad':    'Totales',
-            'Total':      int(tabla_entidad['Total'].sum()),
-            'Papel_Tram': int(tabla_entidad['Papel_Tram'].sum()),
-            'Papel_Anul': int(tabla_entidad['Papel_Anul'].sum()),
-            'Face_Tram':  int(tabla_entidad['Face_Tram'].sum()),
-            'Face_Anul':  int(tabla_entidad['Face_Anul'].sum()),
-        }
-        tot_papel = tot['Papel_Tram'] + tot['Papel_Anul']
-        tot['Porc_Papel'] = tot_papel / tot['Total'] * 100 if tot['Total'] > 0 else 0
-        tabla_display = pd.concat([tabla_entidad, pd.DataFrame([tot])], ignore_index=True)
-
-        def _html_tabla_entidad(df):
-            thead = """
-            <thead>
-              <tr style="background:#1f4e79;color:white;text-align:center;">
-                <th rowspan="2" style="padding:8px;border:1px solid #888;text-align:left;">ENTIDAD</th>
-                <th rowspan="2" style="padding:8px;border:1px solid #888;">TOTAL</th>
-                <th colspan="2" style="padding:8px;border:1px solid #888;">PAPEL</th>
-                <th colspan="2" style="padding:8px;border:1px solid #888;">FACe</th>
-                <th rowspan="2" style="padding:8px;border:1px solid #888;">% Ftras.<br>Papel</th>
-              </tr>
-              <tr style="background:#2e75b6;color:white;text-align:center;">
-                <th style="padding:6px;border:1px solid #888;">Tramitadas</th>
-                <th style="padding:6px;border:1px solid #888;">Anuladas/<br>Rechazadas</th>
-                <th style="padding:6px;border:1px solid #888;">Tramitadas</th>
-                <th style="padding:6px;border:1px solid #888;">Anuladas/<br>Rechazadas</th>
-              </tr>
-            </thead>"""
-            rows = ""
-            for _, row in df.iterrows():
-                bold = row['Entidad'] == 'Totales'
-                fw = "font-weight:bold;" if bold else ""
-                bg = "background:#dce6f1;" if bold else ""
-                rows += (
-                    f'<tr style="{bg}">'
-                    f'<td style="padding:7px;border:1px solid #ddd;{fw}">{row["Entidad"]}</td>'
-                    f'<td style="padding:7px;border:1px solid #ddd;text-align:right;{fw}">{int(row["Total"]):,}</td>'
-                    f'<td style="padding:7px;border:1px solid #ddd;text-align:right;">{int(row["Papel_Tram"]):,}</td>'
-                    f'<td style="padding:7px;border:1px solid #ddd;text-align:right;">{int(row["Papel_Anul"]):,}</td>'
-                    f'<td style="padding:7px;border:1px solid #ddd;text-align:right;">{int(row["Face_Tram"]):,}</td>'
-                    f'<td style="padding:7px;border:1px solid #ddd;text-align:right;">{int(row["Face_Anul"]):,}</td>'
-                    f'<td style="padding:7px;border:1px solid #ddd;text-align:right;{fw}">{row["Porc_Papel"]:.0f} %</td>'
-                    f'</tr>'
-                )
-            return (
-                '<table style="width:100%;border-collapse:collapse;font-size:14px;">'
-                f'{thead}<tbody>{rows}</tbody></table>'
-            )
-
-        st.markdown(_html_tabla_entidad(tabla_display), unsafe_allow_html=True)
     else:
         st.info("La columna 'entidad' no está disponible en los datos del RCF.")
 
@@ -716,7 +623,7 @@ def main():
     papel_tram_p = n_papel_all - papel_neg_p
 
     # --- Párrafo listo para copiar ---
-    ejercicio = CONFIGURACION.get('ejercicio_auditado', '2025')
+    ejercicio = ejercicio_sesion()
     frase_anuladas_face = (
         f" Adicionalmente, {n_face_anuladas:,} facturas registradas en FACe fueron anuladas "
         f"antes de su descarga al RCF."
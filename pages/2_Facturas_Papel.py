@@ -4,22 +4,26 @@ Análisis de Facturas en Papel - Sección V.1 de la Guía IGAE
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config.settings import COLORES, COLORES_GRAFICOS, CONFIGURACION
+from utils.streamlit_adaptadores import activar_streamlit, ejercicio_sesion
+from utils.importacion_diferida import modulo_diferido, funcion_diferida
 from utils.data_loader import (
     obtener_facturas_papel_sospechosas,
     exportar_a_excel,
-    es_persona_juridica,
     excluir_facturas_borradas,
     agregar_columna_entidad
 )
+from utils.nif import mascara_persona_juridica
+
+# plotly se importa al dibujar el primer gráfico
+px = modulo_diferido('plotly.express')
+go = modulo_diferido('plotly.graph_objects')
+make_subplots = funcion_diferida('plotly.subplots', 'make_subplots')
 
 st.set_page_config(
     page_title="Facturas en Papel - Auditoría RCF",
@@ -27,6 +31,8 @@ st.set_page_config(
     layout="wide"
 )
 
+activar_streamlit()
+
 def main():
     st.title("📄 Análisis de Facturas en Papel")
     st.markdown("Cumplimiento de la obligatoriedad de factura electrónica (Ley 25/2013)")
@@ -62,7 +68,7 @@ def main():
     st.markdown("### 📊 Resumen de Facturas en Papel")
     
     facturas_papel = df_rcf[df_rcf['es_papel'] == True].copy()
-    facturas_sospechosas = obtener_facturas_papel_sospechosas(df_rcf)
+    facturas_sospechosas = obtener_facturas_papel_sospechosas(df_rcf, ejercicio_sesion())
     tabla_sospechosas = pd.DataFrame()
     
     col1, col2, col3, col4 = st.columns(4)
@@ -101,7 +107,7 @@ def main():
             if tiene_j:
                 personas_juridicas = len(facturas_papel[facturas_papel['tipo_persona'] == 'J'])
             else:
-                personas_juridicas = len(facturas_papel[facturas_papel['nif_emisor'].apply(es_persona_juridica)])
+                personas_juridicas = len(facturas_papel[mascara_persona_juridica(facturas_papel)])
             
             st.metric(
                 "PJ en Papel",
@@ -109,7 +115,7 @@ def main():
                 help="Personas Jurídicas identificadas por tipo o NIF"
             )
         else:
-            personas_juridicas = len(facturas_papel[facturas_papel['nif_emisor'].apply(es_persona_juridica)])
+            personas_juridicas = len(facturas_papel[mascara_persona_juridica(facturas_papel)])
             st.metric("PJ en Papel", f"{personas_juridicas:,}", help="Identificadas por prefijo de NIF")
     
     st.markdown("---")
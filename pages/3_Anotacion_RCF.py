@@ -5,14 +5,14 @@ Ejercicio 2025: año de transición con dos procedimientos diferenciados.
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config.settings import COLORES, CONFIGURACION_TRANSICION_2025
+from utils.streamlit_adaptadores import activar_streamlit
+from utils.importacion_diferida import modulo_diferido
 from utils.data_loader import (
     clasificar_procedimiento,
     calcular_indicadores_procedimiento_anterior,
@@ -20,6 +20,11 @@ from utils.data_loader import (
     identificar_facturas_retenidas,
     exportar_a_excel,
 )
+from utils.tablas_html import tabla_html
+
+# plotly se importa al dibujar el primer gráfico
+px = modulo_diferido('plotly.express')
+go = modulo_diferido('plotly.graph_objects')
 
 st.set_page_config(
     page_title="Anotación RCF - Auditoría RCF",
@@ -27,6 +32,8 @@ st.set_page_config(
     layout="wide"
 )
 
+activar_streamlit()
+
 NOMBRES_MESES = {
     1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril',
     5: 'Mayo', 6: 'Junio', 7: 'Julio', 8: 'Agosto',
@@ -48,10 +55,6 @@ def _fmt_min(val):
     return f'{val:.0f} min'
 
 
-def _fmt_int(val):
-    return '—' if pd.isna(val) else f'{int(val):,}'
-
-
 def _alerta(codigo, condicion, mensaje):
     if condicion:
         st.error(f'**[{codigo}]** {mensaje}')
@@ -63,29 +66,13 @@ def _info_alerta(codigo, condicion, mensaje):
 
 
 # ---------------------------------------------------------------------------
-# Tabla HTML estilo informe
+# Tablas HTML estilo informe (utils/tablas_html.py)
 # ---------------------------------------------------------------------------
 
-def _html_tabla(filas, cabecera_cols, titulo_col_izq='', bold_ultima_fila=True):
-    th = 'background:#1f4e79;color:white;padding:7px 10px;border:1px solid #555;text-align:center;white-space:nowrap;'
-    th_lbl = 'background:#1f4e79;color:white;padding:7px 14px;border:1px solid #555;text-align:left;min-width:220px;'
-    td = 'padding:6px 10px;border:1px solid #ccc;text-align:center;'
-    td_lbl = 'padding:6px 14px;border:1px solid #ccc;text-align:left;font-size:13px;'
-
-    cols_html = ''.join(f'<th style="{th}">{c}</th>' for c in cabecera_cols)
-    thead = f'<thead><tr><th style="{th_lbl}">{titulo_col_izq}</th>{cols_html}</tr></thead>'
-
-    rows_html = ''
-    for i, (label, valores) in enumerate(filas):
-        is_last = bold_ultima_fila and i == len(filas) - 1
-        bg = 'background:#dce6f1;font-weight:bold;' if is_last else ('background:#f5f9ff;' if i % 2 == 0 else '')
-        celdas = ''.join(f'<td style="{td}{bg}">{v}</td>' for v in valores)
-        rows_html += f'<tr><td style="{td_lbl}{bg}">{label}</td>{celdas}</tr>'
-
-    return (
-        f'<table style="border-collapse:collapse;font-size:13px;width:100%;">'
-        f'{thead}<tbody>{rows_html}</tbody></table>'
-    )
+def _etiquetas_mes(meses, mes_cambio, sufijo):
+    """Nombre de cada mes; el del cambio de procedimiento lleva el sufijo indicado."""
+    nombres = [NOMBRES_MESES.get(mes, str(mes)) for mes in meses]
+    return [f'{nombre} ({sufijo})' if mes == mes_cambio else nombre for mes, nombre in zip(meses, nombres)]
 
 
 # ---------------------------------------------------------------------------
@@ -261,31 +248,23 @@ def main():
         n_rechazo_nvo = (df_nuevo['procedimiento_aplicado'] == 'RECHAZO_PREVIO_A_ANOTACION').sum()
         n_incidencia_nvo = (df_nuevo['resultado_auditoria_rcf'] == 'INCIDENCIA_MANUAL').sum()
 
-        filas_21 = [
-            ('Facturas electrónicas recibidas desde FACe',
-             [_fmt_int(n_face_ant), _fmt_int(n_face_nvo), _fmt_int(n_face_ant + n_face_nvo)]),
-            ('Facturas con identificador previo S',
-             [_fmt_int(n_s_ant), _fmt_int(n_s_postcambio), _fmt_int(n_s_ant + n_s_postcambio)]),
-            ('Facturas anotadas con identificador F',
-             [_fmt_int(n_f_ant), _fmt_int(n_f_directo), _fmt_int(n_f_ant + n_f_directo)]),
-            ('Facturas rechazadas antes de anotación',
-             [_fmt_int(n_rechazo_ant), _fmt_int(n_rechazo_nvo), _fmt_int(n_rechazo_ant + n_rechazo_nvo)]),
-            ('Facturas retenidas en FACe pendientes de descarga',
-             [_fmt_int(retenidas_count), '0', _fmt_int(retenidas_count)]),
-            ('Incidencias sin justificar',
-             [_fmt_int(n_incidencia_ant), _fmt_int(n_incidencia_nvo), _fmt_int(n_incidencia_ant + n_incidencia_nvo)]),
-        ]
+        tabla_21 = pd.DataFrame({
+            'Concepto': [
+                'Facturas electrónicas recibidas desde FACe',
+                'Facturas con identificador previo S',
+                'Facturas anotadas con identificador F',
+                'Facturas rechazadas antes de anotación',
+                'Facturas retenidas en FACe pendientes de descarga',
+                'Incidencias sin justificar',
+            ],
+            f'Procedimiento anterior S–F<br><small>Hasta {fecha_cambio.strftime("%d/%m/%Y")}</small>':
+                [n_face_ant, n_s_ant, n_f_ant, n_rechazo_ant, retenidas_count, n_incidencia_ant],
+            f'Procedimiento nuevo: F directo<br><small>Desde {fecha_cambio.strftime("%d/%m/%Y")}</small>':
+                [n_face_nvo, n_s_postcambio, n_f_directo, n_rechazo_nvo, 0, n_incidencia_nvo],
+        })
+        tabla_21['Total ejercicio'] = tabla_21.iloc[:, 1] + tabla_21.iloc[:, 2]
         st.markdown(
-            _html_tabla(
-                filas_21,
-                cabecera_cols=[
-                    f'Procedimiento anterior S–F<br><small>Hasta {fecha_cambio.strftime("%d/%m/%Y")}</small>',
-                    f'Procedimiento nuevo: F directo<br><small>Desde {fecha_cambio.strftime("%d/%m/%Y")}</small>',
-                    'Total ejercicio'
-                ],
-                titulo_col_izq='Concepto',
-                bold_ultima_fila=False
-            ),
+            tabla_html(tabla_21, dict.fromkeys(tabla_21.columns[1:], 'entero'), total_ultima=False),
             unsafe_allow_html=True
         )
         st.caption("")
@@ -356,41 +335,33 @@ def main():
                 max_face_f=('tiempo_face_f', 'max'),
             )
 
-            filas_22 = []
-            for mes_num in sorted(grp.index):
-                r = grp.loc[mes_num]
-                nombre = NOMBRES_MESES.get(mes_num, str(mes_num))
-                if mes_num == mes_cambio:
-                    nombre = f'{nombre} (hasta {fecha_cambio.strftime("%d/%m")})'
-                filas_22.append((nombre, [
-                    _fmt_int(r['n_s']),
-                    _fmt_int(r['n_sf']),
-                    _fmt_int(r['n_s'] - r['n_sf']),
-                    _fmt_min(r['media_face_s']),
-                    _fmt_min(r['media_s_f']),
-                    _fmt_min(r['media_face_f']),
-                    _fmt_min(r['max_face_f']),
-                ]))
-
+            tabla_22 = pd.DataFrame({
+                'Mes': _etiquetas_mes(grp.index, mes_cambio, f'hasta {fecha_cambio.strftime("%d/%m")}'),
+                'Fact. con S': grp['n_s'].to_numpy(),
+                'Con S y F': grp['n_sf'].to_numpy(),
+                'S sin F': (grp['n_s'] - grp['n_sf']).to_numpy(),
+                'Tiempo medio FACe–S': grp['media_face_s'].to_numpy(),
+                'Tiempo medio S–F': grp['media_s_f'].to_numpy(),
+                'Tiempo medio FACe–F': grp['media_face_f'].to_numpy(),
+                'Tiempo máx. FACe–F': grp['max_face_f'].to_numpy(),
+            })
             # Fila de totales/medias
-            filas_22.append(('Total / Media periodo anterior', [
-                _fmt_int(grp['n_s'].sum()),
-                _fmt_int(grp['n_sf'].sum()),
-                _fmt_int((grp['n_s'] - grp['n_sf']).sum()),
-                _fmt_min(df_ant_validos['tiempo_face_s'].mean()),
-                _fmt_min(df_ant_validos['tiempo_s_f'].mean()),
-                _fmt_min(df_ant_validos['tiempo_face_f'].mean()),
-                _fmt_min(df_ant_validos['tiempo_face_f'].max()),
-            ]))
+            tabla_22.loc[len(tabla_22)] = [
+                'Total / Media periodo anterior',
+                grp['n_s'].sum(),
+                grp['n_sf'].sum(),
+                (grp['n_s'] - grp['n_sf']).sum(),
+                df_ant_validos['tiempo_face_s'].mean(),
+                df_ant_validos['tiempo_s_f'].mean(),
+                df_ant_validos['tiempo_face_f'].mean(),
+                df_ant_validos['tiempo_face_f'].max(),
+            ]
 
             st.markdown(
-                _html_tabla(
-                    filas_22,
-                    cabecera_cols=['Fact. con S', 'Con S y F', 'S sin F',
-                                   'Tiempo medio FACe–S', 'Tiempo medio S–F',
-                                   'Tiempo medio FACe–F', 'Tiempo máx. FACe–F'],
-                    titulo_col_izq='Mes'
-                ),
+                tabla_html(tabla_22, {
+                    **dict.fromkeys(tabla_22.columns[1:4], 'entero'),
+                    **dict.fromkeys(tabla_22.columns[4:], 'tiempo'),
+                }),
                 unsafe_allow_html=True
             )
             st.caption("""
@@ -490,38 +461,31 @@ def main():
                 s_postcambio_mes = pd.Series(dtype=int)
 
             mes_cambio = fecha_cambio.month
-            filas_23 = []
-            for mes_num in sorted(grp_nvo.index):
-                r = grp_nvo.loc[mes_num]
-                nombre = NOMBRES_MESES.get(mes_num, str(mes_num))
-                if mes_num == mes_cambio:
-                    nombre = f'{nombre} (desde {fecha_cambio.strftime("%d/%m")})'
-                filas_23.append((nombre, [
-                    _fmt_int(r['n_recibidas'] + rechazo_nvo_mes.get(mes_num, 0)),
-                    _fmt_int(r['n_recibidas']),
-                    _fmt_int(rechazo_nvo_mes.get(mes_num, 0)),
-                    _fmt_int(s_postcambio_mes.get(mes_num, 0)),
-                    _fmt_min(r['media_face_f']),
-                    _fmt_min(r['max_face_f']),
-                ]))
-
-            filas_23.append(('Total / Media periodo corregido', [
-                _fmt_int(grp_nvo['n_recibidas'].sum() + rechazo_nvo_mes.sum()),
-                _fmt_int(grp_nvo['n_recibidas'].sum()),
-                _fmt_int(rechazo_nvo_mes.sum()),
-                _fmt_int(s_postcambio_mes.sum()),
-                _fmt_min(df_nvo_validos['tiempo_face_f_directo'].mean()),
-                _fmt_min(df_nvo_validos['tiempo_face_f_directo'].max()),
-            ]))
+            rechazadas_mes = rechazo_nvo_mes.reindex(grp_nvo.index, fill_value=0)
+            tabla_23 = pd.DataFrame({
+                'Mes': _etiquetas_mes(grp_nvo.index, mes_cambio, f'desde {fecha_cambio.strftime("%d/%m")}'),
+                'Fact. recibidas FACe': (grp_nvo['n_recibidas'] + rechazadas_mes).to_numpy(),
+                'Anotadas F directo': grp_nvo['n_recibidas'].to_numpy(),
+                'Rechazadas antes anotación': rechazadas_mes.to_numpy(),
+                'Con S detectadas': s_postcambio_mes.reindex(grp_nvo.index, fill_value=0).to_numpy(),
+                'Tiempo medio FACe–F directo': grp_nvo['media_face_f'].to_numpy(),
+                'Tiempo máx. FACe–F directo': grp_nvo['max_face_f'].to_numpy(),
+            })
+            tabla_23.loc[len(tabla_23)] = [
+                'Total / Media periodo corregido',
+                grp_nvo['n_recibidas'].sum() + rechazo_nvo_mes.sum(),
+                grp_nvo['n_recibidas'].sum(),
+                rechazo_nvo_mes.sum(),
+                s_postcambio_mes.sum(),
+                df_nvo_validos['tiempo_face_f_directo'].mean(),
+                df_nvo_validos['tiempo_face_f_directo'].max(),
+            ]
 
             st.markdown(
-                _html_tabla(
-                    filas_23,
-                    cabecera_cols=['Fact. recibidas FACe', 'Anotadas F directo',
-                                   'Rechazadas antes anotación', 'Con S detectadas',
-                                   'Tiempo medio FACe–F directo', 'Tiempo máx. FACe–F directo'],
-                    titulo_col_izq='Mes'
-                ),
+                tabla_html(tabla_23, {
+                    **dict.fromkeys(tabla_23.columns[1:5], 'entero'),
+                    **dict.fromkeys(tabla_23.columns[5:], 'tiempo'),
+                }),
                 unsafe_allow_html=True
             )
             st.caption("")
@@ -610,25 +574,23 @@ def main():
     n_fechas_negativas_nvo = len(df_nvo_tiempos[df_nvo_tiempos['incidencia_temporal']]) if not df_nvo_tiempos.empty and 'incidencia_temporal' in df_nvo_tiempos.columns else 0
     n_fechas_neg = n_fechas_negativas_ant + n_fechas_negativas_nvo
 
-    filas_25 = [
-        ('Facturas FACe sin correspondencia en RCF',
-         [_fmt_int(retenidas_count), 'Sí', 'Posible retención o falta de incorporación.']),
-        ('Registros posteriores al cambio con código S',
-         [_fmt_int(n_s_postcambio_total), 'Sí', 'Posible subsistencia del procedimiento anterior.']),
-        ('Rechazos sin causa acreditada',
-         [_fmt_int(n_sin_causa), 'Sí', 'Incumplimiento de trazabilidad.']),
-        ('Fechas negativas o inconsistentes',
-         [_fmt_int(n_fechas_neg), 'Sí', 'Excluidos de medias hasta aclaración.']),
-    ]
-    st.markdown(
-        _html_tabla(
-            filas_25,
-            cabecera_cols=['Nº registros', 'Revisión individual', 'Observación automática'],
-            titulo_col_izq='Tipo de incidencia',
-            bold_ultima_fila=False
-        ),
-        unsafe_allow_html=True
-    )
+    tabla_25 = pd.DataFrame({
+        'Tipo de incidencia': [
+            'Facturas FACe sin correspondencia en RCF',
+            'Registros posteriores al cambio con código S',
+            'Rechazos sin causa acreditada',
+            'Fechas negativas o inconsistentes',
+        ],
+        'Nº registros': [retenidas_count, n_s_postcambio_total, n_sin_causa, n_fechas_neg],
+        'Revisión individual': 'Sí',
+        'Observación automática': [
+            'Posible retención o falta de incorporación.',
+            'Posible subsistencia del procedimiento anterior.',
+            'Incumplimiento de trazabilidad.',
+            'Excluidos de medias hasta aclaración.',
+        ],
+    })
+    st.markdown(tabla_html(tabla_25, {'Nº registros': 'entero'}, total_ultima=False), unsafe_allow_html=True)
 
     st.markdown("---")
 
@@ -5,23 +5,29 @@ Orden HAP/1650/2015
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config.settings import COLORES, COLORES_GRAFICOS, VALIDACIONES_HAP, CONFIGURACION
+from utils.streamlit_adaptadores import activar_streamlit
+from utils.importacion_diferida import modulo_diferido
 from utils.validaciones import aplicar_todas_validaciones, analizar_rechazos
 from utils.data_loader import exportar_a_excel
 
+# plotly se importa al dibujar el primer gráfico
+px = modulo_diferido('plotly.express')
+go = modulo_diferido('plotly.graph_objects')
+
 st.set_page_config(
     page_title="Validaciones - Auditoría RCF",
     page_icon="✅",
     layout="wide"
 )
 
+activar_streamlit()
+
 def main():
     st.title("✅ Validaciones de Contenido")
     st.markdown("Cumplimiento de la Orden HAP/1650/2015 (Sección V.3)")
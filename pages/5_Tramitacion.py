@@ -4,21 +4,26 @@ Análisis de Tramitación de Facturas - Sección V.4 de la Guía IGAE
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config.settings import COLORES, COLORES_GRAFICOS, ESTADOS_FACTURAS, CONFIGURACION_TRANSICION_2025
+from utils.streamlit_adaptadores import activar_streamlit
+from utils.importacion_diferida import modulo_diferido, funcion_diferida
 from utils.data_loader import (
     exportar_a_excel,
     clasificar_procedimiento,
     calcular_indicadores_procedimiento_anterior,
     calcular_indicadores_tramitacion_posterior,
 )
+from utils.tablas_html import tabla_html
+
+# plotly se importa al dibujar el primer gráfico
+px = modulo_diferido('plotly.express')
+go = modulo_diferido('plotly.graph_objects')
+make_subplots = funcion_diferida('plotly.subplots', 'make_subplots')
 
 st.set_page_config(
     page_title="Tramitación - Auditoría RCF",
@@ -26,6 +31,31 @@ st.set_page_config(
     layout="wide"
 )
 
+activar_streamlit()
+
+NOMBRES_MESES = {
+    1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril',
+    5: 'Mayo', 6: 'Junio', 7: 'Julio', 8: 'Agosto',
+    9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
+}
+
+
+def _etiquetas_mes(meses, mes_cambio, sufijo):
+    """Nombre de cada mes; el del cambio de procedimiento lleva el sufijo indicado."""
+    nombres = [NOMBRES_MESES.get(mes, str(mes)) for mes in meses]
+    return [f'{nombre} ({sufijo})' if mes == mes_cambio else nombre for mes, nombre in zip(meses, nombres)]
+
+
+def _formatos_tabla_mensual(tabla):
+    """Tablas 4.1 y 4.4: Mes, tres recuentos, media/mediana/máximo en minutos y fuera de plazo."""
+    columnas = tabla.columns
+    return {
+        **dict.fromkeys(columnas[1:4], 'entero'),
+        **dict.fromkeys(columnas[4:7], 'tiempo_dias'),
+        columnas[7]: 'entero',
+    }
+
+
 def main():
     st.title("🔄 Tramitación de Facturas")
     st.markdown("Análisis de anulaciones, estados y reconocimiento de obligaciones (Sección V.4)")
@@ -533,48 +563,28 @@ def main():
             grp_sf['fuera_plazo'] = df_sf_val[df_sf_val['tiempo_s_f'] > plazo_min].groupby('_mes_num').size()
             grp_sf['fuera_plazo'] = grp_sf['fuera_plazo'].fillna(0).astype(int)
 
-            NOMBRES_MESES_T = {1:'Enero',2:'Febrero',3:'Marzo',4:'Abril',5:'Mayo',6:'Junio',
-                               7:'Julio',8:'Agosto',9:'Septiembre',10:'Octubre',11:'Noviembre',12:'Diciembre'}
-
-            filas_41 = []
-            for mes_num in sorted(grp_sf.index):
-                r = grp_sf.loc[mes_num]
-                nombre = NOMBRES_MESES_T.get(mes_num, str(mes_num))
-                if fecha_cambio_t4 and mes_num == fecha_cambio_t4.month:
-                    nombre = f'{nombre} (hasta {fecha_cambio_t4.strftime("%d/%m")})'
-                filas_41.append((nombre, [
-                    f'{int(r["n_s"]):,}',
-                    f'{int(r["n_con_f"]):,}',
-                    f'{int(r["n_s"] - r["n_con_f"]):,}',
-                    f'{r["media_sf"]/1440:.1f} d' if r["media_sf"] >= 1440 else f'{r["media_sf"]:.0f} min',
-                    f'{r["mediana_sf"]/1440:.1f} d' if r["mediana_sf"] >= 1440 else f'{r["mediana_sf"]:.0f} min',
-                    f'{r["max_sf"]/1440:.1f} d' if r["max_sf"] >= 1440 else f'{r["max_sf"]:.0f} min',
-                    f'{int(r["fuera_plazo"]):,}',
-                ]))
-
-            filas_41.append(('Total / Media periodo', [
-                f'{int(grp_sf["n_s"].sum()):,}',
-                f'{int(grp_sf["n_con_f"].sum()):,}',
-                f'{int((grp_sf["n_s"] - grp_sf["n_con_f"]).sum()):,}',
-                f'{df_sf_val["tiempo_s_f"].mean()/1440:.1f} d' if df_sf_val["tiempo_s_f"].mean() >= 1440 else f'{df_sf_val["tiempo_s_f"].mean():.0f} min',
-                f'{df_sf_val["tiempo_s_f"].median()/1440:.1f} d' if df_sf_val["tiempo_s_f"].median() >= 1440 else f'{df_sf_val["tiempo_s_f"].median():.0f} min',
-                f'{df_sf_val["tiempo_s_f"].max()/1440:.1f} d' if df_sf_val["tiempo_s_f"].max() >= 1440 else f'{df_sf_val["tiempo_s_f"].max():.0f} min',
-                f'{int(grp_sf["fuera_plazo"].sum()):,}',
-            ]))
-
-            # Renderizar tabla HTML
-            th = 'background:#1f4e79;color:white;padding:6px 9px;border:1px solid #555;text-align:center;white-space:nowrap;font-size:12px;'
-            th_l = 'background:#1f4e79;color:white;padding:6px 12px;border:1px solid #555;text-align:left;min-width:160px;font-size:12px;'
-            td = 'padding:5px 9px;border:1px solid #ccc;text-align:center;font-size:12px;'
-            td_l = 'padding:5px 12px;border:1px solid #ccc;text-align:left;font-size:12px;'
-            cab = ['Fact. con S','Con F','Sin F','Media S–F','Mediana S–F','Máx. S–F',f'Fuera {plazo_dias_t4}d']
-            thead_html = f'<thead><tr><th style="{th_l}">Mes</th>' + ''.join(f'<th style="{th}">{c}</th>' for c in cab) + '</tr></thead>'
-            rows_html = ''
-            for i, (lbl, vals) in enumerate(filas_41):
-                is_last = i == len(filas_41) - 1
-                bg = 'background:#dce6f1;font-weight:bold;' if is_last else ('background:#f5f9ff;' if i % 2 == 0 else '')
-                rows_html += f'<tr><td style="{td_l}{bg}">{lbl}</td>' + ''.join(f'<td style="{td}{bg}">{v}</td>' for v in vals) + '</tr>'
-            st.markdown(f'<table style="border-collapse:collapse;width:100%;">{thead_html}<tbody>{rows_html}</tbody></table>', unsafe_allow_html=True)
+            tabla_41 = pd.DataFrame({
+                'Mes': _etiquetas_mes(grp_sf.index, fecha_cambio_t4.month if fecha_cambio_t4 else None,
+                                      f'hasta {fecha_cambio_t4.strftime("%d/%m")}' if fecha_cambio_t4 else ''),
+                'Fact. con S': grp_sf['n_s'].to_numpy(),
+                'Con F': grp_sf['n_con_f'].to_numpy(),
+                'Sin F': (grp_sf['n_s'] - grp_sf['n_con_f']).to_numpy(),
+                'Media S–F': grp_sf['media_sf'].to_numpy(),
+                'Mediana S–F': grp_sf['mediana_sf'].to_numpy(),
+                'Máx. S–F': grp_sf['max_sf'].to_numpy(),
+                f'Fuera {plazo_dias_t4}d': grp_sf['fuera_plazo'].to_numpy(),
+            })
+            tabla_41.loc[len(tabla_41)] = [
+                'Total / Media periodo',
+                grp_sf['n_s'].sum(),
+                grp_sf['n_con_f'].sum(),
+                (grp_sf['n_s'] - grp_sf['n_con_f']).sum(),
+                df_sf_val['tiempo_s_f'].mean(),
+                df_sf_val['tiempo_s_f'].median(),
+                df_sf_val['tiempo_s_f'].max(),
+                grp_sf['fuera_plazo'].sum(),
+            ]
+            st.markdown(tabla_html(tabla_41, _formatos_tabla_mensual(tabla_41), estilo='informe_compacto'), unsafe_allow_html=True)
             st.caption("")
 
             # Tabla 4.2 — Por unidad tramitadora
@@ -698,52 +708,29 @@ def main():
             else:
                 pendientes_mes = pd.Series(dtype=int)
 
-            NOMBRES_MESES_T4 = {1:'Enero',2:'Febrero',3:'Marzo',4:'Abril',5:'Mayo',6:'Junio',
-                                 7:'Julio',8:'Agosto',9:'Septiembre',10:'Octubre',11:'Noviembre',12:'Diciembre'}
             mes_cambio_num = fecha_cambio_t4.month if fecha_cambio_t4 else 1
-
-            filas_44 = []
-            for mes_num in sorted(grp_fp.index):
-                r = grp_fp.loc[mes_num]
-                nombre = NOMBRES_MESES_T4.get(mes_num, str(mes_num))
-                if mes_num == mes_cambio_num:
-                    nombre = f'{nombre} (desde {fecha_cambio_t4.strftime("%d/%m") if fecha_cambio_t4 else ""})'
-                def _fmt(v): return f'{v/1440:.1f} d' if v >= 1440 else f'{v:.0f} min'
-                filas_44.append((nombre, [
-                    f'{int(r["n_anotadas"]):,}',
-                    f'{int(r["n_aceptadas"]):,}',
-                    f'{int(pendientes_mes.get(mes_num, 0)):,}',
-                    _fmt(r['media_fp']),
-                    _fmt(r['mediana_fp']),
-                    _fmt(r['max_fp']),
-                    f'{int(r["fuera_plazo"]):,}',
-                ]))
-
-            def _fmt_t(v): return f'{v/1440:.1f} d' if v >= 1440 else f'{v:.0f} min'
-            filas_44.append(('Total / Media periodo corregido', [
-                f'{int(grp_fp["n_anotadas"].sum()):,}',
-                f'{int(grp_fp["n_aceptadas"].sum()):,}',
-                f'{int(pendientes_mes.sum()):,}',
-                _fmt_t(df_fp_val['tiempo_f_aceptacion'].mean()),
-                _fmt_t(df_fp_val['tiempo_f_aceptacion'].median()),
-                _fmt_t(df_fp_val['tiempo_f_aceptacion'].max()),
-                f'{int(grp_fp["fuera_plazo"].sum()):,}',
-            ]))
-
-            # HTML tabla
-            th2 = 'background:#1f4e79;color:white;padding:6px 9px;border:1px solid #555;text-align:center;white-space:nowrap;font-size:12px;'
-            th2_l = 'background:#1f4e79;color:white;padding:6px 12px;border:1px solid #555;text-align:left;min-width:160px;font-size:12px;'
-            td2 = 'padding:5px 9px;border:1px solid #ccc;text-align:center;font-size:12px;'
-            td2_l = 'padding:5px 12px;border:1px solid #ccc;text-align:left;font-size:12px;'
-            cab44 = ['Anotadas F','Aceptadas/Conformadas','Pendientes',
-                     'Media F–acept.','Mediana','Máx.',f'Fuera {plazo_dias_t4}d']
-            thead44 = f'<thead><tr><th style="{th2_l}">Mes</th>' + ''.join(f'<th style="{th2}">{c}</th>' for c in cab44) + '</tr></thead>'
-            rows44 = ''
-            for i, (lbl, vals) in enumerate(filas_44):
-                is_last = i == len(filas_44) - 1
-                bg = 'background:#dce6f1;font-weight:bold;' if is_last else ('background:#f5f9ff;' if i % 2 == 0 else '')
-                rows44 += f'<tr><td style="{td2_l}{bg}">{lbl}</td>' + ''.join(f'<td style="{td2}{bg}">{v}</td>' for v in vals) + '</tr>'
-            st.markdown(f'<table style="border-collapse:collapse;width:100%;">{thead44}<tbody>{rows44}</tbody></table>', unsafe_allow_html=True)
+            tabla_44 = pd.DataFrame({
+                'Mes': _etiquetas_mes(grp_fp.index, mes_cambio_num,
+                                      f'desde {fecha_cambio_t4.strftime("%d/%m") if fecha_cambio_t4 else ""}'),
+                'Anotadas F': grp_fp['n_anotadas'].to_numpy(),
+                'Aceptadas/Conformadas': grp_fp['n_aceptadas'].to_numpy(),
+                'Pendientes': pendientes_mes.reindex(grp_fp.index, fill_value=0).to_numpy(),
+                'Media F–acept.': grp_fp['media_fp'].to_numpy(),
+                'Mediana': grp_fp['mediana_fp'].to_numpy(),
+                'Máx.': grp_fp['max_fp'].to_numpy(),
+                f'Fuera {plazo_dias_t4}d': grp_fp['fuera_plazo'].to_numpy(),
+            })
+            tabla_44.loc[len(tabla_44)] = [
+                'Total / Media periodo corregido',
+                grp_fp['n_anotadas'].sum(),
+                grp_fp['n_aceptadas'].sum(),
+                pendientes_mes.sum(),
+                df_fp_val['tiempo_f_aceptacion'].mean(),
+                df_fp_val['tiempo_f_aceptacion'].median(),
+                df_fp_val['tiempo_f_aceptacion'].max(),
+                grp_fp['fuera_plazo'].sum(),
+            ]
+            st.markdown(tabla_html(tabla_44, _formatos_tabla_mensual(tabla_44), estilo='informe_compacto'), unsafe_allow_html=True)
             st.caption(f"**Nota:** este indicador mide la tramitación posterior a la anotación en el RCF. No debe denominarse tiempo de inscripción.")
 
             # Tabla 4.5 — Por UT
@@ -4,16 +4,28 @@ Obligaciones de Control - Sección V.5 de la Guía IGAE
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import sys
 from pathlib import Path
-from datetime import datetime, timedelta
 
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config.settings import COLORES, COLORES_GRAFICOS, CONFIGURACION
+from utils.streamlit_adaptadores import activar_streamlit, ejercicio_sesion
+from utils.importacion_diferida import modulo_diferido, funcion_diferida
 from utils.data_loader import exportar_a_excel
+from utils.morosidad import calcular_morosidad
+from utils.antiguedad import calcular_distribucion_antiguedad
+from utils.analisis import (
+    fecha_corte_auditoria,
+    calcular_pendientes_3_meses,
+    calcular_evolucion_pendientes_3_meses,
+)
+from utils.ciclo_vida import indice_ciclo_vida_memoizado, curva_pendientes_diaria, pendientes_en_fecha
+
+# plotly se importa al dibujar el primer gráfico
+px = modulo_diferido('plotly.express')
+go = modulo_diferido('plotly.graph_objects')
+make_subplots = funcion_diferida('plotly.subplots', 'make_subplots')
 
 st.set_page_config(
     page_title="Obligaciones - Auditoría RCF",
@@ -21,6 +33,8 @@ st.set_page_config(
     layout="wide"
 )
 
+activar_streamlit()
+
 def main():
     st.title("📋 Obligaciones de Control")
     st.markdown("Facturas pendientes y control de morosidad (Sección V.5)")
@@ -57,27 +71,23 @@ def main():
     st.markdown("### ⚠️ Facturas sin Reconocimiento >3 Meses")
     st.info("Facturas anotadas hace más de 3 meses sin reconocimiento de obligación")
     
-    # Calcular fecha límite (3 meses atrás)
-    fecha_actual = datetime.now()
-    fecha_limite = fecha_actual - timedelta(days=90)
-    
-    # Filtrar facturas pendientes
-    estados_pendientes = ['REGISTRADA', 'VERIFICADA', 'RECIBIDA', 'CONFORMADA']
-    
-    if 'fecha_anotacion_rcf' in df_rcf.columns and 'estado' in df_rcf.columns:
-        df_rcf['fecha_anotacion_rcf'] = pd.to_datetime(df_rcf['fecha_anotacion_rcf'])
-        
-        facturas_pendientes_3m = df_rcf[
-            (df_rcf['fecha_anotacion_rcf'] <= fecha_limite) &
-            (df_rcf['estado'].isin(estados_pendientes))
-        ].copy()
-        
-        # Calcular días transcurridos
-        facturas_pendientes_3m['dias_pendiente'] = (
-            fecha_actual - facturas_pendientes_3m['fecha_anotacion_rcf']
-        ).dt.days
-    else:
-        facturas_pendientes_3m = pd.DataFrame()
+    # Fecha de corte de la auditoría (por defecto, fin del ejercicio auditado)
+    ejercicio = ejercicio_sesion()
+    fecha_corte_defecto = fecha_corte_auditoria(ejercicio=ejercicio)
+    fecha_corte_sel = st.date_input(
+        "Fecha de corte",
+        value=fecha_corte_defecto.date(),
+        format="DD/MM/YYYY",
+        help="Las antigüedades se calculan a esta fecha. Por defecto, el cierre del ejercicio auditado.",
+        key="obligaciones_fecha_corte"
+    )
+    fecha_corte = fecha_corte_auditoria(fecha_corte_sel)
+
+    # Facturas pendientes a la fecha de corte según el histórico de estados
+    # (cálculo memoizado por datos y fecha de corte)
+    facturas_pendientes_3m = calcular_pendientes_3_meses(
+        df_rcf, datos.get('estados'), fecha_corte
+    ).copy()
     
     # Métricas principales
     col1, col2, col3, col4 = st.columns(4)
@@ -144,30 +154,6 @@ def main():
             hide_index=True
         )
         
-        # Gráfico de distribución por antigüedad
-        st.markdown("#### 📊 Distribución por Antigüedad")
-        
-        # Crear rangos
-        facturas_pendientes_3m['rango_dias'] = pd.cut(
-            facturas_pendientes_3m['dias_pendiente'],
-            bins=[90, 120, 180, 365, float('inf')],
-            labels=['90-120 días', '120-180 días', '180-365 días', '>365 días']
-        )
-        
-        distribucion_antigüedad = facturas_pendientes_3m['rango_dias'].value_counts().sort_index()
-        
-        fig = px.bar(
-            x=distribucion_antigüedad.index.astype(str),
-            y=distribucion_antigüedad.values,
-            title='Facturas pendientes por rango de antigüedad',
-            labels={'x': 'Rango de antigüedad', 'y': 'Número de facturas'},
-            color=distribucion_antigüedad.values,
-            color_continuous_scale='Reds'
-        )
-        
-        fig.update_layout(showlegend=False, height=400)
-        st.plotly_chart(fig, width="stretch")
-        
         # Exportar
         if st.button("📥 Exportar Facturas Pendientes >3 Meses"):
             excel_bytes = exportar_a_excel(df_pendientes_display, "Facturas_Pendientes_3m")
@@ -180,6 +166,77 @@ def main():
     else:
         st.success("✅ No hay facturas con más de 3 meses pendientes de reconocimiento de obligación")
     
+    # Distribución por antigüedad de todas las facturas pendientes a la fecha de corte
+    antiguedad = calcular_distribucion_antiguedad(df_rcf, datos.get('estados'), fecha_corte)
+    if antiguedad['total_pendientes'] > 0:
+        st.markdown("#### 📊 Distribución por Antigüedad de Facturas Pendientes")
+        st.caption(
+            f"{antiguedad['total_pendientes']:,} facturas pendientes de reconocimiento a "
+            f"{fecha_corte.strftime('%d/%m/%Y')} ({antiguedad['importe_pendiente']:,.2f} €), según el histórico de estados"
+        )
+
+        col1, col2 = st.columns(2)
+        with col1:
+            fig = px.bar(
+                antiguedad['total'],
+                x='Tramo',
+                y='Nº Facturas',
+                title='Facturas pendientes por tramo de antigüedad',
+                color='Nº Facturas',
+                color_continuous_scale='Reds'
+            )
+            fig.update_layout(showlegend=False, height=400)
+            st.plotly_chart(fig, width="stretch")
+        with col2:
+            fig = px.bar(
+                antiguedad['total'],
+                x='Tramo',
+                y='Importe',
+                title='Importe pendiente por tramo de antigüedad',
+                color='Importe',
+                color_continuous_scale='Oranges'
+            )
+            fig.update_layout(showlegend=False, height=400)
+            st.plotly_chart(fig, width="stretch")
+
+        medida = st.radio(
+            "Desglose por tramos",
+            ['Nº Facturas', 'Importe'],
+            horizontal=True,
+            key="obligaciones_medida_antiguedad"
+        )
+        clave_medida = 'facturas' if medida == 'Nº Facturas' else 'importe'
+        formato_medida = '{:,.0f}' if clave_medida == 'facturas' else '{:,.2f} €'
+        pestanas = [(clave, titulo) for clave, titulo in [
+            ('por_entidad', 'Por Entidad'), ('por_oc', 'Por Oficina Contable'), ('por_ut', 'Por Unidad Tramitadora')
+        ] if clave in antiguedad]
+        for tab, (clave, _) in zip(st.tabs([titulo for _, titulo in pestanas]), pestanas):
+            with tab:
+                tabla = antiguedad[clave][clave_medida]
+                st.dataframe(
+                    tabla.style.format({col: formato_medida for col in antiguedad['tramos'] + ['Total']}),
+                    width="stretch",
+                    hide_index=True
+                )
+
+    # Evolución mensual (todos los cierres de mes en un único barrido)
+    evolucion_3m = calcular_evolucion_pendientes_3_meses(df_rcf, datos.get('estados'), fecha_corte)
+    if len(evolucion_3m) > 0:
+        st.markdown("#### 📅 Evolución Mensual de Facturas >3 Meses sin Reconocimiento")
+        st.caption("Reconstruida a partir del histórico de estados: facturas abiertas al cierre de cada mes con más de 90 días desde su anotación")
+
+        fig = px.bar(
+            evolucion_3m,
+            x='fecha',
+            y='facturas_pendientes',
+            title='Facturas >3 meses sin reconocimiento al cierre de cada mes',
+            labels={'fecha': 'Cierre de mes', 'facturas_pendientes': 'Número de facturas'},
+            hover_data={'importe_pendiente': ':,.2f'},
+            color_discrete_sequence=[COLORES['error']]
+        )
+        fig.update_layout(height=350)
+        st.plotly_chart(fig, width="stretch")
+
     st.markdown("---")
     
     # === RANKING POR UNIDADES ===
@@ -262,66 +319,151 @@ def main():
     
     st.markdown("---")
     
+    # === EVOLUCIÓN DE FACTURAS PENDIENTES ===
+    st.markdown("### 📈 Evolución de Facturas Pendientes de Reconocimiento")
+    st.info("Facturas anotadas en el RCF y aún sin obligación reconocida, rechazo o anulación, día a día según el histórico de estados")
+
+    # Mismo índice (sin BORRADAS) que la distribución por antigüedad
+    indice = indice_ciclo_vida_memoizado(df_rcf, datos.get('estados'))
+
+    if indice['n_facturas'] > 0:
+        fecha_ini_curva = pd.Timestamp(year=ejercicio, month=1, day=1)
+        fecha_fin_curva = pd.Timestamp(year=ejercicio, month=12, day=31)
+        curva = curva_pendientes_diaria(indice, fecha_ini_curva, fecha_fin_curva)
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            fecha_consulta = st.date_input(
+                "Pendientes a fecha",
+                value=fecha_fin_curva.date(),
+                format="DD/MM/YYYY",
+                key="obligaciones_fecha_consulta"
+            )
+        pendientes_consulta = pendientes_en_fecha(indice, fecha_consulta)
+        with col2:
+            st.metric("Facturas Pendientes", f"{pendientes_consulta['facturas']:,}")
+        with col3:
+            st.metric("Importe Pendiente", f"{pendientes_consulta['importe']:,.0f} €")
+
+        fig = make_subplots(specs=[[{"secondary_y": True}]])
+        fig.add_trace(
+            go.Scatter(x=curva['fecha'], y=curva['facturas_pendientes'], name='Nº facturas',
+                       line=dict(color=COLORES['primario'])),
+            secondary_y=False
+        )
+        fig.add_trace(
+            go.Scatter(x=curva['fecha'], y=curva['importe_pendiente'], name='Importe (€)',
+                       line=dict(color=COLORES['secundario'], dash='dot')),
+            secondary_y=True
+        )
+        fig.update_layout(title=f'Facturas pendientes de reconocimiento al cierre de cada día ({ejercicio})', height=400)
+        fig.update_yaxes(title_text='Número de facturas', secondary_y=False)
+        fig.update_yaxes(title_text='Importe (€)', secondary_y=True)
+        st.plotly_chart(fig, width="stretch")
+
+        if indice['n_descartadas'] > 0:
+            st.caption(
+                f"{indice['n_descartadas']:,} facturas en estado de cierre sin fecha de cierre conocida "
+                "no se incluyen en la evolución."
+            )
+    else:
+        st.warning("No hay fechas de anotación en el RCF para reconstruir la evolución de pendientes")
+
+    st.markdown("---")
+
     # === ANÁLISIS DE MOROSIDAD ===
     st.markdown("### 📉 Análisis de Morosidad")
-    st.info("Facturas que superan los plazos legales de pago (30 días)")
-    
-    # Facturas pagadas con retraso
-    if 'fecha_anotacion_rcf' in df_rcf.columns and 'fecha_pago' in df_rcf.columns:
-        facturas_pagadas = df_rcf[df_rcf['estado'] == 'PAGADA'].copy()
-        
-        if len(facturas_pagadas) > 0:
-            facturas_pagadas['fecha_anotacion_rcf'] = pd.to_datetime(facturas_pagadas['fecha_anotacion_rcf'])
-            facturas_pagadas['fecha_pago'] = pd.to_datetime(facturas_pagadas['fecha_pago'])
-            
-            facturas_pagadas['dias_pago'] = (
-                facturas_pagadas['fecha_pago'] - facturas_pagadas['fecha_anotacion_rcf']
-            ).dt.days
-            
-            # Facturas con retraso (>30 días)
-            facturas_retraso = facturas_pagadas[facturas_pagadas['dias_pago'] > 30].copy()
-            
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
+    plazo_legal = CONFIGURACION.get('plazo_legal_pago_dias', 30)
+    st.info(f"Plazo de pago desde la conformidad (o, si no consta, desde la anotación en el RCF) hasta el pago. Plazo legal: {plazo_legal} días")
+
+    morosidad = calcular_morosidad(df_rcf, datos.get('estados'))
+    facturas_retraso = pd.DataFrame()
+
+    if morosidad:
+        plazos = morosidad['plazos']
+        col1, col2, col3, col4 = st.columns(4)
+
+        with col1:
+            st.metric(
+                "PMP (ponderado por importe)",
+                f"{morosidad['pmp']:.1f} días",
+                f"Media simple: {morosidad['dias_pago_medio']:.1f} días",
+                delta_color="off"
+            )
+
+        with col2:
+            st.metric(
+                "Facturas con Retraso",
+                f"{morosidad['total_con_retraso']:,}",
+                f"{morosidad['porcentaje_con_retraso']:.1f}% de {morosidad['total_pagadas']:,} pagadas",
+                delta_color="off"
+            )
+
+        with col3:
+            if morosidad['total_con_retraso'] > 0:
                 st.metric(
-                    "Facturas con Retraso",
-                    f"{len(facturas_retraso):,}",
-                    f"{len(facturas_retraso)/len(facturas_pagadas)*100:.1f}%" if len(facturas_pagadas) > 0 else "0%"
+                    "Días Medio de Retraso",
+                    f"{morosidad['dias_retraso_medio']:.0f} días"
                 )
-            
-            with col2:
-                if len(facturas_retraso) > 0:
-                    dias_retraso_medio = facturas_retraso['dias_pago'].mean()
-                    st.metric(
-                        "Días Medio de Retraso",
-                        f"{dias_retraso_medio:.0f} días"
-                    )
-            
-            with col3:
-                if len(facturas_retraso) > 0:
-                    dias_retraso_max = facturas_retraso['dias_pago'].max()
-                    st.metric(
-                        "Retraso Máximo",
-                        f"{dias_retraso_max:.0f} días"
-                    )
-            
-            if len(facturas_retraso) > 0:
-                # Distribución de tiempos de pago
-                fig = px.histogram(
-                    facturas_pagadas,
-                    x='dias_pago',
-                    nbins=50,
-                    title='Distribución de plazos de pago',
-                    labels={'dias_pago': 'Días hasta el pago', 'count': 'Número de facturas'},
-                    color_discrete_sequence=[COLORES['primario']]
+
+        with col4:
+            if morosidad['total_con_retraso'] > 0:
+                st.metric(
+                    "Retraso Máximo",
+                    f"{morosidad['dias_retraso_max']:.0f} días"
                 )
-                
-                # Añadir línea vertical en 30 días (plazo legal)
-                fig.add_vline(x=30, line_dash="dash", line_color="red", annotation_text="Plazo legal (30 días)")
-                
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, width="stretch")
+
+        # Distribución de tiempos de pago
+        fig = px.histogram(
+            plazos,
+            x='dias_pago',
+            nbins=50,
+            title='Distribución de plazos de pago',
+            labels={'dias_pago': 'Días hasta el pago', 'count': 'Número de facturas'},
+            color_discrete_sequence=[COLORES['primario']]
+        )
+
+        # Añadir línea vertical en el plazo legal
+        fig.add_vline(x=plazo_legal, line_dash="dash", line_color="red", annotation_text=f"Plazo legal ({plazo_legal} días)")
+
+        fig.update_layout(height=400)
+        st.plotly_chart(fig, width="stretch")
+
+        formato_desglose = {
+            'Nº Facturas': '{:,.0f}',
+            'Importe Pagado': '{:,.2f} €',
+            'PMP (días)': '{:.1f}',
+            'Con Retraso': '{:,.0f}',
+            '% Retraso': '{:.1f}%',
+            'Importe con Retraso': '{:,.2f} €',
+            'Plazo Máximo': '{:.0f}'
+        }
+        tab_entidad, tab_oc, tab_mes = st.tabs(["Por Entidad", "Por Oficina Contable", "Por Mes de Pago"])
+        with tab_entidad:
+            st.dataframe(morosidad['por_entidad'].style.format(formato_desglose), width="stretch", hide_index=True)
+        with tab_oc:
+            st.dataframe(morosidad['por_oc'].style.format(formato_desglose), width="stretch", hide_index=True)
+        with tab_mes:
+            fig = px.bar(
+                morosidad['por_mes'],
+                x='Mes Pago',
+                y='PMP (días)',
+                title='PMP por mes de pago',
+                color='% Retraso',
+                color_continuous_scale='Reds'
+            )
+            fig.add_hline(y=plazo_legal, line_dash="dash", line_color="red")
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, width="stretch")
+            st.dataframe(morosidad['por_mes'].style.format(formato_desglose), width="stretch", hide_index=True)
+
+        # Detalle de facturas pagadas con retraso (para exportación)
+        ids_retraso = plazos.index[plazos['con_retraso']]
+        cols_detalle = [c for c in ['entidad', 'id_fra_rcf', 'numero_factura', 'nif_emisor', 'razon_social',
+                                    'importe_total', 'codigo_oc'] if c in df_rcf.columns]
+        facturas_retraso = df_rcf.loc[ids_retraso, cols_detalle].join(
+            plazos.loc[ids_retraso, ['fecha_inicio_computo', 'fecha_pago_efectiva', 'dias_pago', 'dias_exceso']]
+        ).sort_values('dias_pago', ascending=False)
     else:
         st.warning("No hay datos suficientes de fechas de pago para analizar morosidad")
     
@@ -362,7 +504,7 @@ def main():
     
     with col2:
         if st.button("📥 Exportar Análisis Morosidad", width="stretch"):
-            if 'facturas_retraso' in locals() and len(facturas_retraso) > 0:
+            if len(facturas_retraso) > 0:
                 excel_bytes = exportar_a_excel(facturas_retraso, "Analisis_Morosidad")
                 st.download_button(
                     label="Descargar Excel",
@@ -379,7 +521,7 @@ def main():
     df_pendientes_informe = pd.DataFrame()
     ranking_oc_pendientes_informe = pd.DataFrame()
     ranking_ut_pendientes_informe = pd.DataFrame()
-    distribucion_antiguedad_informe = pd.DataFrame()
+    distribucion_antiguedad_informe = antiguedad['total']
     morosidad_informe = {}
 
     if len(facturas_pendientes_3m) > 0:
@@ -414,18 +556,8 @@ def main():
             ranking_ut_pendientes_informe.columns = ['Código UT', 'Importe Total', 'Nº Facturas', 'Días Medio']
             ranking_ut_pendientes_informe = ranking_ut_pendientes_informe.sort_values('Importe Total', ascending=False).head(10)
 
-        # Distribución por antigüedad
-        if 'rango_dias' in facturas_pendientes_3m.columns:
-            distribucion_antiguedad_informe = facturas_pendientes_3m['rango_dias'].value_counts().sort_index().reset_index()
-            distribucion_antiguedad_informe.columns = ['Rango', 'Cantidad']
-
     # Datos de morosidad
-    if 'facturas_retraso' in dir() and len(facturas_retraso) > 0:
-        morosidad_informe = {
-            'total_con_retraso': len(facturas_retraso),
-            'dias_retraso_medio': facturas_retraso['dias_pago'].mean(),
-            'dias_retraso_max': facturas_retraso['dias_pago'].max()
-        }
+    morosidad_informe = morosidad
 
     st.session_state['analisis']['obligaciones'] = {
         'facturas_3_meses': len(facturas_pendientes_3m),
@@ -436,7 +568,10 @@ def main():
         'ranking_oc_pendientes': ranking_oc_pendientes_informe,
         'ranking_ut_pendientes': ranking_ut_pendientes_informe,
         'distribucion_antiguedad': distribucion_antiguedad_informe,
-        'morosidad': morosidad_informe
+        'antiguedad': antiguedad,
+        'morosidad': morosidad_informe,
+        'evolucion_pendientes_3_meses': evolucion_3m,
+        'fecha_corte': fecha_corte,
     }
 
 if __name__ == "__main__":
@@ -11,7 +11,9 @@ from datetime import datetime
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config.settings import COLORES, CONFIGURACION, CONFIGURACION_INFORME
-from utils.report_generator import generar_informe_word, generar_informe_pdf
+from utils.streamlit_adaptadores import activar_streamlit, ejercicio_sesion
+from utils.cache_informes import generar_informes_cacheados
+from utils.informe_pipeline import numero_procesos
 from utils.analisis import precalcular_analisis_faltantes
 
 st.set_page_config(
@@ -20,6 +22,21 @@ st.set_page_config(
     layout="wide"
 )
 
+activar_streamlit()
+
+def mostrar_tiempos_secciones(resultado: dict):
+    """Muestra el origen (caché o generado) y el tiempo de cada seccion del informe"""
+    for formato, estado in resultado['cache'].items():
+        if estado['desde_cache']:
+            st.info(f"⚡ Informe {formato.upper()} servido desde la caché (sin cambios en datos, análisis ni configuración)")
+        elif estado['invalidado_por']:
+            st.caption(f"Informe {formato.upper()} regenerado. Cambios respecto al anterior: {', '.join(estado['invalidado_por'])}")
+
+    if resultado['tiempos'] is not None:
+        with st.expander(f"⏱️ Tiempo por sección (total {resultado['tiempo_total']:.2f} s)"):
+            st.dataframe(resultado['tiempos'], width="stretch", hide_index=True)
+
+
 def main():
     st.title("📑 Generador de Informe de Auditoría")
     st.markdown("Consolidación y generación del informe final según la Guía IGAE")
@@ -41,7 +58,8 @@ def main():
 
     # Precalcular automáticamente los análisis faltantes para que el informe
     # pueda generarse incluso si el usuario no ha visitado todas las páginas.
-    analisis = precalcular_analisis_faltantes(datos, analisis)
+    ejercicio = ejercicio_sesion()
+    analisis = precalcular_analisis_faltantes(datos, analisis, ejercicio=ejercicio)
     st.session_state['analisis'] = analisis
 
     st.markdown("---")
@@ -144,6 +162,15 @@ def main():
             incluir_recomendaciones = st.checkbox("Recomendaciones", value=True)
             incluir_anexos = st.checkbox("Anexos", value=False)
         
+        procesos_informe = st.number_input(
+            "Procesos para generar las secciones",
+            min_value=1,
+            max_value=max(numero_procesos(), 8),
+            value=1,
+            help="Con 1, las secciones se generan en el propio proceso de la aplicación. Con más, "
+                 "se reparten en procesos nuevos que reciben cada uno una copia de los datos"
+        )
+        
         st.markdown("---")
         
         st.markdown("#### Información del Auditor")
@@ -373,13 +400,15 @@ def main():
                 with st.spinner("Generando informe Word... Esto puede tardar unos segundos."):
                     try:
                         # Generar informe
-                        informe_bytes = generar_informe_word(datos, analisis)
+                        resultado = generar_informes_cacheados(datos, analisis, ('word',), incluir_anexos, procesos_informe, ejercicio)
+                        informe_bytes = resultado['word']
                         
                         # Botón de descarga
                         fecha_str = datetime.now().strftime("%Y%m%d")
                         nombre_archivo = f"Informe_Auditoria_RCF_{fecha_str}.docx"
                         
                         st.success("✅ Informe Word generado correctamente")
+                        mostrar_tiempos_secciones(resultado)
                         
                         st.download_button(
                             label="📥 Descargar Informe Word",
@@ -398,13 +427,15 @@ def main():
                 with st.spinner("Generando informe PDF... Esto puede tardar unos segundos."):
                     try:
                         # Generar informe
-                        informe_bytes = generar_informe_pdf(datos, analisis)
+                        resultado = generar_informes_cacheados(datos, analisis, ('pdf',), incluir_anexos, procesos_informe, ejercicio)
+                        informe_bytes = resultado['pdf']
                         
                         # Botón de descarga
                         fecha_str = datetime.now().strftime("%Y%m%d")
                         nombre_archivo = f"Informe_Auditoria_RCF_Ejecutivo_{fecha_str}.pdf"
                         
                         st.success("✅ Informe PDF generado correctamente")
+                        mostrar_tiempos_secciones(resultado)
                         
                         st.download_button(
                             label="📥 Descargar Informe PDF",
@@ -423,15 +454,15 @@ def main():
                 try:
                     fecha_str = datetime.now().strftime("%Y%m%d")
                     
-                    # Generar Word
-                    informe_word = generar_informe_word(datos, analisis)
+                    # Generar Word y PDF en un mismo pool de procesos
+                    resultado = generar_informes_cacheados(datos, analisis, ('word', 'pdf'), incluir_anexos, procesos_informe, ejercicio)
+                    informe_word = resultado['word']
                     nombre_word = f"Informe_Auditoria_RCF_{fecha_str}.docx"
-                    
-                    # Generar PDF
-                    informe_pdf = generar_informe_pdf(datos, analisis)
+                    informe_pdf = resultado['pdf']
                     nombre_pdf = f"Informe_Auditoria_RCF_Ejecutivo_{fecha_str}.pdf"
                     
                     st.success("✅ Ambos informes generados correctamente")
+                    mostrar_tiempos_secciones(resultado)
                     
                     col_a, col_b = st.columns(2)
                     
@@ -506,8 +537,15 @@ def main():
     
     with col1:
         if st.button("📥 Exportar Datos RCF Completos", width="stretch"):
-            from utils.data_loader import exportar_a_excel
-            excel_bytes = exportar_a_excel(datos['rcf'], "RCF_Completo")
+            from utils.data_loader import cargar_datos, exportar_a_excel
+            df_rcf = datos['rcf']
+            archivos_origen = st.session_state.get('archivos_origen')
+            if archivos_origen and not CONFIGURACION.get('columnas_completas'):
+                # Los datos cargados solo tienen las columnas que usan los análisis
+                with st.spinner("Leyendo todas las columnas del RCF..."):
+                    df_rcf = cargar_datos(*archivos_origen, ejercicio_auditado=st.session_state.get('ejercicio_seleccionado') or '',
+                                          columnas_completas=True)['rcf']
+            excel_bytes = exportar_a_excel(df_rcf, "RCF_Completo")
             st.download_button(
                 label="Descargar Excel",
                 data=excel_bytes,
@@ -544,7 +582,27 @@ def main():
     
     with col3:
         if st.button("📥 Exportar Todo (ZIP)", width="stretch"):
-            st.info("Funcionalidad próximamente: Exportará todos los análisis en un archivo ZIP")
+            import tempfile
+            from utils.exportacion_zip import exportar_todo_zip
+
+            with st.spinner("Generando informes y tablas de detalle..."):
+                try:
+                    # El ZIP se escribe en disco y solo se lee entero para entregarlo a la descarga
+                    with tempfile.TemporaryFile() as archivo_zip:
+                        manifiesto = exportar_todo_zip(datos, analisis, archivo_zip, incluir_anexos, procesos_informe,
+                                                       ejercicio=ejercicio)
+                        archivo_zip.seek(0)
+                        zip_bytes = archivo_zip.read()
+                        st.success(f"✅ {len(manifiesto['archivos'])} archivos exportados en {manifiesto['tiempo_total']:.1f} s")
+                        st.download_button(
+                            label="📥 Descargar ZIP",
+                            data=zip_bytes,
+                            file_name=f"Auditoria_RCF_{ejercicio}_{datetime.now().strftime('%Y%m%d')}.zip",
+                            mime="application/zip"
+                        )
+                except Exception as e:
+                    st.error(f"❌ Error al exportar: {str(e)}")
+                    st.exception(e)
     
     st.markdown("---")
     
@@ -0,0 +1,326 @@
+"""
+Almacén de varios ejercicios particionado por año.
+
+Los archivos se leen y normalizan una sola vez (leer_fuentes) y cada tabla se
+reparte en particiones por año: el RCF por su columna 'ejercicio' (o, si falta,
+por el año de anotación o de emisión), FACe por el año de registro y las
+anulaciones por el año de solicitud. El histórico de estados no se particiona,
+igual que en cargar_datos. Seleccionar otro ejercicio (datos_ejercicio) solo une
+particiones ya en memoria, sin volver a leer los Excel, y produce exactamente el
+mismo diccionario de datos que cargar_datos con ese ejercicio.
+
+Para las comparaciones interanuales se guardan, por año, sumas parciales de cada
+indicador (facturas, papel, minutos de anotación, días de pago ponderados por
+importe...), de modo que los KPI de cualquier ejercicio salen de sumas ya
+calculadas. El almacén puede guardarse en disco (Parquet por partición, con
+índice de contenido) y reabrirse mientras los archivos de origen no cambien.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import CONFIGURACION
+from utils.cache import cacheable
+from utils.data_loader import leer_fuentes, completar_datos, calcular_tiempos_anotacion
+from utils.morosidad import calcular_dias_pago
+from utils.notificaciones import notificar as notificar_por_defecto
+
+# Partición de las filas sin año (se usan solo cuando no se filtra por ejercicio)
+SIN_EJERCICIO = -1
+
+# Columnas candidatas para particionar cada tabla, por orden de preferencia
+COLUMNAS_PARTICION = {
+    'rcf': ['ejercicio', 'fecha_anotacion_rcf', 'fecha_emision'],
+    'face': ['fecha_registro'],
+    'anulaciones': ['fecha_solicitud_anulacion'],
+    'estados': [],
+}
+
+DIRECTORIO_POR_DEFECTO = CONFIGURACION.get('directorio_almacen', '.almacen_ejercicios')
+
+# Versión del formato y del cálculo de los agregados guardados en disco: al
+# cambiarla, los almacenes guardados con otra versión se reconstruyen
+VERSION_ALMACEN = 2
+
+# Sumas parciales por ejercicio que alimentan los KPI interanuales
+COLUMNAS_AGREGADOS = [
+    'n_facturas', 'n_papel', 'importe', 'importe_papel',
+    'n_anotacion', 'minutos_anotacion',
+    'n_pagadas', 'importe_pagado', 'dias_pago', 'dias_importe', 'n_retraso',
+]
+
+
+def _anio_particion(df: pd.DataFrame, columna: Optional[str]) -> np.ndarray:
+    """Año de cada fila según la columna de partición (SIN_EJERCICIO si falta)."""
+    if columna is None:
+        return np.full(len(df), SIN_EJERCICIO, dtype=int)
+    if columna == 'ejercicio':
+        anios = pd.to_numeric(df[columna], errors='coerce')
+    else:
+        anios = df[columna].dt.year
+    return anios.fillna(SIN_EJERCICIO).astype(int).to_numpy()
+
+
+def crear_almacen(fuentes: Dict) -> Dict:
+    """
+    Reparte por año las tablas leídas con leer_fuentes. Devuelve un diccionario con
+    'particiones' {tabla: {año: DataFrame}}, 'vacias' {tabla: DataFrame sin filas},
+    'criterios' {tabla: columna de partición o None}, 'ids_face_en_rcf_total' y
+    'agregados' (sumas por año, se calculan al pedirlas).
+    """
+    almacen = {'particiones': {}, 'vacias': {}, 'criterios': {}, 'agregados': {}}
+    for tabla, df in fuentes.items():
+        columna = next((c for c in COLUMNAS_PARTICION.get(tabla, []) if c in df.columns), None)
+        if columna == 'ejercicio':
+            df = df.assign(ejercicio=pd.to_numeric(df['ejercicio'], errors='coerce'))
+        anios = _anio_particion(df, columna)
+        almacen['criterios'][tabla] = columna
+        almacen['vacias'][tabla] = df.iloc[0:0]
+        almacen['particiones'][tabla] = {
+            int(anio): df.iloc[posiciones] for anio, posiciones in pd.Series(anios).groupby(anios).indices.items()
+        }
+
+    df_rcf = fuentes['rcf']
+    almacen['ids_face_en_rcf_total'] = set(df_rcf[df_rcf['ID_FACE'].notna()]['ID_FACE'].astype(str))
+    return almacen
+
+
+def ejercicios_disponibles(almacen: Dict) -> List[int]:
+    """Ejercicios con facturas en el RCF, de más reciente a más antiguo."""
+    return sorted((a for a in almacen['particiones']['rcf'] if a != SIN_EJERCICIO), reverse=True)
+
+
+def _unir(almacen: Dict, tabla: str, anios: Optional[List[int]]) -> pd.DataFrame:
+    """Une las particiones de los años indicados (todas si None) en el orden original de filas."""
+    particiones = almacen['particiones'][tabla]
+    partes = [df for anio, df in particiones.items() if anios is None or anio in anios]
+    if not partes:
+        return almacen['vacias'][tabla].copy()
+    return pd.concat(partes).sort_index()
+
+
+def datos_ejercicio(almacen: Dict, ejercicio_auditado) -> Dict:
+    """
+    Diccionario de datos del ejercicio (el mismo que cargar_datos con ese ejercicio),
+    construido a partir de las particiones; sin ejercicio, con todos los años.
+    """
+    if not ejercicio_auditado:
+        anios_rcf = anios_otros = None
+    else:
+        ejercicio = int(float(ejercicio_auditado))
+        # Con la columna 'ejercicio' se incluye también el año anterior, como en cargar_datos
+        anios_rcf = [ejercicio, ejercicio - 1] if almacen['criterios']['rcf'] == 'ejercicio' else [ejercicio]
+        anios_otros = [ejercicio]
+
+    def _anios(tabla, anios):
+        return anios if almacen['criterios'].get(tabla) else None
+
+    return completar_datos(
+        _unir(almacen, 'rcf', _anios('rcf', anios_rcf)),
+        _unir(almacen, 'face', _anios('face', anios_otros)),
+        _unir(almacen, 'anulaciones', _anios('anulaciones', anios_otros)),
+        _unir(almacen, 'estados', None),
+        almacen['ids_face_en_rcf_total'],
+    )
+
+
+def agregados_ejercicio(df_rcf: pd.DataFrame, df_estados: pd.DataFrame = None) -> Dict[str, float]:
+    """Sumas parciales de los indicadores de un ejercicio (excluye BORRADA)."""
+    if 'estado' in df_rcf.columns:
+        df_rcf = df_rcf[df_rcf['estado'].astype(str).str.upper() != 'BORRADA']
+    importe = pd.to_numeric(df_rcf.get('importe_total', pd.Series(0.0, index=df_rcf.index)), errors='coerce').fillna(0)
+    es_papel = df_rcf['es_papel'].fillna(False).astype(bool) if 'es_papel' in df_rcf.columns else pd.Series(False, index=df_rcf.index)
+
+    agregados = {
+        'n_facturas': len(df_rcf),
+        'n_papel': int(es_papel.sum()),
+        'importe': float(importe.sum()),
+        'importe_papel': float(importe[es_papel].sum()),
+        'n_anotacion': 0, 'minutos_anotacion': 0.0,
+    }
+
+    # Tiempo de anotación: el mismo cómputo que calcular_tiempos_anotacion
+    # (registro en FACe o anotación en RCF -> aceptación)
+    tiempos = calcular_tiempos_anotacion(df_rcf) if len(df_rcf) else pd.DataFrame()
+    if len(tiempos):
+        minutos = tiempos['tiempo_anotacion_min']
+        minutos = minutos[minutos.notna() & (minutos >= 0)]
+        agregados.update(n_anotacion=len(minutos), minutos_anotacion=float(minutos.sum()))
+
+    plazos = calcular_dias_pago(df_rcf, df_estados) if len(df_rcf) else pd.DataFrame()
+    importe_pagado = importe.loc[plazos.index] if len(plazos) else pd.Series(dtype=float)
+    agregados.update(
+        n_pagadas=len(plazos),
+        importe_pagado=float(importe_pagado.sum()),
+        dias_pago=float(plazos['dias_pago'].sum()) if len(plazos) else 0.0,
+        dias_importe=float((plazos['dias_pago'] * importe_pagado).sum()) if len(plazos) else 0.0,
+        n_retraso=int(plazos['con_retraso'].sum()) if len(plazos) else 0,
+    )
+    return agregados
+
+
+def agregados_por_ejercicio(almacen: Dict) -> pd.DataFrame:
+    """Sumas parciales por ejercicio (índice), calculadas una vez por partición del RCF."""
+    df_estados = _unir(almacen, 'estados', None)
+    for anio in ejercicios_disponibles(almacen):
+        if anio not in almacen['agregados']:
+            almacen['agregados'][anio] = agregados_ejercicio(almacen['particiones']['rcf'][anio], df_estados)
+    tabla = pd.DataFrame.from_dict(almacen['agregados'], orient='index', columns=COLUMNAS_AGREGADOS)
+    return tabla.sort_index().rename_axis('Ejercicio')
+
+
+def kpis_por_ejercicio(agregados: pd.DataFrame) -> pd.DataFrame:
+    """KPI de cada ejercicio a partir de sus sumas parciales."""
+    def _cociente(numerador, denominador):
+        return (numerador / denominador.replace(0, np.nan)).astype(float)
+
+    return pd.DataFrame({
+        'Facturas': agregados['n_facturas'].astype(int),
+        'Importe Total': agregados['importe'].round(2),
+        '% Papel': (_cociente(agregados['n_papel'], agregados['n_facturas']) * 100).round(2),
+        '% Importe Papel': (_cociente(agregados['importe_papel'], agregados['importe']) * 100).round(2),
+        'Tiempo Medio Anotacion (min)': _cociente(agregados['minutos_anotacion'], agregados['n_anotacion']).round(1),
+        'Facturas Pagadas': agregados['n_pagadas'].astype(int),
+        'PMP (dias)': _cociente(agregados['dias_importe'], agregados['importe_pagado'])
+                      .fillna(_cociente(agregados['dias_pago'], agregados['n_pagadas'])).round(1),
+        '% Pagadas con Retraso': (_cociente(agregados['n_retraso'], agregados['n_pagadas']) * 100).round(1),
+    }, index=agregados.index)
+
+
+def comparar_ejercicios(almacen: Dict, ejercicio, referencia=None) -> pd.DataFrame:
+    """
+    Comparación de los KPI de un ejercicio con los de referencia (por defecto el
+    anterior): una fila por KPI con ambos valores, la variación y la variación %.
+    """
+    ejercicio = int(float(ejercicio))
+    referencia = ejercicio - 1 if referencia is None else int(float(referencia))
+    kpis = kpis_por_ejercicio(agregados_por_ejercicio(almacen))
+    kpis = kpis.reindex([referencia, ejercicio])
+
+    tabla = kpis.T
+    tabla.columns = [str(referencia), str(ejercicio)]
+    tabla['Variacion'] = tabla[str(ejercicio)] - tabla[str(referencia)]
+    tabla['Variacion %'] = (tabla['Variacion'] / tabla[str(referencia)].abs().replace(0, np.nan) * 100).round(1)
+    return tabla.rename_axis('Indicador').reset_index()
+
+
+@cacheable
+def cargar_almacen(archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados,
+                   _notificar: Callable[[str, str], None] = None) -> Dict:
+    """Lee los archivos una vez y devuelve el almacén con todos sus ejercicios."""
+    notificar = _notificar or notificar_por_defecto
+    fuentes = leer_fuentes(archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados, notificar)
+    notificar('progreso', "Particionando por ejercicio...")
+    return crear_almacen(fuentes)
+
+
+# --- Persistencia en disco -------------------------------------------------------
+
+def huella_archivos(rutas: List) -> str:
+    """Huella (SHA-1) del contenido de los archivos de origen."""
+    h = hashlib.sha1()
+    for ruta in rutas:
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloque)
+        h.update(b'|')
+    return h.hexdigest()
+
+
+def _guardar_particion(df: pd.DataFrame, ruta: Path) -> str:
+    """Guarda en Parquet; si no es posible (pyarrow ausente o tipos mezclados), en pickle."""
+    try:
+        df.to_parquet(ruta.with_suffix('.parquet'))
+        return ruta.with_suffix('.parquet').name
+    except Exception:  # ImportError, ArrowInvalid, ArrowTypeError...
+        ruta.with_suffix('.parquet').unlink(missing_ok=True)
+        df.to_pickle(ruta.with_suffix('.pkl'))
+        return ruta.with_suffix('.pkl').name
+
+
+def _leer_particion(ruta: Path, categorias: Dict[str, list] = None) -> pd.DataFrame:
+    """Lee una partición y restituye las categorías completas de sus columnas categóricas."""
+    df = pd.read_parquet(ruta) if ruta.suffix == '.parquet' else pd.read_pickle(ruta)
+    # Parquet solo conserva las categorías presentes en cada partición
+    for columna, valores in (categorias or {}).items():
+        if columna in df.columns:
+            df[columna] = df[columna].astype(pd.CategoricalDtype(valores))
+    return df
+
+
+def guardar_almacen(almacen: Dict, directorio, huella: str = None) -> None:
+    """Escribe el almacén en directorio/<tabla>/ejercicio=<año>.parquet más indice.json."""
+    directorio = Path(directorio)
+    indice = {'version': VERSION_ALMACEN, 'huella': huella, 'criterios': almacen['criterios'], 'tablas': {}, 'categorias': {},
+              'ids_face_en_rcf_total': sorted(almacen['ids_face_en_rcf_total']),
+              'agregados': {str(a): v for a, v in almacen['agregados'].items()}}
+    for tabla, particiones in almacen['particiones'].items():
+        carpeta = directorio / tabla
+        carpeta.mkdir(parents=True, exist_ok=True)
+        archivos = {'vacia': _guardar_particion(almacen['vacias'][tabla], carpeta / 'vacia')}
+        for anio, df in particiones.items():
+            archivos[str(anio)] = _guardar_particion(df, carpeta / f'ejercicio={anio}')
+        indice['tablas'][tabla] = archivos
+        vacia = almacen['vacias'][tabla]
+        indice['categorias'][tabla] = {
+            str(col): vacia[col].cat.categories.tolist()
+            for col in vacia.columns if isinstance(vacia[col].dtype, pd.CategoricalDtype)
+        }
+    (directorio / 'indice.json').write_text(json.dumps(indice, ensure_ascii=False, indent=1), encoding='utf-8')
+
+
+def abrir_almacen(directorio, huella: str = None) -> Optional[Dict]:
+    """
+    Almacén guardado en directorio, o None si no existe, se guardó con otra
+    VERSION_ALMACEN o su huella no coincide.
+    """
+    directorio = Path(directorio)
+    try:
+        indice = json.loads((directorio / 'indice.json').read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if indice.get('version') != VERSION_ALMACEN:
+        return None
+    if huella is not None and indice.get('huella') != huella:
+        return None
+
+    almacen = {'particiones': {}, 'vacias': {}, 'criterios': indice['criterios'],
+               'ids_face_en_rcf_total': set(indice['ids_face_en_rcf_total']),
+               'agregados': {int(a): v for a, v in indice.get('agregados', {}).items()}}
+    for tabla, archivos in indice['tablas'].items():
+        archivos = dict(archivos)
+        categorias = indice.get('categorias', {}).get(tabla)
+        almacen['vacias'][tabla] = _leer_particion(directorio / tabla / archivos.pop('vacia'), categorias)
+        almacen['particiones'][tabla] = {
+            int(anio): _leer_particion(directorio / tabla / archivo, categorias) for anio, archivo in archivos.items()
+        }
+    return almacen
+
+
+def almacen_desde_archivos(archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados,
+                           directorio=None, notificar: Callable[[str, str], None] = None) -> Dict:
+    """
+    Almacén de los archivos indicados: se reabre desde disco si ya se guardó con
+    el mismo contenido de origen y la misma VERSION_ALMACEN; si no, se leen los
+    Excel y se guarda.
+    """
+    notificar = notificar or notificar_por_defecto
+    directorio = Path(directorio or DIRECTORIO_POR_DEFECTO)
+    huella = huella_archivos([archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados])
+
+    almacen = abrir_almacen(directorio, huella)
+    if almacen is not None:
+        notificar('progreso', f"Almacén de ejercicios reutilizado desde {directorio}")
+        return almacen
+
+    fuentes = leer_fuentes(archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados, notificar)
+    almacen = crear_almacen(fuentes)
+    agregados_por_ejercicio(almacen)
+    guardar_almacen(almacen, directorio, huella)
+    notificar('progreso', f"Almacén de ejercicios guardado en {directorio}")
+    return almacen
@@ -6,11 +6,11 @@ llega a la página de generación de informes sin haber visitado previamente tod
 páginas de análisis. Se basan en la misma lógica de las páginas correspondientes.
 """
 
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
 from typing import Dict
 
-from config.settings import CONFIGURACION, CONFIGURACION_TRANSICION_2025
+from config.settings import CONFIGURACION_TRANSICION_2025
 from utils.data_loader import (
     obtener_facturas_papel_sospechosas,
     clasificar_procedimiento,
@@ -20,6 +20,10 @@ from utils.data_loader import (
     identificar_facturas_retenidas,
 )
 from utils.validaciones import aplicar_todas_validaciones, analizar_rechazos
+from utils.morosidad import calcular_morosidad
+from utils.ciclo_vida import indice_ciclo_vida_memoizado, serie_pendientes, fecha_corte_auditoria
+from utils.cache import huella_dataframe, memoizar
+from utils.antiguedad import calcular_distribucion_antiguedad
 
 
 def _df_rcf_activo(datos: Dict) -> pd.DataFrame:
@@ -30,10 +34,49 @@ def _df_rcf_activo(datos: Dict) -> pd.DataFrame:
     return df_rcf
 
 
-def calcular_facturas_papel(df_rcf: pd.DataFrame) -> Dict:
-    """Calcula el análisis de facturas en papel (Sección V.1)."""
+# Estados que se agrupan como "rechazadas/anuladas" en los desgloses por entidad
+ESTADOS_NEGATIVOS = ('BORRADA', 'RECHAZADA', 'ANULADA')
+
+COLUMNAS_RESUMEN_ENTIDAD = ['Papel_Tram', 'Papel_Anul', 'Face_Tram', 'Face_Anul']
+
+
+def resumen_por_entidad(df_rcf: pd.DataFrame, estados_negativos=ESTADOS_NEGATIVOS,
+                        fila_totales: bool = True) -> pd.DataFrame:
+    """
+    Desglose de facturas por entidad: Total, Papel_Tram, Papel_Anul, Face_Tram,
+    Face_Anul y Porc_Papel (% de facturas en papel sobre el total de la entidad).
+
+    Las máscaras papel/FACe y tramitada/anulada se calculan una sola vez para todo
+    el DataFrame y el recuento por entidad sale de un único crosstab.
+    """
+    es_papel = df_rcf['es_papel'].fillna(False).astype(bool).to_numpy()
+    es_negativo = (
+        df_rcf['estado'].astype(str).str.upper().isin(estados_negativos).to_numpy()
+        if 'estado' in df_rcf.columns else np.zeros(len(df_rcf), dtype=bool)
+    )
+    categoria = pd.Categorical.from_codes(
+        np.where(es_papel, 0, 2) + es_negativo.astype(int), categories=COLUMNAS_RESUMEN_ENTIDAD
+    )
+
+    tabla = pd.crosstab(df_rcf['entidad'].to_numpy(), categoria, dropna=False)
+    tabla = tabla.reindex(columns=COLUMNAS_RESUMEN_ENTIDAD, fill_value=0).astype(int)
+    tabla.insert(0, 'Total', tabla.sum(axis=1))
+    tabla = tabla.rename_axis('Entidad').rename_axis(None, axis=1).reset_index()
+    tabla = tabla.sort_values('Total', ascending=False, kind='stable').reset_index(drop=True)
+
+    if fila_totales:
+        totales = {'Entidad': 'Totales', **tabla[['Total'] + COLUMNAS_RESUMEN_ENTIDAD].sum().astype(int).to_dict()}
+        tabla = pd.concat([tabla, pd.DataFrame([totales])], ignore_index=True)
+
+    total = tabla['Total'].replace(0, np.nan)
+    tabla['Porc_Papel'] = ((tabla['Papel_Tram'] + tabla['Papel_Anul']) / total * 100).fillna(0)
+    return tabla
+
+
+def calcular_facturas_papel(df_rcf: pd.DataFrame, ejercicio=None) -> Dict:
+    """Calcula el análisis de facturas en papel (Sección V.1) del ejercicio indicado."""
     facturas_papel = df_rcf[df_rcf['es_papel'] == True].copy() if 'es_papel' in df_rcf.columns else pd.DataFrame()
-    facturas_sospechosas = obtener_facturas_papel_sospechosas(df_rcf)
+    facturas_sospechosas = obtener_facturas_papel_sospechosas(df_rcf, ejercicio)
     tabla_sospechosas = pd.DataFrame()
 
     if len(facturas_sospechosas) > 0:
@@ -273,27 +316,81 @@ def calcular_tramitacion(datos: Dict) -> Dict:
     }
 
 
-def calcular_obligaciones(df_rcf: pd.DataFrame) -> Dict:
-    """Calcula el análisis de obligaciones (Sección V.5)."""
-    fecha_actual = datetime.now()
-    fecha_limite = fecha_actual - timedelta(days=90)
-
-    estados_pendientes = ['REGISTRADA', 'VERIFICADA', 'RECIBIDA', 'CONFORMADA']
-
-    if 'fecha_anotacion_rcf' in df_rcf.columns and 'estado' in df_rcf.columns:
-        df_rcf['fecha_anotacion_rcf'] = pd.to_datetime(df_rcf['fecha_anotacion_rcf'])
-        facturas_pendientes_3m = df_rcf[
-            (df_rcf['fecha_anotacion_rcf'] <= fecha_limite) &
-            (df_rcf['estado'].isin(estados_pendientes))
-        ].copy()
-        facturas_pendientes_3m['dias_pendiente'] = (fecha_actual - facturas_pendientes_3m['fecha_anotacion_rcf']).dt.days
-    else:
-        facturas_pendientes_3m = pd.DataFrame()
+# Antigüedad (días desde la anotación) a partir de la cual una factura pendiente
+# cuenta como "más de 3 meses": coincide con los tramos '91-180' y '>180' de la
+# distribución por antigüedad
+DIAS_PENDIENTE_3_MESES = 90
+
+_UN_DIA_NS = 86_400 * 10**9
+
+
+def calcular_pendientes_3_meses(df_rcf: pd.DataFrame, df_estados: pd.DataFrame = None,
+                                fecha_corte=None) -> pd.DataFrame:
+    """
+    Facturas pendientes de reconocimiento a la fecha de corte con más de 3 meses
+    desde su anotación, con la fecha de anotación ('fecha_anotacion_rcf') y los días
+    transcurridos hasta el corte ('dias_pendiente').
+
+    Se obtienen del índice de ciclo de vida (ver utils.ciclo_vida), como la
+    distribución por antigüedad: la situación de cada factura es la que tenía a la
+    fecha de corte según el histórico de estados, no su estado actual, y la fecha de
+    anotación admite la misma alternativa (fecha_codigo_f).
+
+    El resultado se memoiza por (huella del RCF, huella del histórico, fecha de corte).
+    """
+    fecha_corte = fecha_corte_auditoria(fecha_corte)
+
+    def _calcular() -> pd.DataFrame:
+        indice = indice_ciclo_vida_memoizado(df_rcf, df_estados)
+        t_corte = fecha_corte.value
+        dias = (t_corte - indice['inicio']) // _UN_DIA_NS
+        mask = (indice['fin'] > t_corte) & (dias > DIAS_PENDIENTE_3_MESES)
+        if not mask.any():
+            return pd.DataFrame()
+        pendientes = df_rcf.take(indice['posiciones'][mask])
+        pendientes['fecha_anotacion_rcf'] = pd.to_datetime(indice['inicio'][mask])
+        pendientes['dias_pendiente'] = dias[mask]
+        return pendientes
+
+    huella_estados = huella_dataframe(df_estados) if df_estados is not None else None
+    clave = (huella_dataframe(df_rcf), huella_estados, fecha_corte)
+    return memoizar('pendientes_3_meses', clave, _calcular)
+
+
+def calcular_evolucion_pendientes_3_meses(df_rcf: pd.DataFrame, df_estados: pd.DataFrame = None,
+                                          fecha_corte=None) -> pd.DataFrame:
+    """
+    Facturas con más de 3 meses sin reconocimiento al cierre de cada mes del año de
+    la fecha de corte, hasta esa fecha. Se reconstruye el estado de cada factura en el tiempo a
+    partir del histórico de estados y se evalúan todos los cierres de mes en un único
+    barrido (ver utils.ciclo_vida).
+    """
+    fecha_corte = fecha_corte_auditoria(fecha_corte)
+    # MonthEnd en lugar del alias 'ME', que no existe antes de pandas 2.2
+    fines_de_mes = pd.date_range(pd.Timestamp(year=fecha_corte.year, month=1, day=1), fecha_corte,
+                                 freq=pd.offsets.MonthEnd())
+
+    def _calcular() -> pd.DataFrame:
+        indice = indice_ciclo_vida_memoizado(df_rcf, df_estados)
+        if indice['n_facturas'] == 0 or len(fines_de_mes) == 0:
+            return pd.DataFrame()
+        # Mismo criterio que calcular_pendientes_3_meses: más de DIAS_PENDIENTE_3_MESES días
+        return serie_pendientes(indice, fines_de_mes, antiguedad_minima_dias=DIAS_PENDIENTE_3_MESES + 1)
+
+    huella_estados = huella_dataframe(df_estados) if df_estados is not None else None
+    clave = (huella_dataframe(df_rcf), huella_estados, fecha_corte)
+    return memoizar('evolucion_pendientes_3_meses', clave, _calcular)
+
+
+def calcular_obligaciones(df_rcf: pd.DataFrame, df_estados: pd.DataFrame = None, fecha_corte=None) -> Dict:
+    """Calcula el análisis de obligaciones y morosidad (Sección V.5) a la fecha de corte."""
+    fecha_corte = fecha_corte_auditoria(fecha_corte)
+    facturas_pendientes_3m = calcular_pendientes_3_meses(df_rcf, df_estados, fecha_corte)
+    antiguedad = calcular_distribucion_antiguedad(df_rcf, df_estados, fecha_corte)
 
     df_pendientes_informe = pd.DataFrame()
     ranking_oc_pendientes_informe = pd.DataFrame()
     ranking_ut_pendientes_informe = pd.DataFrame()
-    distribucion_antiguedad_informe = pd.DataFrame()
 
     if len(facturas_pendientes_3m) > 0:
         cols_pend = [c for c in [
@@ -333,17 +430,47 @@ def calcular_obligaciones(df_rcf: pd.DataFrame) -> Dict:
         'detalle_pendientes': df_pendientes_informe,
         'ranking_oc_pendientes': ranking_oc_pendientes_informe,
         'ranking_ut_pendientes': ranking_ut_pendientes_informe,
-        'distribucion_antiguedad': distribucion_antiguedad_informe,
-        'morosidad': {}
+        'distribucion_antiguedad': antiguedad['total'],
+        'antiguedad': antiguedad,
+        'morosidad': calcular_morosidad(df_rcf, df_estados),
+        'evolucion_pendientes_3_meses': calcular_evolucion_pendientes_3_meses(df_rcf, df_estados, fecha_corte),
+        'fecha_corte': fecha_corte,
     }
 
 
-def precalcular_analisis_faltantes(datos: Dict, analisis: Dict) -> Dict:
-    """Precalcula los análisis que no estén presentes en session_state."""
+def facturas_papel_por_area(df_rcf: pd.DataFrame, patron_entidad: str = 'DIPU') -> Dict:
+    """
+    Facturas en papel por código de área ('area_cod', calculado al cargar) de las
+    entidades cuyo nombre contiene patron_entidad. Devuelve {'tabla': Área / Nº
+    Facturas ordenada por área, 'total_papel': facturas en papel de la entidad}.
+    """
+    def _calcular() -> Dict:
+        es_entidad = df_rcf['entidad'].astype(str).str.upper().str.contains(patron_entidad, na=False)
+        papel = df_rcf.loc[df_rcf['es_papel'].fillna(False).astype(bool) & es_entidad, 'area_cod']
+        tabla = (
+            papel.value_counts(sort=False)
+            .loc[lambda conteo: conteo > 0]
+            .rename_axis('Área')
+            .reset_index(name='Nº Facturas')
+        )
+        tabla['Área'] = tabla['Área'].astype(str)
+        tabla = tabla.sort_values('Área', ignore_index=True)
+        return {'tabla': tabla, 'total_papel': len(papel)}
+
+    return memoizar('facturas_papel_por_area', (huella_dataframe(df_rcf), patron_entidad), _calcular)
+
+
+def precalcular_analisis_faltantes(datos: Dict, analisis: Dict, fecha_corte=None, ejercicio=None) -> Dict:
+    """
+    Precalcula los análisis que no estén presentes en session_state, para el
+    ejercicio indicado (por defecto, el de CONFIGURACION) y la fecha de corte
+    (por defecto, el cierre de ese ejercicio).
+    """
     df_rcf = _df_rcf_activo(datos)
+    fecha_corte = fecha_corte_auditoria(fecha_corte, ejercicio)
 
     if 'facturas_papel' not in analisis:
-        analisis['facturas_papel'] = calcular_facturas_papel(df_rcf)
+        analisis['facturas_papel'] = calcular_facturas_papel(df_rcf, ejercicio)
 
     if 'anotacion' not in analisis:
         analisis['anotacion'] = calcular_anotacion(datos)
@@ -355,6 +482,6 @@ def precalcular_analisis_faltantes(datos: Dict, analisis: Dict) -> Dict:
         analisis['tramitacion'] = calcular_tramitacion(datos)
 
     if 'obligaciones' not in analisis:
-        analisis['obligaciones'] = calcular_obligaciones(df_rcf)
+        analisis['obligaciones'] = calcular_obligaciones(df_rcf, datos.get('estados'), fecha_corte)
 
     return analisis
@@ -0,0 +1,119 @@
+"""
+Distribución por antigüedad de las facturas pendientes de reconocimiento.
+
+Las facturas pendientes a la fecha de corte (según el índice de ciclo de vida) se
+clasifican en tramos de antigüedad configurables (CONFIGURACION['tramos_antiguedad_dias'])
+con una única llamada a np.digitize. Los recuentos e importes por tramo se obtienen
+para cada agrupación (entidad, oficina contable, unidad tramitadora) con np.bincount
+sobre la combinación grupo × tramo.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Sequence
+
+from config.settings import CONFIGURACION
+from utils.cache import huella_dataframe, memoizar
+from utils.ciclo_vida import indice_ciclo_vida_memoizado, fecha_corte_auditoria
+
+TRAMOS_ANTIGUEDAD_POR_DEFECTO = (30, 60, 90, 180)
+
+# Agrupaciones del desglose: columna del RCF -> clave del resultado y etiqueta
+AGRUPACIONES_ANTIGUEDAD = {
+    'entidad': ('por_entidad', 'Entidad'),
+    'codigo_oc': ('por_oc', 'Código OC'),
+    'codigo_ut': ('por_ut', 'Código UT'),
+}
+
+_UN_DIA_NS = 86_400 * 10**9
+
+
+def etiquetas_tramos(limites: Sequence[int]) -> List[str]:
+    """Etiquetas legibles de los tramos: [30, 60] -> ['0-30 días', '31-60 días', '>60 días']."""
+    etiquetas = []
+    anterior = -1
+    for limite in limites:
+        etiquetas.append(f'{anterior + 1}-{limite} días')
+        anterior = limite
+    etiquetas.append(f'>{anterior} días')
+    return etiquetas
+
+
+def _tabla_por_tramos(codigos: np.ndarray, grupos: pd.Index, tramo: np.ndarray, importe: np.ndarray,
+                      etiquetas: List[str], etiqueta_grupo: str) -> Dict[str, pd.DataFrame]:
+    """Recuentos e importes grupo × tramo con un bincount sobre la clave combinada."""
+    n_tramos = len(etiquetas)
+    clave = codigos * n_tramos + tramo
+    tamano = len(grupos) * n_tramos
+    facturas = np.bincount(clave, minlength=tamano).reshape(len(grupos), n_tramos)
+    importes = np.bincount(clave, weights=importe, minlength=tamano).reshape(len(grupos), n_tramos)
+
+    resultado = {}
+    for nombre, valores in [('facturas', facturas), ('importe', importes.round(2))]:
+        df = pd.DataFrame(valores, columns=etiquetas, index=pd.Index(grupos, name=etiqueta_grupo))
+        df['Total'] = df.sum(axis=1)
+        resultado[nombre] = df.sort_values('Total', ascending=False).reset_index()
+    return resultado
+
+
+def calcular_distribucion_antiguedad(df_rcf: pd.DataFrame, df_estados: pd.DataFrame = None,
+                                     fecha_corte=None, limites: Sequence[int] = None) -> Dict:
+    """
+    Clasifica por antigüedad las facturas pendientes de reconocimiento a la fecha de corte.
+
+    Devuelve un diccionario con:
+      - 'total': DataFrame (Tramo, Nº Facturas, Importe, % Facturas, % Importe)
+      - 'por_entidad', 'por_oc', 'por_ut': {'facturas': DataFrame, 'importe': DataFrame}
+        con una fila por grupo y una columna por tramo
+      - 'tramos', 'fecha_corte', 'total_pendientes', 'importe_pendiente'
+
+    El resultado se memoiza por (huella de los datos, fecha de corte, tramos).
+    """
+    fecha_corte = fecha_corte_auditoria(fecha_corte)
+    if limites is None:
+        limites = CONFIGURACION.get('tramos_antiguedad_dias', TRAMOS_ANTIGUEDAD_POR_DEFECTO)
+    limites = tuple(int(x) for x in limites)
+
+    def _calcular() -> Dict:
+        etiquetas = etiquetas_tramos(limites)
+        indice = indice_ciclo_vida_memoizado(df_rcf, df_estados)
+
+        t_corte = fecha_corte.value
+        abiertas = (indice['inicio'] <= t_corte) & (indice['fin'] > t_corte)
+        dias = (t_corte - indice['inicio'][abiertas]) // _UN_DIA_NS
+        importe = indice['importe'][abiertas]
+        posiciones = indice['posiciones'][abiertas]
+
+        # Una única clasificación en tramos, compartida por todas las agrupaciones
+        tramo = np.digitize(dias, limites, right=True)
+
+        n_facturas = np.bincount(tramo, minlength=len(etiquetas))
+        importes = np.bincount(tramo, weights=importe, minlength=len(etiquetas))
+        total_facturas = n_facturas.sum()
+        total_importe = importes.sum()
+        resultado = {
+            'total': pd.DataFrame({
+                'Tramo': etiquetas,
+                'Nº Facturas': n_facturas,
+                'Importe': importes.round(2),
+                '% Facturas': (n_facturas / total_facturas * 100).round(1) if total_facturas else 0.0,
+                '% Importe': (importes / total_importe * 100).round(1) if total_importe else 0.0,
+            }),
+            'tramos': etiquetas,
+            'fecha_corte': fecha_corte,
+            'total_pendientes': int(total_facturas),
+            'importe_pendiente': round(float(total_importe), 2),
+        }
+
+        for columna, (clave, etiqueta) in AGRUPACIONES_ANTIGUEDAD.items():
+            if columna not in df_rcf.columns:
+                continue
+            valores = df_rcf[columna].take(posiciones).fillna('N/D').astype(str).replace({'': 'N/D', 'nan': 'N/D'})
+            codigos, grupos = pd.factorize(valores)
+            resultado[clave] = _tabla_por_tramos(codigos, grupos, tramo, importe, etiquetas, etiqueta)
+
+        return resultado
+
+    huella_estados = huella_dataframe(df_estados) if df_estados is not None else None
+    clave = (huella_dataframe(df_rcf), huella_estados, fecha_corte, limites)
+    return memoizar('distribucion_antiguedad', clave, _calcular)
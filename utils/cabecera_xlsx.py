@@ -0,0 +1,146 @@
+"""
+Lectura de la fila de encabezados de un libro .xlsx sin cargarlo completo.
+
+Un .xlsx es un zip de XML: se localiza la primera hoja (la que lee pd.read_excel
+por defecto) y se recorre su XML en flujo hasta terminar la primera fila. Las
+cadenas compartidas se leen solo hasta el último índice que usa el encabezado,
+que en las exportaciones habituales son las primeras. La dimensión declarada de
+la hoja (<dimension ref="A1:AG14751"/>) da el número de filas sin recorrerlas.
+
+Si el archivo no tiene esa estructura se recurre a openpyxl en modo de solo
+lectura y, si tampoco es posible (p. ej. un .xls antiguo), se devuelve None.
+"""
+
+import posixpath
+import re
+import zipfile
+from typing import Dict, List, Optional
+from xml.etree import ElementTree
+
+NS_HOJA = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+NS_PAQUETE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+_REFERENCIA = re.compile(r'([A-Z]+)(\d+)')
+
+
+def _indice_columna(letras: str) -> int:
+    """'A' -> 0, 'Z' -> 25, 'AA' -> 26..."""
+    indice = 0
+    for letra in letras:
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+
+def _ruta_primera_hoja(libro: zipfile.ZipFile) -> str:
+    """Ruta dentro del zip de la primera hoja según workbook.xml y sus relaciones."""
+    workbook = ElementTree.fromstring(libro.read('xl/workbook.xml'))
+    hoja = workbook.find(f'{NS_HOJA}sheets/{NS_HOJA}sheet')
+    id_relacion = hoja.get(f'{NS_REL}id')
+    relaciones = ElementTree.fromstring(libro.read('xl/_rels/workbook.xml.rels'))
+    for relacion in relaciones.iter(f'{NS_PAQUETE}Relationship'):
+        if relacion.get('Id') == id_relacion:
+            destino = relacion.get('Target')
+            return destino.lstrip('/') if destino.startswith('/') else posixpath.normpath(posixpath.join('xl', destino))
+    raise KeyError(id_relacion)
+
+
+def _cadenas_compartidas(libro: zipfile.ZipFile, hasta: int) -> List[str]:
+    """Cadenas compartidas 0..hasta (inclusive), leyendo sharedStrings.xml en flujo."""
+    cadenas: List[str] = []
+    if hasta < 0 or 'xl/sharedStrings.xml' not in libro.namelist():
+        return cadenas
+    with libro.open('xl/sharedStrings.xml') as xml:
+        for _, elemento in ElementTree.iterparse(xml, events=('end',)):
+            if elemento.tag == f'{NS_HOJA}si':
+                # Texto con formato enriquecido: varias <r><t> dentro del <si>
+                cadenas.append(''.join(t.text or '' for t in elemento.iter(f'{NS_HOJA}t')))
+                elemento.clear()
+                if len(cadenas) > hasta:
+                    break
+    return cadenas
+
+
+def _valor_numerico(texto: str):
+    numero = float(texto)
+    return int(numero) if numero.is_integer() else numero
+
+
+def _cabecera_zip(archivo) -> Dict:
+    with zipfile.ZipFile(archivo) as libro:
+        celdas, dimension = {}, None
+        with libro.open(_ruta_primera_hoja(libro)) as xml:
+            for evento, elemento in ElementTree.iterparse(xml, events=('start', 'end')):
+                if evento == 'start' and elemento.tag == f'{NS_HOJA}dimension':
+                    dimension = elemento.get('ref')
+                elif evento == 'end' and elemento.tag == f'{NS_HOJA}row':
+                    for posicion, celda in enumerate(elemento.iter(f'{NS_HOJA}c')):
+                        referencia = _REFERENCIA.match(celda.get('r') or '')
+                        columna = _indice_columna(referencia.group(1)) if referencia else posicion
+                        tipo = celda.get('t', 'n')
+                        if tipo == 'inlineStr':
+                            valor = ''.join(t.text or '' for t in celda.iter(f'{NS_HOJA}t'))
+                        else:
+                            v = celda.find(f'{NS_HOJA}v')
+                            if v is None or v.text is None:
+                                continue
+                            valor = v.text
+                        celdas[columna] = (tipo, valor)
+                    break
+
+        indices = [int(valor) for tipo, valor in celdas.values() if tipo == 's']
+        cadenas = _cadenas_compartidas(libro, max(indices, default=-1))
+
+    columnas: List = [None] * (max(celdas, default=-1) + 1)
+    for posicion, (tipo, valor) in celdas.items():
+        if tipo == 's':
+            columnas[posicion] = cadenas[int(valor)]
+        elif tipo == 'n':
+            columnas[posicion] = _valor_numerico(valor)
+        elif tipo == 'b':
+            columnas[posicion] = valor == '1'
+        else:
+            columnas[posicion] = valor
+
+    filas = None
+    if dimension and ':' in dimension:
+        inicio, fin = (_REFERENCIA.match(parte) for parte in dimension.split(':'))
+        if inicio and fin:
+            filas = int(fin.group(2)) - int(inicio.group(2))
+    return {'columnas': columnas, 'filas': filas}
+
+
+def _cabecera_openpyxl(archivo) -> Dict:
+    import openpyxl
+
+    libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        primera = list(next(hoja.iter_rows(max_row=1, values_only=True), ()))
+        # Como pd.read_excel, sin las celdas vacías del final
+        while primera and primera[-1] is None:
+            primera.pop()
+        filas = hoja.max_row - 1 if hoja.max_row else None
+        return {'columnas': primera, 'filas': filas}
+    finally:
+        libro.close()
+
+
+def leer_cabecera_xlsx(archivo) -> Optional[Dict]:
+    """
+    Encabezados de la primera hoja y número de filas de datos declarado:
+    {'columnas': [...], 'filas': int o None}. Acepta una ruta o un archivo abierto
+    (se deja en la posición en que estaba). None si el archivo no es un .xlsx legible.
+    """
+    posicion = archivo.tell() if hasattr(archivo, 'tell') else None
+    try:
+        for lector in (_cabecera_zip, _cabecera_openpyxl):
+            try:
+                return lector(archivo)
+            except Exception:
+                if posicion is not None:
+                    archivo.seek(posicion)
+        return None
+    finally:
+        if posicion is not None:
+            archivo.seek(posicion)
@@ -0,0 +1,175 @@
+"""
+Memoización en memoria de cálculos costosos sobre DataFrames.
+
+La clave de cada resultado incluye una huella del contenido del DataFrame, de modo
+que el mismo cálculo sobre los mismos datos se reutiliza entre recargas de página
+(Streamlit) y entre llamadas del generador de informes, y se invalida solo cuando
+cambian los datos o los parámetros.
+
+Las funciones de carga marcadas con @cacheable usan además el backend de caché
+que registre la interfaz (st.cache_data en la aplicación, ver
+utils/streamlit_adaptadores.py); sin backend registrado se ejecutan sin caché.
+"""
+
+import functools
+import hashlib
+import itertools
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+import numpy as np
+import pandas as pd
+
+MAX_ENTRADAS_POR_DEFECTO = 16
+
+# Resultados memoizados por espacio de nombres (uno por tipo de cálculo)
+_MEMORIA: Dict[str, OrderedDict] = {}
+
+# Backend de caché para @cacheable: recibe una función y devuelve su versión cacheada
+_BACKEND: Callable[[Callable], Callable] = None
+
+# Versiones cacheadas por el backend actual, por función original
+_CACHEADAS: Dict[Callable, Callable] = {}
+
+# Huellas ya calculadas, por id() del DataFrame mientras el objeto siga vivo
+_HUELLAS: Dict[int, str] = {}
+
+# Identificadores de conjunto de datos, por id() del objeto mientras siga vivo
+_IDENTIFICADORES: Dict[int, int] = {}
+_CONTADOR_IDENTIFICADORES = itertools.count(1)
+
+
+def huella_dataframe(df: pd.DataFrame) -> str:
+    """
+    Huella (SHA-1) del contenido de un DataFrame: columnas, tipos, índice y valores.
+    Se calcula una sola vez por objeto; si el DataFrame se modifica in situ después
+    de calcularla, debe usarse una copia.
+    """
+    clave = id(df)
+    if clave in _HUELLAS:
+        return _HUELLAS[clave]
+
+    h = hashlib.sha1()
+    h.update(repr(list(zip(df.columns.astype(str), df.dtypes.astype(str)))).encode())
+    try:
+        valores = pd.util.hash_pandas_object(df, index=True)
+    except TypeError:
+        # Celdas no hashables (listas, diccionarios): se usa su representación textual
+        valores = pd.util.hash_pandas_object(df.astype(str), index=True)
+    h.update(np.ascontiguousarray(valores.to_numpy()).tobytes())
+    huella = h.hexdigest()
+
+    _HUELLAS[clave] = huella
+    weakref.finalize(df, _HUELLAS.pop, clave, None)
+    return huella
+
+
+def identificador_dataset(df: Any) -> int:
+    """
+    Identificador de un objeto (DataFrame) mientras siga vivo, sin leer su
+    contenido. A diferencia de id(), no se reutiliza cuando el objeto se libera,
+    por lo que puede usarse como parte de una clave de memoización. Como en
+    huella_dataframe, el objeto no debe modificarse in situ.
+    """
+    clave = id(df)
+    if clave not in _IDENTIFICADORES:
+        _IDENTIFICADORES[clave] = next(_CONTADOR_IDENTIFICADORES)
+        weakref.finalize(df, _IDENTIFICADORES.pop, clave, None)
+    return _IDENTIFICADORES[clave]
+
+
+def huella_objeto(obj: Any) -> str:
+    """
+    Huella (SHA-1) estable de una estructura de resultados: diccionarios, listas,
+    conjuntos, DataFrames, Series, arrays de numpy y escalares. Dos estructuras con
+    el mismo contenido producen la misma huella en cualquier proceso.
+    """
+    h = hashlib.sha1()
+
+    def _actualizar(valor: Any) -> None:
+        if isinstance(valor, pd.DataFrame):
+            h.update(b'D' + huella_dataframe(valor).encode())
+        elif isinstance(valor, pd.Series):
+            h.update(b'S' + huella_dataframe(valor.to_frame()).encode())
+        elif isinstance(valor, np.ndarray):
+            h.update(b'A' + str(valor.dtype).encode() + repr(valor.shape).encode())
+            h.update(np.ascontiguousarray(valor).tobytes() if valor.dtype != object else repr(valor.tolist()).encode())
+        elif isinstance(valor, dict):
+            h.update(b'{')
+            for clave in sorted(valor, key=repr):
+                h.update(repr(clave).encode())
+                _actualizar(valor[clave])
+            h.update(b'}')
+        elif isinstance(valor, (list, tuple)):
+            h.update(b'[')
+            for elemento in valor:
+                _actualizar(elemento)
+            h.update(b']')
+        elif isinstance(valor, (set, frozenset)):
+            h.update(b'<' + repr(sorted(map(repr, valor))).encode() + b'>')
+        else:
+            h.update(repr(valor).encode())
+
+    _actualizar(obj)
+    return h.hexdigest()
+
+
+def memoizar(espacio: str, clave: Hashable, calcular: Callable[[], Any],
+             max_entradas: int = MAX_ENTRADAS_POR_DEFECTO) -> Any:
+    """
+    Devuelve el resultado memoizado para la clave o lo calcula y lo guarda,
+    descartando el menos usado recientemente si se supera max_entradas.
+    """
+    memoria = _MEMORIA.setdefault(espacio, OrderedDict())
+    if clave in memoria:
+        memoria.move_to_end(clave)
+        return memoria[clave]
+
+    resultado = calcular()
+    memoria[clave] = resultado
+    while len(memoria) > max_entradas:
+        memoria.popitem(last=False)
+    return resultado
+
+
+def limpiar_memoria(espacio: str = None) -> None:
+    """Vacía la memoria de un espacio de nombres o de todos."""
+    if espacio is None:
+        _MEMORIA.clear()
+    else:
+        _MEMORIA.pop(espacio, None)
+
+
+def configurar_backend_cache(backend: Callable[[Callable], Callable] = None) -> None:
+    """Registra el backend de caché de las funciones @cacheable (None: sin caché)."""
+    global _BACKEND
+    if backend is not _BACKEND:
+        _BACKEND = backend
+        _CACHEADAS.clear()
+
+
+def cacheable(funcion: Callable) -> Callable:
+    """
+    Marca una función para cachearse con el backend registrado. El backend se
+    resuelve en cada llamada, de modo que puede registrarse después de importar
+    el módulo que define la función.
+    """
+    def _version_actual() -> Callable:
+        if _BACKEND is None:
+            return funcion
+        if funcion not in _CACHEADAS:
+            _CACHEADAS[funcion] = _BACKEND(funcion)
+        return _CACHEADAS[funcion]
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        return _version_actual()(*args, **kwargs)
+
+    def limpiar() -> None:
+        version = _version_actual()
+        if hasattr(version, 'clear'):
+            version.clear()
+
+    envoltura.clear = limpiar
+    return envoltura
@@ -0,0 +1,202 @@
+"""
+Caché en disco de los informes generados, direccionada por contenido.
+
+La clave de cada informe es la huella de todo lo que determina su contenido:
+los datos cargados (una huella por archivo), los resultados de cada análisis,
+CONFIGURACION, CONFIGURACION_INFORME, las opciones de generación y la fecha del
+informe. Si nada cambia, el informe se sirve desde disco sin regenerarlo, también
+a otros usuarios de la misma instalación.
+
+El índice (indice.json) guarda las huellas por componente de cada informe, de modo
+que cuando un informe no está en caché se registra qué componentes han cambiado
+respecto al último generado en ese formato. Al superar el máximo de informes o de
+megabytes se descartan los menos usados recientemente.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config.settings import CONFIGURACION, CONFIGURACION_INFORME
+from utils.cache import huella_objeto
+from utils.ciclo_vida import ejercicio_auditado
+
+DIRECTORIO_POR_DEFECTO = '.cache_informes'
+MAX_INFORMES_POR_DEFECTO = 20
+MAX_MB_POR_DEFECTO = 200
+
+EXTENSIONES = {'word': 'docx', 'pdf': 'pdf'}
+
+# Las sesiones de Streamlit comparten proceso: el índice se actualiza bajo un cerrojo
+_CERROJO = threading.Lock()
+
+
+def directorio_cache() -> Path:
+    return Path(CONFIGURACION.get('directorio_cache_informes') or DIRECTORIO_POR_DEFECTO)
+
+
+def huellas_informe(datos: dict, analisis: dict, formato: str, opciones: dict = None) -> Dict[str, str]:
+    """
+    Huellas por componente de un informe: 'datos.<archivo>', 'analisis.<seccion>',
+    'configuracion', 'configuracion_informe', 'opciones' y 'fecha'.
+    """
+    huellas = {f'datos.{clave}': huella_objeto(valor) for clave, valor in datos.items()}
+    huellas.update({f'analisis.{clave}': huella_objeto(valor) for clave, valor in analisis.items()})
+    huellas['configuracion'] = huella_objeto(CONFIGURACION)
+    huellas['configuracion_informe'] = huella_objeto(CONFIGURACION_INFORME)
+    huellas['opciones'] = huella_objeto({'formato': formato, **(opciones or {})})
+    # El informe lleva la fecha (sin hora) de generación: la caché vale para el mismo día
+    huellas['fecha'] = datetime.now().strftime('%Y-%m-%d')
+    return huellas
+
+
+def clave_informe(huellas: Dict[str, str]) -> str:
+    h = hashlib.sha1()
+    for componente in sorted(huellas):
+        h.update(f'{componente}={huellas[componente]};'.encode())
+    return h.hexdigest()
+
+
+def componentes_cambiados(anteriores: Dict[str, str], actuales: Dict[str, str]) -> List[str]:
+    """Componentes añadidos, eliminados o con distinta huella entre dos informes."""
+    return sorted(c for c in set(anteriores) | set(actuales) if anteriores.get(c) != actuales.get(c))
+
+
+def _leer_indice(directorio: Path) -> dict:
+    try:
+        with open(directorio / 'indice.json', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'informes': {}, 'ultimo_por_formato': {}}
+
+
+def _escribir_atomico(ruta: Path, contenido: bytes) -> None:
+    """Escribe en un temporal del mismo directorio y lo renombra, para no dejar archivos a medias."""
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, prefix='.tmp_')
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _guardar_indice(directorio: Path, indice: dict) -> None:
+    _escribir_atomico(directorio / 'indice.json', json.dumps(indice, ensure_ascii=False, indent=1).encode('utf-8'))
+
+
+def _aplicar_lru(directorio: Path, indice: dict) -> None:
+    """Descarta los informes menos usados hasta cumplir los límites de número y tamaño."""
+    max_informes = int(CONFIGURACION.get('max_informes_cache', MAX_INFORMES_POR_DEFECTO))
+    max_bytes = float(CONFIGURACION.get('max_mb_cache_informes', MAX_MB_POR_DEFECTO)) * 1024**2
+
+    informes = indice['informes']
+    orden = sorted(informes, key=lambda clave: informes[clave]['ultimo_acceso'])
+    total_bytes = sum(entrada['tamano'] for entrada in informes.values())
+    while orden and (len(informes) > max_informes or total_bytes > max_bytes):
+        clave = orden.pop(0)
+        entrada = informes.pop(clave)
+        total_bytes -= entrada['tamano']
+        try:
+            os.remove(directorio / entrada['archivo'])
+        except OSError:
+            pass
+
+
+def obtener_informe(huellas: Dict[str, str], formato: str) -> Optional[bytes]:
+    """Contenido del informe en caché para esas huellas, o None si no está."""
+    directorio = directorio_cache()
+    clave = clave_informe(huellas)
+    with _CERROJO:
+        indice = _leer_indice(directorio)
+        entrada = indice['informes'].get(clave)
+        if entrada is None:
+            return None
+        try:
+            contenido = (directorio / entrada['archivo']).read_bytes()
+        except OSError:
+            return None
+        entrada['ultimo_acceso'] = time.time()
+        entrada['accesos'] = entrada.get('accesos', 0) + 1
+        _guardar_indice(directorio, indice)
+    return contenido
+
+
+def guardar_informe(huellas: Dict[str, str], formato: str, contenido: bytes) -> dict:
+    """
+    Guarda un informe recién generado y devuelve su entrada del índice, con
+    'invalidado_por': componentes que han cambiado respecto al último informe
+    del mismo formato (vacío si es el primero).
+    """
+    directorio = directorio_cache()
+    directorio.mkdir(parents=True, exist_ok=True)
+    clave = clave_informe(huellas)
+    archivo = f'{clave}.{EXTENSIONES.get(formato, formato)}'
+
+    with _CERROJO:
+        indice = _leer_indice(directorio)
+        anterior = indice['informes'].get(indice['ultimo_por_formato'].get(formato))
+        _escribir_atomico(directorio / archivo, contenido)
+
+        ahora = time.time()
+        entrada = {
+            'formato': formato,
+            'archivo': archivo,
+            'tamano': len(contenido),
+            'creado': ahora,
+            'ultimo_acceso': ahora,
+            'accesos': 0,
+            'huellas': huellas,
+            'invalidado_por': componentes_cambiados(anterior['huellas'], huellas) if anterior else [],
+        }
+        indice['informes'][clave] = entrada
+        indice['ultimo_por_formato'][formato] = clave
+        _aplicar_lru(directorio, indice)
+        _guardar_indice(directorio, indice)
+    return entrada
+
+
+def generar_informes_cacheados(datos: dict, analisis: dict, formatos=('word', 'pdf'),
+                               incluir_anexos: bool = False, procesos: int = None, ejercicio=None) -> dict:
+    """
+    Igual que generar_informes, pero sirviendo desde la caché los formatos cuyo
+    informe ya existe. Añade 'cache': {formato: {'desde_cache', 'invalidado_por'}}.
+    El ejercicio forma parte de las opciones de la clave.
+    """
+    inicio = time.perf_counter()
+    opciones = {'incluir_anexos': incluir_anexos, 'ejercicio': ejercicio_auditado(ejercicio)}
+    huellas = {formato: huellas_informe(datos, analisis, formato, opciones) for formato in formatos}
+
+    resultado = {'cache': {}}
+    pendientes = []
+    for formato in formatos:
+        contenido = obtener_informe(huellas[formato], formato)
+        if contenido is None:
+            pendientes.append(formato)
+        else:
+            resultado[formato] = contenido
+            resultado['cache'][formato] = {'desde_cache': True, 'invalidado_por': []}
+
+    if pendientes:
+        # python-docx y reportlab solo se importan si hay que generar algún informe
+        from utils.report_generator import generar_informes
+
+        generados = generar_informes(datos, analisis, tuple(pendientes), incluir_anexos, procesos, ejercicio)
+        for formato in pendientes:
+            resultado[formato] = generados[formato]
+            entrada = guardar_informe(huellas[formato], formato, generados[formato])
+            resultado['cache'][formato] = {'desde_cache': False, 'invalidado_por': entrada['invalidado_por']}
+        resultado['tiempos'] = generados['tiempos']
+    else:
+        resultado['tiempos'] = None
+
+    resultado['tiempo_total'] = time.perf_counter() - inicio
+    return resultado
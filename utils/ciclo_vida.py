@@ -0,0 +1,252 @@
+"""
+Índice de intervalos sobre el ciclo de vida de las facturas.
+
+Cada factura viva del RCF se representa como un intervalo [anotación, cierre),
+donde el cierre es el primer cambio de estado que pone fin a la espera del
+reconocimiento de la obligación (2400 Contabilizada, 2500 Pagada, 2600 Rechazada
+o 3100 Anulada). El índice guarda los extremos ordenados junto con sus importes
+acumulados, de modo que preguntas como "¿cuántas facturas estaban pendientes de
+reconocimiento el día X?" se resuelven con búsqueda binaria, y las curvas diarias
+completas se obtienen con un único barrido.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Optional
+
+from config.settings import CONFIGURACION
+from utils.cache import huella_dataframe, memoizar
+
+# Códigos del histórico de estados que cierran la espera de reconocimiento
+CODIGOS_CIERRE_RECONOCIMIENTO = (2400, 2500, 2600, 3100)
+
+# Estados del RCF que indican que la factura ya no está pendiente de reconocimiento
+ESTADOS_RCF_CERRADOS = ['CONTABILIZADA', 'CONTABILIZADA OBLIGACIÓN', 'ORDENADA', 'PAGADA', 'RECHAZADA', 'ANULADA']
+
+_FIN_ABIERTO = np.iinfo(np.int64).max
+_UN_DIA_NS = 86_400 * 10**9
+
+
+def codigo_estado_numerico(codigos: pd.Series) -> pd.Series:
+    """Convierte los códigos del histórico de estados (1200, '2500', 2500.0...) a número."""
+    return pd.to_numeric(codigos.astype(str).str.split('.').str[0], errors='coerce')
+
+
+def primera_fecha_estado(df_estados: pd.DataFrame, codigos: Iterable[int]) -> pd.Series:
+    """
+    Devuelve, por registro FACe, la primera fecha en la que la factura alcanzó
+    alguno de los códigos indicados. Serie indexada por 'registro'.
+    """
+    if df_estados is None or not {'registro', 'codigo', 'insertado'}.issubset(df_estados.columns):
+        return pd.Series(dtype='datetime64[ns]')
+
+    mask = codigo_estado_numerico(df_estados['codigo']).isin(list(codigos))
+    df = df_estados.loc[mask, ['registro', 'insertado']]
+    if df.empty:
+        return pd.Series(dtype='datetime64[ns]')
+    return df.groupby(df['registro'].astype(str))['insertado'].min()
+
+
+def columna_fecha_anotacion(df_rcf: pd.DataFrame) -> Optional[str]:
+    """
+    Columna con la fecha de anotación en el RCF. En algunos Excel 'FECHA REGISTRO'
+    queda mapeada como fecha_codigo_f, que es la misma fecha (ver cargar_datos).
+    """
+    for col in ['fecha_anotacion_rcf', 'fecha_codigo_f']:
+        if col in df_rcf.columns and df_rcf[col].notna().any():
+            return col
+    return None
+
+
+def _a_ns(fechas: pd.Series) -> np.ndarray:
+    """Fechas (sin nulos) a enteros en nanosegundos."""
+    return fechas.to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def _fin_del_dia(fecha) -> int:
+    """Instante final (inclusive) del día de la fecha indicada, en nanosegundos."""
+    return (pd.Timestamp(fecha).normalize() + pd.Timedelta(days=1)).value - 1
+
+
+def ejercicio_auditado(ejercicio=None) -> int:
+    """
+    Ejercicio auditado como entero: el indicado (2025, '2025', 2025.0) o, si no se
+    indica, el de CONFIGURACION. La aplicación pasa el elegido en cada sesión;
+    CONFIGURACION es común a todo el proceso y no se modifica desde las páginas.
+    """
+    if ejercicio is None or ejercicio == '':
+        ejercicio = CONFIGURACION['ejercicio_auditado']
+    return int(float(ejercicio))
+
+
+def fecha_corte_auditoria(fecha_corte=None, ejercicio=None) -> pd.Timestamp:
+    """
+    Fecha de corte de la auditoría. Por defecto, el último instante del ejercicio
+    auditado (ver ejercicio_auditado), de modo que los resultados no dependen del
+    día en que se ejecutan.
+    """
+    if fecha_corte is not None:
+        fecha_corte = pd.Timestamp(fecha_corte)
+        if fecha_corte == fecha_corte.normalize():
+            fecha_corte = fecha_corte + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+        return fecha_corte
+    ejercicio = ejercicio_auditado(ejercicio)
+    return pd.Timestamp(year=ejercicio, month=12, day=31, hour=23, minute=59, second=59)
+
+
+def construir_indice_ciclo_vida(df_rcf: pd.DataFrame, df_estados: pd.DataFrame = None,
+                                codigos_cierre: Iterable[int] = CODIGOS_CIERRE_RECONOCIMIENTO) -> Dict:
+    """
+    Construye el índice de intervalos [anotación, cierre) de las facturas del RCF.
+
+    La fecha de cierre se toma del histórico de estados (primer código de cierre
+    alcanzado por el registro FACe) y, en su defecto, de las columnas del propio RCF
+    (fecha_obligacion / fecha_rechazo), lo que cubre también las facturas en papel.
+    Las facturas sin fecha de cierre quedan abiertas, salvo que su estado actual ya
+    sea de cierre: en ese caso no pueden situarse en el tiempo y se descartan.
+
+    'inicio', 'fin', 'importe' y 'posiciones' (posiciones de las facturas en
+    df_rcf, válidas aunque su índice tenga duplicados) van en el mismo orden.
+    """
+    col_inicio = columna_fecha_anotacion(df_rcf)
+    vacio = {
+        'inicios': np.empty(0, dtype=np.int64), 'fines': np.empty(0, dtype=np.int64),
+        'acum_importe_inicios': np.zeros(1), 'acum_importe_fines': np.zeros(1),
+        'inicio': np.empty(0, dtype=np.int64), 'fin': np.empty(0, dtype=np.int64),
+        'importe': np.empty(0), 'posiciones': np.empty(0, dtype=np.int64), 'n_facturas': 0, 'n_abiertas': 0,
+        'n_descartadas': 0, 'n_cierre_anterior': 0, 'columna_inicio': col_inicio,
+    }
+    if col_inicio is None:
+        return vacio
+
+    con_inicio = df_rcf[col_inicio].notna().to_numpy()
+    df = df_rcf[con_inicio]
+    posiciones = np.flatnonzero(con_inicio)
+
+    # Fecha de cierre: histórico de estados y, como respaldo, columnas del RCF
+    fin = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    if df_estados is not None and 'ID_FACE' in df.columns:
+        cierres = primera_fecha_estado(df_estados, codigos_cierre)
+        if not cierres.empty:
+            fin = df['ID_FACE'].astype(str).map(cierres).astype('datetime64[ns]')
+    cols_cierre_rcf = [c for c in ['fecha_obligacion', 'fecha_rechazo'] if c in df.columns]
+    if cols_cierre_rcf:
+        fin = fin.fillna(df[cols_cierre_rcf].min(axis=1).astype('datetime64[ns]'))
+
+    abiertas = fin.isna()
+    descartar = pd.Series(False, index=df.index)
+    if 'estado' in df.columns:
+        descartar = abiertas & df['estado'].astype(str).str.upper().isin(ESTADOS_RCF_CERRADOS)
+    df, fin, abiertas = df[~descartar], fin[~descartar], abiertas[~descartar]
+    posiciones = posiciones[~descartar.to_numpy()]
+
+    inicio = _a_ns(df[col_inicio])
+    fin_ns = np.full(len(df), _FIN_ABIERTO, dtype=np.int64)
+    fin_ns[~abiertas.to_numpy()] = _a_ns(fin[~abiertas])
+    # Cierres anteriores a la anotación (incidencias de datos): intervalo vacío
+    cierre_anterior = fin_ns < inicio
+    fin_ns = np.maximum(fin_ns, inicio)
+
+    importe = (
+        pd.to_numeric(df['importe_total'], errors='coerce').fillna(0).to_numpy(dtype=float)
+        if 'importe_total' in df.columns else np.zeros(len(df))
+    )
+
+    orden_ini = np.argsort(inicio, kind='stable')
+    orden_fin = np.argsort(fin_ns, kind='stable')
+
+    return {
+        'inicios': inicio[orden_ini],
+        'fines': fin_ns[orden_fin],
+        'acum_importe_inicios': np.concatenate(([0.0], np.cumsum(importe[orden_ini]))),
+        'acum_importe_fines': np.concatenate(([0.0], np.cumsum(importe[orden_fin]))),
+        'inicio': inicio,
+        'fin': fin_ns,
+        'importe': importe,
+        'posiciones': posiciones,
+        'n_facturas': len(inicio),
+        'n_abiertas': int(abiertas.sum()),
+        'n_descartadas': int(descartar.sum()),
+        'n_cierre_anterior': int(cierre_anterior.sum()),
+        'columna_inicio': col_inicio,
+    }
+
+
+def indice_ciclo_vida_memoizado(df_rcf: pd.DataFrame, df_estados: pd.DataFrame = None) -> Dict:
+    """
+    Índice de ciclo de vida memoizado por la huella del RCF y del histórico de
+    estados. Es el único punto de acceso al índice: no se guarda en el diccionario
+    de datos, cuyas claves forman parte de la huella de los informes cacheados.
+    """
+    huella_estados = huella_dataframe(df_estados) if df_estados is not None else None
+    clave = (huella_dataframe(df_rcf), huella_estados)
+    return memoizar('indice_ciclo_vida', clave, lambda: construir_indice_ciclo_vida(df_rcf, df_estados), max_entradas=4)
+
+
+def pendientes_en_fecha(indice: Dict, fecha) -> Dict:
+    """Facturas pendientes (y su importe) al cierre del día indicado. Coste O(log n)."""
+    t = _fin_del_dia(fecha)
+    k_ini = np.searchsorted(indice['inicios'], t, side='right')
+    k_fin = np.searchsorted(indice['fines'], t, side='right')
+    return {
+        'facturas': int(k_ini - k_fin),
+        'importe': round(float(indice['acum_importe_inicios'][k_ini] - indice['acum_importe_fines'][k_fin]), 2),
+    }
+
+
+def pendientes_en_rango(indice: Dict, fecha_inicio, fecha_fin) -> Dict:
+    """
+    Facturas que estuvieron pendientes en algún momento entre ambas fechas
+    (ambos días incluidos). Coste O(log n).
+    """
+    t_desde = pd.Timestamp(fecha_inicio).normalize().value
+    t_hasta = _fin_del_dia(fecha_fin)
+    k_ini = np.searchsorted(indice['inicios'], t_hasta, side='right')
+    k_fin = np.searchsorted(indice['fines'], t_desde, side='right')
+    return {
+        'facturas': int(max(k_ini - k_fin, 0)),
+        'importe': round(float(indice['acum_importe_inicios'][k_ini] - indice['acum_importe_fines'][k_fin]), 2),
+    }
+
+
+def serie_pendientes(indice: Dict, fechas, antiguedad_minima_dias: int = 0) -> pd.DataFrame:
+    """
+    Facturas pendientes al cierre de cada una de las fechas indicadas, con una
+    antigüedad mínima desde su anotación. Se calcula en un único barrido: cada
+    factura suma en el tramo de fechas en el que está abierta y ya supera la
+    antigüedad, y los tramos se acumulan con un array de diferencias.
+    """
+    fechas = pd.DatetimeIndex(pd.to_datetime(fechas)).normalize().sort_values()
+    cortes = fechas.as_unit('ns').asi8 + _UN_DIA_NS - 1
+    n = len(cortes)
+
+    desde = np.searchsorted(cortes, indice['inicio'] + antiguedad_minima_dias * _UN_DIA_NS, side='left')
+    hasta = np.searchsorted(cortes, indice['fin'], side='left')
+    validas = desde < hasta
+    desde, hasta, importe = desde[validas], hasta[validas], indice['importe'][validas]
+
+    facturas = np.cumsum(np.bincount(desde, minlength=n + 1) - np.bincount(hasta, minlength=n + 1))[:n]
+    importes = np.cumsum(
+        np.bincount(desde, weights=importe, minlength=n + 1) - np.bincount(hasta, weights=importe, minlength=n + 1)
+    )[:n]
+
+    return pd.DataFrame({
+        'fecha': fechas,
+        'facturas_pendientes': facturas.astype(int),
+        'importe_pendiente': importes.round(2),
+    })
+
+
+def curva_pendientes_diaria(indice: Dict, fecha_inicio=None, fecha_fin=None) -> pd.DataFrame:
+    """Curva diaria de facturas pendientes de reconocimiento entre dos fechas."""
+    if indice['n_facturas'] == 0:
+        return pd.DataFrame(columns=['fecha', 'facturas_pendientes', 'importe_pendiente'])
+
+    if fecha_inicio is None:
+        fecha_inicio = pd.Timestamp(int(indice['inicios'][0]))
+    if fecha_fin is None:
+        cerrados = indice['fines'][indice['fines'] != _FIN_ABIERTO]
+        fecha_fin = pd.Timestamp(int(cerrados[-1])) if len(cerrados) else pd.Timestamp(int(indice['inicios'][-1]))
+
+    fechas = pd.date_range(pd.Timestamp(fecha_inicio).normalize(), pd.Timestamp(fecha_fin).normalize(), freq='D')
+    return serie_pendientes(indice, fechas)
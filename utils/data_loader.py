@@ -3,10 +3,40 @@ Módulo para carga y validación de datos
 Versión mejorada con mapeo flexible de columnas
 """
 
+import functools
+import hashlib
+import unicodedata
+
+import numpy as np
 import pandas as pd
-import streamlit as st
-from typing import Dict, List, Tuple
-from config.settings import CONFIGURACION
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from config.settings import CONFIGURACION, COLUMNAS_ESPERADAS, COLUMNAS_OBLIGATORIAS
+from utils.cache import cacheable, memoizar
+from utils.ciclo_vida import ejercicio_auditado as resolver_ejercicio
+from utils.lectores import leer_cabecera, leer_tabla
+from utils.notificaciones import notificar as notificar_por_defecto
+from utils.nif import agregar_tipo_nif, clasificar_nif, mascara_persona_juridica, resumen_nif
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+CONFIG_TOML = Path(__file__).parent.parent / ".streamlit" / "config.toml"
+
+
+def ejercicio_configurado():
+    """
+    Ejercicio auditado configurado: el de [auditoria] en .streamlit/config.toml si
+    el archivo existe, y si no el de CONFIGURACION.
+    """
+    try:
+        with open(CONFIG_TOML, 'rb') as f:
+            config_toml = tomllib.load(f)
+        return config_toml.get('auditoria', {}).get('ejercicio_auditado')
+    except Exception:
+        return CONFIGURACION.get('ejercicio_auditado')
 
 # Mapeo flexible de nombres de columnas
 MAPEO_COLUMNAS = {
@@ -58,6 +88,8 @@ MAPEO_COLUMNAS = {
         'fecha_conformidad': ['fecha_conformidad', 'FECHA_CONFORMIDAD', 'Fecha Conformidad', 'FECHA CONFORMIDAD'],
         'fecha_rechazo': ['fecha_rechazo', 'FECHA_RECHAZO', 'Fecha Rechazo', 'FECHA RECHAZO', 'fecha_rechazo_rcf'],
         'motivo_rechazo_rcf': ['motivo_rechazo_rcf', 'MOTIVO_RECHAZO_RCF', 'Motivo Rechazo RCF', 'MOTIVO RECHAZO RCF'],
+        'fecha_obligacion': ['fecha_obligacion', 'FECHA_OBLIGACION', 'Fecha Obligación', 'FECHA OBLIGACIÓN', 'FECHA OBLIGACION'],
+        'fecha_pago': ['fecha_pago', 'FECHA_PAGO', 'Fecha Pago', 'FECHA DE PAGO', 'FECHA PAGO'],
     },
     'face': {
         'registro': ['registro', 'Registro', 'ID_FACE', 'id_face', 'Nº Registro'],
@@ -101,186 +133,407 @@ def encontrar_columna(df: pd.DataFrame, nombre_estandar: str, tipo_archivo: str)
     # Si no se encuentra, devolver el nombre estándar
     return nombre_estandar
 
+def _normalizar_nombre(nombre) -> str:
+    """Nombre de columna sin espacios extremos, en minúsculas y sin tildes."""
+    texto = unicodedata.normalize('NFKD', str(nombre).strip().lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+@functools.lru_cache(maxsize=None)
+def _indice_mapeo(tipo_archivo: str) -> Dict[str, List[Tuple[str, int, str]]]:
+    """
+    Índice inverso de MAPEO_COLUMNAS[tipo_archivo], compilado una vez por proceso:
+    alias normalizado -> [(nombre estándar, posición del alias, alias literal)].
+    """
+    indice: Dict[str, List[Tuple[str, int, str]]] = {}
+    for nombre_estandar, posibles_nombres in MAPEO_COLUMNAS.get(tipo_archivo, {}).items():
+        for posicion, alias in enumerate(posibles_nombres):
+            indice.setdefault(_normalizar_nombre(alias), []).append((nombre_estandar, posicion, alias))
+    return indice
+
+
+def huella_cabecera(columnas, tipo_archivo: str = '') -> str:
+    """Huella (SHA-1) de una fila de encabezados, para reutilizar su mapeo resuelto."""
+    return hashlib.sha1('\x1f'.join([tipo_archivo, *map(str, columnas)]).encode('utf-8')).hexdigest()
+
+
+def resolver_mapeo(columnas, tipo_archivo: str) -> Dict[str, str]:
+    """
+    Mapeo {columna original: nombre estándar} para una fila de encabezados.
+
+    Para cada nombre estándar se elige el primer alias (en el orden de
+    MAPEO_COLUMNAS) que coincide literalmente con una columna; si ninguno
+    coincide, el primero que coincide sin distinguir mayúsculas ni espacios
+    extremos y, por último, también sin distinguir tildes. El resultado se memoiza por huella del encabezado, de modo
+    que los archivos con la misma disposición de columnas no vuelven a resolverse.
+    """
+    columnas = list(columnas)
+
+    def _resolver() -> Dict[str, str]:
+        indice = _indice_mapeo(tipo_archivo)
+        # nombre estándar -> ((nivel de coincidencia, posición del alias), columna); nivel:
+        # 0 literal, 1 sin mayúsculas ni espacios extremos, 2 además sin tildes
+        elegidas: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        for col in columnas:
+            col_minusculas = str(col).strip().lower()
+            for nombre_estandar, posicion, alias in indice.get(_normalizar_nombre(col), ()):
+                nivel = 0 if col == alias else 1 if col_minusculas == alias.strip().lower() else 2
+                prioridad = (nivel, posicion)
+                actual = elegidas.get(nombre_estandar)
+                # Con nombres normalizados repetidos se queda la última columna
+                if actual is None or prioridad < actual[0] or (prioridad == actual[0] and nivel > 0):
+                    elegidas[nombre_estandar] = (prioridad, col)
+
+        mapeo = {}
+        # Si una columna sirve a varios nombres estándar, prevalece el último de MAPEO_COLUMNAS
+        for nombre_estandar in MAPEO_COLUMNAS.get(tipo_archivo, {}):
+            if nombre_estandar in elegidas:
+                mapeo[elegidas[nombre_estandar][1]] = nombre_estandar
+        return mapeo
+
+    return dict(memoizar('mapeo_columnas', huella_cabecera(columnas, tipo_archivo), _resolver, max_entradas=64))
+
+
 def normalizar_columnas(df: pd.DataFrame, tipo_archivo: str) -> pd.DataFrame:
     """
     Renombra las columnas del DataFrame a nombres estándar.
-    Incluye limpieza de espacios extra y comparación case-insensitive.
+    Incluye limpieza de espacios extra y comparación case-insensitive y sin tildes
+    (ver resolver_mapeo).
     """
-    df_normalizado = df.copy()
-    mapeo = {}
+    mapeo = resolver_mapeo(df.columns, tipo_archivo)
+    return df.rename(columns=mapeo) if mapeo else df.copy()
+
 
-    # Crear un diccionario de columnas normalizadas (sin espacios extra, lowercase)
-    columnas_df_norm = {col.strip().lower(): col for col in df.columns}
+NOMBRES_ARCHIVO = {
+    'rcf': 'RCF', 'face': 'FACe', 'anulaciones': 'Anulaciones', 'estados': 'Cambios de Estado',
+}
 
-    if tipo_archivo in MAPEO_COLUMNAS:
-        for nombre_estandar, posibles_nombres in MAPEO_COLUMNAS[tipo_archivo].items():
-            # Primero intentar coincidencia exacta
-            for nombre_posible in posibles_nombres:
-                if nombre_posible in df.columns:
-                    mapeo[nombre_posible] = nombre_estandar
-                    break
-            else:
-                # Si no hay coincidencia exacta, intentar con normalización
-                for nombre_posible in posibles_nombres:
-                    nombre_norm = nombre_posible.strip().lower()
-                    if nombre_norm in columnas_df_norm:
-                        col_original = columnas_df_norm[nombre_norm]
-                        mapeo[col_original] = nombre_estandar
-                        break
 
-    if mapeo:
-        df_normalizado = df_normalizado.rename(columns=mapeo)
+def sondear_esquema(archivo, tipo_archivo: str) -> Dict:
+    """
+    Comprueba las columnas de un archivo leyendo solo su encabezado (ver
+    utils/lectores.py). Devuelve 'sondeado' (False si no se pudo leer el
+    encabezado), 'originales' (sin espacios extremos), 'columnas' (ya normalizadas), 'filas', 'faltan' (obligatorias),
+    'faltan_esperadas', 'cobertura' (fracción de COLUMNAS_ESPERADAS presentes) y
+    'parece': el tipo de archivo que mejor encaja con el encabezado cuando no es
+    el indicado (faltan obligatorias o cubre menos de la mitad de las esperadas).
+    """
+    cabecera = leer_cabecera(archivo)
+    if cabecera is None:
+        return {'sondeado': False, 'originales': [], 'columnas': [], 'filas': None, 'faltan': [],
+                'faltan_esperadas': [], 'cobertura': None, 'parece': None}
+
+    originales = [str(col).strip() for col in cabecera['columnas'] if col is not None]
+
+    def _comprobar(tipo):
+        mapeo = resolver_mapeo(originales, tipo)
+        columnas = [mapeo.get(col, col) for col in originales]
+        esperadas = COLUMNAS_ESPERADAS.get(tipo, [])
+        faltan_esperadas = [col for col in esperadas if col not in columnas]
+        return {
+            'columnas': columnas,
+            'faltan': [col for col in COLUMNAS_OBLIGATORIAS.get(tipo, []) if col not in columnas],
+            'faltan_esperadas': faltan_esperadas,
+            'cobertura': 1 - len(faltan_esperadas) / len(esperadas) if esperadas else 1.0,
+        }
+
+    esquema = {'sondeado': True, 'originales': originales, 'filas': cabecera['filas'], **_comprobar(tipo_archivo), 'parece': None}
+    if esquema['faltan'] or esquema['cobertura'] < 0.5:
+        otros = {tipo: _comprobar(tipo) for tipo in COLUMNAS_OBLIGATORIAS if tipo != tipo_archivo}
+        candidatos = [(otro['cobertura'], tipo) for tipo, otro in otros.items()
+                      if not otro['faltan'] and otro['cobertura'] > esquema['cobertura']]
+        if candidatos:
+            esquema['parece'] = max(candidatos)[1]
+    return esquema
 
-    return df_normalizado
 
-@st.cache_data
-def cargar_datos(archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados) -> Dict:
+def comprobar_esquemas(archivos: Dict) -> Dict:
     """
-    Carga todos los archivos Excel y retorna un diccionario con los DataFrames
+    Sondeo de los encabezados de los archivos {tipo: archivo} antes de leerlos.
+    Devuelve {'valido', 'errores', 'esquemas'}, con un error por archivo al que le
+    falten columnas obligatorias o que corresponda claramente a otro tipo.
     """
-    try:
-        # Cargar archivos
-        df_rcf = pd.read_excel(archivo_rcf)
-        df_face = pd.read_excel(archivo_face)
-        df_anulaciones = pd.read_excel(archivo_anulaciones)
-        df_estados = pd.read_excel(archivo_estados)
-        
-        # Limpiar nombres de columnas (quitar espacios)
-        df_rcf.columns = df_rcf.columns.str.strip()
-        df_face.columns = df_face.columns.str.strip()
-        df_anulaciones.columns = df_anulaciones.columns.str.strip()
-        df_estados.columns = df_estados.columns.str.strip()
-        
-        # Normalizar nombres de columnas
-        df_rcf = normalizar_columnas(df_rcf, 'rcf')
-        df_face = normalizar_columnas(df_face, 'face')
-        df_anulaciones = normalizar_columnas(df_anulaciones, 'anulaciones')
-        df_estados = normalizar_columnas(df_estados, 'estados')
-        
-        # Garantizar que fecha_codigo_f y fecha_codigo_s tengan columna aunque no se mapearon por nombre.
-        # fecha_codigo_f = FECHA REGISTRO = fecha_anotacion_rcf (coincide con FECHA ACEPTACIÓN en estos datos)
-        # fecha_codigo_s = FECHA RECEPCION FACE (si no está, se usará fecha_registro_face como fallback)
-        if 'fecha_codigo_f' not in df_rcf.columns and 'fecha_anotacion_rcf' in df_rcf.columns:
-            df_rcf['fecha_codigo_f'] = df_rcf['fecha_anotacion_rcf']
-        if 'fecha_codigo_f' not in df_rcf.columns and 'fecha_aceptacion' in df_rcf.columns:
-            df_rcf['fecha_codigo_f'] = df_rcf['fecha_aceptacion']
-        if 'fecha_codigo_s' not in df_rcf.columns and 'fecha_registro_face' in df_rcf.columns:
-            df_rcf['fecha_codigo_s'] = df_rcf['fecha_registro_face']
-
-        # Convertir fechas
-        df_rcf = convertir_fechas(df_rcf, [
-            'fecha_emision', 'fecha_anotacion_rcf', 'fecha_registro_face', 'fecha_aceptacion',
-            'fecha_codigo_s', 'fecha_codigo_f', 'fecha_aceptacion_ut', 'fecha_conformidad',
-            'fecha_rechazo',
-        ])
-        df_face = convertir_fechas(df_face, ['fecha_registro'])
-        df_anulaciones = convertir_fechas(df_anulaciones, ['fecha_solicitud_anulacion'])
-        df_estados = convertir_fechas(df_estados, ['insertado'])
-        
-        # Procesar facturas en papel vs electrónicas
-        if 'ID_FACE' in df_rcf.columns:
-            # Asegurar que ID_FACE se trate como cadena para consistencia y limpiar espacios
-            df_rcf['ID_FACE'] = df_rcf['ID_FACE'].fillna('').astype(str).str.strip()
-            # Es papel si está vacío o es 'nan' (resultado de fillna de un nulo real que luego se convirtió a string)
-            df_rcf['es_papel'] = (df_rcf['ID_FACE'] == '') | (df_rcf['ID_FACE'].str.lower() == 'nan')
-        else:
-            df_rcf['es_papel'] = True  # Asumir papel si no hay columna ID_FACE
-            df_rcf['ID_FACE'] = ''
-
-        # EXCLUIR FACTURAS BORRADAS (Global desactivado - se hará por página)
-        if 'estado' in df_rcf.columns:
-            borradas = len(df_rcf[df_rcf['estado'].astype(str).str.upper() == 'BORRADA'])
-            if borradas > 0:
-                st.sidebar.info(f"🗑️ Se han detectado {borradas} facturas 'BORRADA' en el RCF (se usarán solo en Validaciones)")
-        
-        # Convertir tipos numéricos
+    errores, esquemas = [], {}
+    for tipo, archivo in archivos.items():
+        esquema = esquemas[tipo] = sondear_esquema(archivo, tipo)
+        nombre = NOMBRES_ARCHIVO.get(tipo, tipo)
+        if esquema['faltan']:
+            mensaje = f"{nombre}: faltan las columnas {', '.join(repr(col) for col in esquema['faltan'])}"
+            if esquema['parece']:
+                mensaje += f" (parece un archivo de {NOMBRES_ARCHIVO[esquema['parece']]})"
+            errores.append(mensaje)
+        elif esquema['parece']:
+            errores.append(f"{nombre}: el archivo parece de {NOMBRES_ARCHIVO[esquema['parece']]}")
+    return {'valido': not errores, 'errores': errores, 'esquemas': esquemas}
+
+
+# Palabras clave de la columna de área cuando su nombre no está en MAPEO_COLUMNAS
+# (el encabezado puede llegar con otra codificación o texto adicional)
+PALABRAS_COLUMNA_AREA = ('AREA', 'UNIDAD', 'SERVICIO')
+
+
+def columna_area(columnas):
+    """Primera columna cuyo nombre contiene alguna de PALABRAS_COLUMNA_AREA, o None."""
+    for col in columnas:
+        nombre = str(col).upper().replace('Á', 'A').replace('É', 'E')
+        if any(palabra in nombre for palabra in PALABRAS_COLUMNA_AREA):
+            return col
+    return None
+
+
+def agregar_area_cod(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Resuelve la columna 'area_unidad_servicio' (por MAPEO_COLUMNAS o, si no, por
+    palabras clave del encabezado) y añade 'area_cod': los dos primeros caracteres
+    del área como categoría, nula si el área está vacía o no empieza por un código.
+    """
+    if 'area_unidad_servicio' not in df.columns:
+        col = columna_area(df.columns)
+        if col is None:
+            return df
+        df = df.rename(columns={col: 'area_unidad_servicio'})
+
+    area = df['area_unidad_servicio'].astype('string').str.strip()
+    vacia = area.isna() | area.str.lower().isin(['', 'nan', 'none'])
+    codigo = area.str.slice(0, 2)
+    # Valores como ' / / ' no tienen código de área
+    codigo = codigo.mask(vacia | ~codigo.str.match(r'[0-9A-Za-z]', na=False))
+    df['area_cod'] = pd.Categorical(codigo.to_numpy(dtype=object, na_value=np.nan))
+    return df
+
+def columnas_necesarias(originales, tipo_archivo: str) -> List[str]:
+    """
+    Columnas originales que usan los análisis: las que MAPEO_COLUMNAS traduce a un
+    nombre estándar (o que ya lo tienen) y, en el RCF, la columna de área cuando
+    solo se reconoce por palabras clave (ver agregar_area_cod).
+    """
+    originales = [str(col).strip() for col in originales if col is not None]
+    mapeo = resolver_mapeo(originales, tipo_archivo)
+    estandar = MAPEO_COLUMNAS.get(tipo_archivo, {})
+    necesarias = [col for col in originales if col in mapeo or col in estandar]
+    if tipo_archivo == 'rcf' and 'area_unidad_servicio' not in [mapeo.get(col, col) for col in necesarias]:
+        area = columna_area(originales)
+        if area is not None and area not in necesarias:
+            necesarias.append(area)
+    return necesarias
+
+
+def leer_fuentes(archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados,
+                 notificar: Callable[[str, str], None] = None, columnas_completas: bool = None) -> Dict:
+    """
+    Lee los cuatro archivos (Excel, CSV o Parquet, ver utils/lectores.py) y
+    normaliza columnas, fechas y tipos, sin filtrar por ejercicio. Devuelve
+    {'rcf', 'face', 'anulaciones', 'estados'}.
+
+    Solo se leen las columnas que usan los análisis (columnas_necesarias), salvo con
+    columnas_completas (por defecto CONFIGURACION['columnas_completas']), que
+    conserva todas, p. ej. para exportar el RCF completo.
+    """
+    notificar = notificar or notificar_por_defecto
+    if columnas_completas is None:
+        columnas_completas = CONFIGURACION.get('columnas_completas', False)
+
+    # Antes de leer los libros completos, comprobar sus encabezados
+    archivos = {'rcf': archivo_rcf, 'face': archivo_face,
+                'anulaciones': archivo_anulaciones, 'estados': archivo_estados}
+    comprobacion = comprobar_esquemas(archivos)
+    if not comprobacion['valido']:
+        raise ValueError("Archivos no válidos: " + '; '.join(comprobacion['errores']))
+
+    notificar('progreso', "Leyendo archivos...")
+    # Cargar archivos: solo las columnas necesarias cuando se pudo sondear el encabezado
+    tablas = {}
+    for tipo, archivo in archivos.items():
+        esquema = comprobacion['esquemas'][tipo]
+        proyectar = esquema['sondeado'] and not columnas_completas
+        tablas[tipo] = leer_tabla(archivo, columnas_necesarias(esquema['originales'], tipo) if proyectar else None)
+    df_rcf, df_face = tablas['rcf'], tablas['face']
+    df_anulaciones, df_estados = tablas['anulaciones'], tablas['estados']
+
+    notificar('progreso', "Normalizando columnas y tipos...")
+
+    # Limpiar nombres de columnas (quitar espacios)
+    df_rcf.columns = df_rcf.columns.str.strip()
+    df_face.columns = df_face.columns.str.strip()
+    df_anulaciones.columns = df_anulaciones.columns.str.strip()
+    df_estados.columns = df_estados.columns.str.strip()
+
+    # Normalizar nombres de columnas
+    df_rcf = normalizar_columnas(df_rcf, 'rcf')
+    df_face = normalizar_columnas(df_face, 'face')
+    df_anulaciones = normalizar_columnas(df_anulaciones, 'anulaciones')
+    df_estados = normalizar_columnas(df_estados, 'estados')
+
+    # Garantizar que fecha_codigo_f y fecha_codigo_s tengan columna aunque no se mapearon por nombre.
+    # fecha_codigo_f = FECHA REGISTRO = fecha_anotacion_rcf (coincide con FECHA ACEPTACIÓN en estos datos)
+    # fecha_codigo_s = FECHA RECEPCION FACE (si no está, se usará fecha_registro_face como fallback)
+    if 'fecha_codigo_f' not in df_rcf.columns and 'fecha_anotacion_rcf' in df_rcf.columns:
+        df_rcf['fecha_codigo_f'] = df_rcf['fecha_anotacion_rcf']
+    if 'fecha_codigo_f' not in df_rcf.columns and 'fecha_aceptacion' in df_rcf.columns:
+        df_rcf['fecha_codigo_f'] = df_rcf['fecha_aceptacion']
+    if 'fecha_codigo_s' not in df_rcf.columns and 'fecha_registro_face' in df_rcf.columns:
+        df_rcf['fecha_codigo_s'] = df_rcf['fecha_registro_face']
+
+    # Convertir fechas
+    df_rcf = convertir_fechas(df_rcf, [
+        'fecha_emision', 'fecha_anotacion_rcf', 'fecha_registro_face', 'fecha_aceptacion',
+        'fecha_codigo_s', 'fecha_codigo_f', 'fecha_aceptacion_ut', 'fecha_conformidad',
+        'fecha_rechazo', 'fecha_obligacion', 'fecha_pago',
+    ])
+    df_face = convertir_fechas(df_face, ['fecha_registro'])
+    df_anulaciones = convertir_fechas(df_anulaciones, ['fecha_solicitud_anulacion'])
+    df_estados = convertir_fechas(df_estados, ['insertado'])
+
+    # Procesar facturas en papel vs electrónicas
+    if 'ID_FACE' in df_rcf.columns:
+        # Asegurar que ID_FACE se trate como cadena para consistencia y limpiar espacios
+        df_rcf['ID_FACE'] = df_rcf['ID_FACE'].fillna('').astype(str).str.strip()
+        # Es papel si está vacío o es 'nan' (resultado de fillna de un nulo real que luego se convirtió a string)
+        df_rcf['es_papel'] = (df_rcf['ID_FACE'] == '') | (df_rcf['ID_FACE'].str.lower() == 'nan')
+    else:
+        df_rcf['es_papel'] = True  # Asumir papel si no hay columna ID_FACE
+        df_rcf['ID_FACE'] = ''
+
+    # EXCLUIR FACTURAS BORRADAS (Global desactivado - se hará por página)
+    if 'estado' in df_rcf.columns:
+        borradas = len(df_rcf[df_rcf['estado'].astype(str).str.upper() == 'BORRADA'])
+        if borradas > 0:
+            notificar('info', f"🗑️ Se han detectado {borradas} facturas 'BORRADA' en el RCF (se usarán solo en Validaciones)")
+
+    # Convertir tipos numéricos
+    if 'importe_total' in df_rcf.columns:
+        df_rcf['importe_total'] = pd.to_numeric(df_rcf['importe_total'], errors='coerce')
+
+    if 'base_imponible' in df_rcf.columns:
+        df_rcf['base_imponible'] = pd.to_numeric(df_rcf['base_imponible'], errors='coerce')
+    else:
+        # Si no existe, usamos importe_total como fallback para evitar errores, 
+        # pero lo ideal es que esté la columna.
         if 'importe_total' in df_rcf.columns:
-            df_rcf['importe_total'] = pd.to_numeric(df_rcf['importe_total'], errors='coerce')
-        
-        if 'base_imponible' in df_rcf.columns:
-            df_rcf['base_imponible'] = pd.to_numeric(df_rcf['base_imponible'], errors='coerce')
-        else:
-            # Si no existe, usamos importe_total como fallback para evitar errores, 
-            # pero lo ideal es que esté la columna.
-            if 'importe_total' in df_rcf.columns:
-                df_rcf['base_imponible'] = df_rcf['importe_total']
-        
-        if 'importe' in df_face.columns:
-            df_face['importe'] = pd.to_numeric(df_face['importe'], errors='coerce')
-        
-        if 'id_fra_rcf' not in df_rcf.columns:
-            df_rcf['id_fra_rcf'] = range(1, len(df_rcf) + 1)
-        
-        # FILTRAR POR EJERCICIO AUDITADO (Global) - Basado en Fecha de Registro en RCF
-        import toml
-        try:
-            config_toml = toml.load(str(Path(__file__).parent.parent / ".streamlit" / "config.toml"))
-            ejercicio_auditado = config_toml.get('auditoria', {}).get('ejercicio_auditado')
-        except:
-            ejercicio_auditado = CONFIGURACION.get('ejercicio_auditado')
-            
-        if ejercicio_auditado:
-            # Mantener una copia de IDs de FACe antes de filtrar por año para el cálculo de retenidas
-            # Esto evita que facturas sin fecha (como las 'BORRADA') aparezcan como retenidas si ya están en RCF
-            ids_face_en_rcf_total = set(df_rcf[df_rcf['ID_FACE'].notna()]['ID_FACE'].astype(str))
-            
-            # Priorizamos filtrar por la columna 'ejercicio' (Año) si existe,
-            # ya que suele estar más completa que las fechas individuales.
-            if 'ejercicio' in df_rcf.columns:
-                df_rcf['ejercicio'] = pd.to_numeric(df_rcf['ejercicio'], errors='coerce')
-                # Incluir el año auditado y el anterior (según feedback del usuario)
-                anios_permitidos = [float(ejercicio_auditado), float(ejercicio_auditado) - 1]
-                df_rcf = df_rcf[df_rcf['ejercicio'].isin(anios_permitidos)].copy()
-            elif 'fecha_anotacion_rcf' in df_rcf.columns:
-                # Si filtramos por fecha, incluimos las de 2025 (incluyendo aquellas de 2024 registradas en 2025)
-                # pero mantenemos la prioridad de la columna 'ejercicio' si está disponible
-                df_rcf = df_rcf[df_rcf['fecha_anotacion_rcf'].dt.year == int(ejercicio_auditado)].copy()
-            elif 'fecha_emision' in df_rcf.columns:
-                df_rcf = df_rcf[df_rcf['fecha_emision'].dt.year == int(ejercicio_auditado)].copy()
-                
-            # Filtrar FACe por año de registro
-            if 'fecha_registro' in df_face.columns:
-                df_face = df_face[df_face['fecha_registro'].dt.year == int(ejercicio_auditado)].copy()
-                
-            # Filtrar Anulaciones por año de solicitud
-            if 'fecha_solicitud_anulacion' in df_anulaciones.columns:
-                df_anulaciones = df_anulaciones[df_anulaciones['fecha_solicitud_anulacion'].dt.year == int(ejercicio_auditado)].copy()
-
-            # Estados NO se filtra por año de inserción: una factura del ejercicio auditado
-            # puede completar su tramitación (p.ej. Pagada) ya en el año siguiente, y filtrar
-            # por año truncaba su secuencia de estados en Tramitación.
-        else:
-            ids_face_en_rcf_total = set(df_rcf[df_rcf['ID_FACE'].notna()]['ID_FACE'].astype(str))
-        
-        # Identificar facturas de FACe anuladas antes de llegar al RCF:
-        # condición: tienen solicitud de anulación Y no aparecen en ningún ejercicio del RCF
-        ids_anuladas_face = (
-            set(df_anulaciones['registro'].astype(str))
-            if 'registro' in df_anulaciones.columns
-            else set()
+            df_rcf['base_imponible'] = df_rcf['importe_total']
+
+    if 'importe' in df_face.columns:
+        df_face['importe'] = pd.to_numeric(df_face['importe'], errors='coerce')
+
+    if 'id_fra_rcf' not in df_rcf.columns:
+        df_rcf['id_fra_rcf'] = range(1, len(df_rcf) + 1)
+
+    # Tipo de NIF (categórico) y validez del dígito de control, calculados una sola vez
+    df_rcf = agregar_tipo_nif(df_rcf)
+    df_face = agregar_tipo_nif(df_face)
+    df_rcf = agregar_area_cod(df_rcf)
+
+    return {'rcf': df_rcf, 'face': df_face, 'anulaciones': df_anulaciones, 'estados': df_estados}
+
+
+def completar_datos(df_rcf: pd.DataFrame, df_face: pd.DataFrame, df_anulaciones: pd.DataFrame,
+                    df_estados: pd.DataFrame, ids_face_en_rcf_total: set) -> Dict:
+    """Diccionario de datos de un ejercicio ya seleccionado, con las facturas FACe anuladas antes del RCF."""
+    # Identificar facturas de FACe anuladas antes de llegar al RCF:
+    # condición: tienen solicitud de anulación Y no aparecen en ningún ejercicio del RCF
+    ids_anuladas_face = (
+        set(df_anulaciones['registro'].astype(str))
+        if 'registro' in df_anulaciones.columns
+        else set()
+    )
+    if 'registro' in df_face.columns:
+        face_ids = df_face['registro'].astype(str)
+        mask_anulada = (
+            ~face_ids.isin(ids_face_en_rcf_total) &
+            face_ids.isin(ids_anuladas_face)
         )
-        if 'registro' in df_face.columns:
-            face_ids = df_face['registro'].astype(str)
-            mask_anulada = (
-                ~face_ids.isin(ids_face_en_rcf_total) &
-                face_ids.isin(ids_anuladas_face)
-            )
-            df_face_anuladas_antes_rcf = df_face[mask_anulada].copy()
-        else:
-            df_face_anuladas_antes_rcf = pd.DataFrame()
+        df_face_anuladas_antes_rcf = df_face[mask_anulada].copy()
+    else:
+        df_face_anuladas_antes_rcf = pd.DataFrame()
+
+    return {
+        'rcf': df_rcf,
+        'face': df_face,
+        'anulaciones': df_anulaciones,
+        'estados': df_estados,
+        'ids_face_en_rcf_total': ids_face_en_rcf_total,
+        'face_anuladas_antes_rcf': df_face_anuladas_antes_rcf
+    }
+
+
+def seleccionar_ejercicio(fuentes: Dict, ejercicio_auditado, notificar: Callable[[str, str], None] = None) -> Dict:
+    """
+    Filtra las fuentes leídas por el ejercicio auditado (sin filtro si es vacío) y
+    devuelve el diccionario de datos que usan los análisis.
+    """
+    notificar = notificar or notificar_por_defecto
+    df_rcf, df_face = fuentes['rcf'], fuentes['face']
+    df_anulaciones, df_estados = fuentes['anulaciones'], fuentes['estados']
+
+    # FILTRAR POR EJERCICIO AUDITADO (Global) - Basado en Fecha de Registro en RCF
+    if ejercicio_auditado:
+        notificar('progreso', f"Filtrando por el ejercicio {ejercicio_auditado}...")
+        # Mantener una copia de IDs de FACe antes de filtrar por año para el cálculo de retenidas
+        # Esto evita que facturas sin fecha (como las 'BORRADA') aparezcan como retenidas si ya están en RCF
+        ids_face_en_rcf_total = set(df_rcf[df_rcf['ID_FACE'].notna()]['ID_FACE'].astype(str))
+
+        # Priorizamos filtrar por la columna 'ejercicio' (Año) si existe,
+        # ya que suele estar más completa que las fechas individuales.
+        if 'ejercicio' in df_rcf.columns:
+            # assign: las fuentes pueden reutilizarse para seleccionar otros ejercicios
+            df_rcf = df_rcf.assign(ejercicio=pd.to_numeric(df_rcf['ejercicio'], errors='coerce'))
+            # Incluir el año auditado y el anterior (según feedback del usuario)
+            anios_permitidos = [float(ejercicio_auditado), float(ejercicio_auditado) - 1]
+            df_rcf = df_rcf[df_rcf['ejercicio'].isin(anios_permitidos)].copy()
+        elif 'fecha_anotacion_rcf' in df_rcf.columns:
+            # Si filtramos por fecha, incluimos las de 2025 (incluyendo aquellas de 2024 registradas en 2025)
+            # pero mantenemos la prioridad de la columna 'ejercicio' si está disponible
+            df_rcf = df_rcf[df_rcf['fecha_anotacion_rcf'].dt.year == int(ejercicio_auditado)].copy()
+        elif 'fecha_emision' in df_rcf.columns:
+            df_rcf = df_rcf[df_rcf['fecha_emision'].dt.year == int(ejercicio_auditado)].copy()
+
+        # Filtrar FACe por año de registro
+        if 'fecha_registro' in df_face.columns:
+            df_face = df_face[df_face['fecha_registro'].dt.year == int(ejercicio_auditado)].copy()
+
+        # Filtrar Anulaciones por año de solicitud
+        if 'fecha_solicitud_anulacion' in df_anulaciones.columns:
+            df_anulaciones = df_anulaciones[df_anulaciones['fecha_solicitud_anulacion'].dt.year == int(ejercicio_auditado)].copy()
+
+        # Estados NO se filtra por año de inserción: una factura del ejercicio auditado
+        # puede completar su tramitación (p.ej. Pagada) ya en el año siguiente, y filtrar
+        # por año truncaba su secuencia de estados en Tramitación.
+    else:
+        ids_face_en_rcf_total = set(df_rcf[df_rcf['ID_FACE'].notna()]['ID_FACE'].astype(str))
+
+    return completar_datos(df_rcf, df_face, df_anulaciones, df_estados, ids_face_en_rcf_total)
+
+
+@cacheable
+def cargar_datos(archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados,
+                 ejercicio_auditado=None, _notificar: Callable[[str, str], None] = None,
+                 columnas_completas: bool = None) -> Dict:
+    """
+    Carga los cuatro archivos de entrada (Excel, CSV o Parquet) y retorna un
+    diccionario con los DataFrames del ejercicio auditado
+
+    - ejercicio_auditado: ejercicio por el que se filtran los datos; por defecto
+      ejercicio_configurado().
+    - _notificar(nivel, mensaje): receptor de los avisos y del progreso; por defecto
+      el registrado en utils.notificaciones. El guion bajo lo excluye de la clave
+      de st.cache_data.
+    - columnas_completas: leer todas las columnas de los archivos y no solo las que
+      usan los análisis; por defecto CONFIGURACION['columnas_completas'].
+
+    Para trabajar con varios ejercicios sin volver a leer los archivos, ver
+    utils/almacen_ejercicios.py.
+    """
+    notificar = _notificar or notificar_por_defecto
+    try:
+        fuentes = leer_fuentes(archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados, notificar,
+                               columnas_completas)
+        if ejercicio_auditado is None:
+            ejercicio_auditado = ejercicio_configurado()
+        return seleccionar_ejercicio(fuentes, ejercicio_auditado, notificar)
 
-        return {
-            'rcf': df_rcf,
-            'face': df_face,
-            'anulaciones': df_anulaciones,
-            'estados': df_estados,
-            'ids_face_en_rcf_total': ids_face_en_rcf_total,
-            'face_anuladas_antes_rcf': df_face_anuladas_antes_rcf
-        }
-        
     except Exception as e:
-        st.error(f"Error al cargar datos: {str(e)}")
-        st.error(f"Detalles del error: {type(e).__name__}")
+        notificar('error', f"Error al cargar datos: {str(e)}")
+        notificar('error', f"Detalles del error: {type(e).__name__}")
         raise e
 
 def convertir_fechas(df: pd.DataFrame, columnas: List[str]) -> pd.DataFrame:
@@ -322,6 +575,11 @@ def validar_archivos(datos: Dict) -> Dict:
         nulas = datos['rcf']['fecha_emision'].isna().sum()
         if nulas > 0:
             warnings.append(f"RCF: {nulas} facturas sin fecha de emisión")
+
+    # Validar dígitos de control de los NIF de los emisores
+    erroneos = resumen_nif(datos['rcf']).get('control_erroneo', 0)
+    if erroneos > 0:
+        warnings.append(f"RCF: {erroneos} facturas con NIF de emisor con dígito de control erróneo")
     
     return {
         'valido': len(errores) == 0,
@@ -329,7 +587,7 @@ def validar_archivos(datos: Dict) -> Dict:
         'warnings': warnings
     }
 
-@st.cache_data
+@cacheable
 def filtrar_por_periodo(df: pd.DataFrame, fecha_col: str, fecha_inicio=None, fecha_fin=None) -> pd.DataFrame:
     """
     Filtra un DataFrame por periodo de fechas
@@ -347,7 +605,7 @@ def filtrar_por_periodo(df: pd.DataFrame, fecha_col: str, fecha_inicio=None, fec
     
     return df_filtrado
 
-@st.cache_data
+@cacheable
 def calcular_estadisticas_basicas(df: pd.DataFrame) -> Dict:
     """
     Calcula estadísticas básicas de un DataFrame
@@ -370,22 +628,11 @@ def calcular_estadisticas_basicas(df: pd.DataFrame) -> Dict:
 
 def es_persona_juridica(nif: str) -> bool:
     """
-    Identifica si un NIF corresponde a una Persona Jurídica en España
-    Prefijos de PJ: A, B, C, D, E, F, G, H, J, P, Q, R, S, U, V, N, W
+    Identifica si un NIF corresponde a una Persona Jurídica en España (CIF:
+    A, B, C, D, E, F, G, H, J, N, P, Q, R, S, U, V, W). Para columnas completas,
+    usar mascara_persona_juridica, que reutiliza la columna 'tipo_nif' de la carga.
     """
-    if pd.isna(nif) or not str(nif):
-        return False
-    
-    # Limpiar y obtener primer carácter
-    s_nif = str(nif).strip().upper()
-    if not s_nif:
-        return False
-        
-    first_char = s_nif[0]
-    
-    # Si empieza por letra y no es NIE (X, Y, Z), se considera PJ en este contexto de auditoría
-    # (Siguiendo la lógica de la Guía IGAE y los tipos de NIF comunes)
-    return first_char.isalpha() and first_char not in ['X', 'Y', 'Z']
+    return bool(clasificar_nif(pd.Series([nif], dtype=object)).iloc[0] == 'CIF')
 
 def excluir_facturas_borradas(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -412,15 +659,15 @@ def agregar_columna_entidad(df: pd.DataFrame, posicion: int = 0) -> pd.DataFrame
     return df_con_entidad
 
 
-def obtener_facturas_papel_sospechosas(df_rcf: pd.DataFrame) -> pd.DataFrame:
+def obtener_facturas_papel_sospechosas(df_rcf: pd.DataFrame, ejercicio_auditado=None) -> pd.DataFrame:
     """
     Identifica facturas en papel que podrían incumplir la normativa
     Según Ley 25/2013 y Circular 1/2015 IGAE
 
     NOTA: Se excluyen facturas BORRADAS según criterios de auditoría
     """
-    # Criterios desde configuración
-    ejercicio_auditado = CONFIGURACION['ejercicio_auditado']
+    # Criterios desde configuración (el ejercicio, por defecto el de CONFIGURACION)
+    ejercicio_auditado = resolver_ejercicio(ejercicio_auditado)
     importe_minimo = CONFIGURACION['importe_minimo_obligatorio']
     fecha_obligatoriedad = pd.to_datetime(CONFIGURACION['fecha_inicio_obligatoriedad'])
 
@@ -459,11 +706,11 @@ def obtener_facturas_papel_sospechosas(df_rcf: pd.DataFrame) -> pd.DataFrame:
             df_sospechoso = df_sospechoso[df_sospechoso['tipo_persona'] == 'J']
         else:
             # Fallback: Identificar por prefijo de NIF si no hay 'J's
-            df_sospechoso = df_sospechoso[df_sospechoso['nif_emisor'].apply(es_persona_juridica)]
+            df_sospechoso = df_sospechoso[mascara_persona_juridica(df_sospechoso)]
     else:
         # Si no hay columna de tipo, aplicamos por NIF
         if 'nif_emisor' in df_sospechoso.columns:
-            df_sospechoso = df_sospechoso[df_sospechoso['nif_emisor'].apply(es_persona_juridica)]
+            df_sospechoso = df_sospechoso[mascara_persona_juridica(df_sospechoso)]
 
     # Filtrar por estado: excluir RECHAZADA y ANULADA (además de BORRADA ya excluida)
     if 'estado' in df_sospechoso.columns:
@@ -817,12 +1064,35 @@ def calcular_indicadores_tramitacion_posterior(df_rcf: pd.DataFrame) -> pd.DataF
 
 def exportar_a_excel(df: pd.DataFrame, nombre_archivo: str):
     """
-    Exporta un DataFrame a Excel y retorna los bytes para descarga
+    Exporta un DataFrame a Excel y retorna los bytes para descarga.
+    El libro se escribe en flujo (ver utils/escritor_xlsx.py): fechas e importes
+    con formato nativo y, si no caben en una hoja, repartido en Datos, Datos_2...
     """
     import io
-    
+    from utils.escritor_xlsx import escribir_xlsx
+
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Datos')
-    
-    return output.getvalue()
\ No newline at end of file
+    escribir_xlsx({'Datos': df}, output)
+    return output.getvalue()
+
+
+def tablas_resultado(analisis: Dict) -> Dict:
+    """Tablas (DataFrames no vacíos) de los resultados, con nombre de hoja único de hasta 31 caracteres."""
+    tablas = {}
+    for seccion, resultado in analisis.items():
+        for clave, valor in resultado.items():
+            if isinstance(valor, pd.DataFrame) and len(valor) > 0:
+                nombre = f'{seccion}_{clave}'[:31]
+                n = 1
+                while nombre in tablas:
+                    n += 1
+                    nombre = f'{seccion}_{clave}'[:28] + f'_{n}'
+                tablas[nombre] = valor
+    return tablas
+
+
+def exportar_resultados_excel(analisis: Dict, ruta) -> None:
+    """Escribe cada tabla de resultados en una hoja del libro Excel."""
+    from utils.escritor_xlsx import escribir_xlsx
+
+    escribir_xlsx(tablas_resultado(analisis), ruta)
@@ -0,0 +1,297 @@
+"""
+Emisión rápida de tablas para documentos Word (python-docx).
+
+En lugar de crear la tabla celda a celda con python-docx (cada acceso a .cells
+recorre de nuevo el XML), se formatea el DataFrame columna a columna, se construye
+el XML completo del elemento w:tbl con una única concatenación y se inserta en el
+documento como un solo subárbol lxml. Así los anexos con miles de filas se generan
+en segundos.
+"""
+
+import io
+import re
+import uuid
+import zipfile
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.table import Table
+
+FONDO_CABECERA = '0066CC'
+FONDO_TOTAL = 'D9E1F2'
+TRUNCAR_TEXTO = 50
+TAMANO_BLOQUE_FILAS = 5000
+
+# Anchura relativa mínima y máxima de una columna (en caracteres)
+_ANCHO_MIN_CARACTERES = 4
+_ANCHO_MAX_CARACTERES = 40
+
+_CARACTERES_NO_XML = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _formatear_valor(valor, truncar: Optional[int]) -> str:
+    """Formato de un valor suelto (columnas object con tipos mezclados)."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return ''
+    if isinstance(valor, (bool, np.bool_)):
+        return str(valor)
+    if isinstance(valor, (float, np.floating)):
+        return f'{valor:,.2f}'
+    if isinstance(valor, (int, np.integer)):
+        return f'{valor:,}'
+    if isinstance(valor, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(valor).strftime('%d/%m/%Y')
+    texto = str(valor)
+    return texto[:truncar] if truncar else texto
+
+
+def formatear_columna(serie: pd.Series, truncar: Optional[int] = TRUNCAR_TEXTO) -> pd.Series:
+    """
+    Convierte una columna a texto según su tipo: importes con separador de miles y
+    dos decimales, enteros con separador de miles, fechas dd/mm/aaaa y texto
+    truncado. Los nulos quedan vacíos.
+    """
+    nulos = serie.isna()
+    if pd.api.types.is_bool_dtype(serie):
+        texto = serie.astype(str)
+    elif pd.api.types.is_float_dtype(serie):
+        texto = serie.map('{:,.2f}'.format, na_action='ignore')
+    elif pd.api.types.is_integer_dtype(serie):
+        texto = serie.map('{:,}'.format, na_action='ignore')
+    elif pd.api.types.is_datetime64_any_dtype(serie):
+        texto = serie.dt.strftime('%d/%m/%Y')
+    elif pd.api.types.is_string_dtype(serie) and not pd.api.types.is_object_dtype(serie):
+        texto = serie.str.slice(0, truncar) if truncar else serie
+    else:
+        return serie.map(lambda v: _formatear_valor(v, truncar)).astype(object)
+    return texto.astype(object).where(~nulos, '')
+
+
+def _escapar(serie: pd.Series) -> pd.Series:
+    """
+    Escapa caracteres especiales XML en una columna de texto (vectorizado). Se
+    eliminan los espacios de los extremos para no necesitar xml:space="preserve",
+    cuyo espacio de nombres encarece mucho la inserción del subárbol en el documento.
+    """
+    return (
+        serie.astype(str)
+        .str.strip()
+        .str.replace(_CARACTERES_NO_XML, '', regex=True)
+        .str.replace('&', '&amp;', regex=False)
+        .str.replace('<', '&lt;', regex=False)
+        .str.replace('>', '&gt;', regex=False)
+    )
+
+
+def _escapar_texto(texto: str) -> str:
+    return _escapar(pd.Series([texto])).iloc[0]
+
+
+def _ancho_util_twips(doc) -> int:
+    """Ancho disponible entre márgenes de la última sección del documento, en twips."""
+    seccion = doc.sections[-1]
+    return int((seccion.page_width - seccion.left_margin - seccion.right_margin) / 635)
+
+
+def longitud_maxima(serie: pd.Series) -> int:
+    """Longitud máxima del texto formateado de una columna, sin formatearla entera."""
+    valores = serie.dropna()
+    if len(valores) == 0:
+        return 0
+    if pd.api.types.is_datetime64_any_dtype(valores):
+        return 10
+    if pd.api.types.is_bool_dtype(valores):
+        return 5
+    if pd.api.types.is_numeric_dtype(valores):
+        extremo = max(abs(valores.min()), abs(valores.max()))
+        return len(formatear_columna(pd.Series([extremo], dtype=valores.dtype)).iloc[0]) + 1
+    return int(valores.astype(str).str.len().max())
+
+
+def calcular_anchos(cabecera: Sequence[str], longitudes: Sequence[int], ancho_total: int) -> List[int]:
+    """Anchos de columna (en la unidad de ancho_total) proporcionales a la longitud máxima del texto de cada columna."""
+    acotadas = [
+        min(max(len(str(titulo)), n, _ANCHO_MIN_CARACTERES), _ANCHO_MAX_CARACTERES)
+        for titulo, n in zip(cabecera, longitudes)
+    ]
+    suma = sum(acotadas)
+    return [int(ancho_total * n / suma) for n in acotadas]
+
+
+def _celda_xml(ancho: int, fondo: Optional[str], negrita: bool, color: Optional[str], derecha: bool) -> tuple:
+    """Prefijo y sufijo XML de una celda; el texto escapado va entre ambos."""
+    shd = f'<w:shd w:val="clear" w:color="auto" w:fill="{fondo}"/>' if fondo else ''
+    ppr = '<w:pPr><w:jc w:val="right"/></w:pPr>' if derecha else ''
+    rpr = ''
+    if negrita or color:
+        rpr = '<w:rPr>' + ('<w:b/>' if negrita else '') + (f'<w:color w:val="{color}"/>' if color else '') + '</w:rPr>'
+    prefijo = (
+        f'<w:tc><w:tcPr><w:tcW w:w="{ancho}" w:type="dxa"/>{shd}</w:tcPr>'
+        f'<w:p>{ppr}<w:r>{rpr}<w:t>'
+    )
+    return prefijo, '</w:t></w:r></w:p></w:tc>'
+
+
+def _columnas_numericas(df: pd.DataFrame) -> List[bool]:
+    return [
+        pd.api.types.is_numeric_dtype(df.iloc[:, j]) and not pd.api.types.is_bool_dtype(df.iloc[:, j])
+        for j in range(df.shape[1])
+    ]
+
+
+def _apertura_xml(estilo_id: str, anchos: List[int], fondo_cabecera: Optional[str], cabecera: List[str]) -> str:
+    """Propiedades, rejilla y fila de cabecera (repetida en cada página) de la tabla."""
+    rejilla = ''.join(f'<w:gridCol w:w="{a}"/>' for a in anchos)
+    color_cabecera = 'FFFFFF' if fondo_cabecera else None
+    celdas = []
+    for titulo, ancho in zip(cabecera, anchos):
+        prefijo, sufijo = _celda_xml(ancho, fondo_cabecera, True, color_cabecera, False)
+        celdas.append(prefijo + _escapar_texto(titulo) + sufijo)
+    return (
+        f'<w:tbl {nsdecls("w")}>'
+        f'<w:tblPr><w:tblStyle w:val="{estilo_id}"/><w:tblW w:w="{sum(anchos)}" w:type="dxa"/>'
+        '<w:jc w:val="center"/><w:tblLayout w:type="fixed"/>'
+        '<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1" w:lastColumn="0" w:noHBand="0" w:noVBand="1"/>'
+        f'</w:tblPr><w:tblGrid>{rejilla}</w:tblGrid>'
+        '<w:tr><w:trPr><w:tblHeader/></w:trPr>' + ''.join(celdas) + '</w:tr>'
+    )
+
+
+def _filas_xml(columnas: List[pd.Series], anchos: List[int], numericas: List[bool],
+               fondo: Optional[str] = None, negrita: bool = False) -> str:
+    """XML de un bloque de filas: concatenación vectorizada columna a columna y un único join."""
+    if not columnas or len(columnas[0]) == 0:
+        return ''
+    filas = np.full(len(columnas[0]), '<w:tr>', dtype=object)
+    for col, ancho, derecha in zip(columnas, anchos, numericas):
+        prefijo, sufijo = _celda_xml(ancho, fondo, negrita, None, derecha)
+        filas = filas + prefijo + col.to_numpy(dtype=object) + sufijo
+    return ''.join((filas + '</w:tr>').tolist())
+
+
+def tabla_xml(df: pd.DataFrame, estilo_id: str = 'TableGrid', anchos: Optional[List[int]] = None,
+              ancho_total: int = 9026, fondo_cabecera: Optional[str] = FONDO_CABECERA,
+              fila_total: bool = False, truncar: Optional[int] = TRUNCAR_TEXTO) -> str:
+    """
+    Construye el XML (w:tbl) de una tabla con cabecera y una fila por registro del DataFrame.
+
+    - fondo_cabecera: color de fondo de la cabecera (texto en blanco y negrita);
+      None para dejar el formato del estilo con el texto en negrita.
+    - fila_total: la última fila se resalta en negrita con fondo FONDO_TOTAL.
+    """
+    cabecera = [str(c) for c in df.columns]
+    columnas = [_escapar(formatear_columna(df.iloc[:, j], truncar)) for j in range(df.shape[1])]
+    if anchos is None:
+        longitudes = [int(col.str.len().max()) if len(col) else 0 for col in columnas]
+        anchos = calcular_anchos(cabecera, longitudes, ancho_total)
+    numericas = _columnas_numericas(df)
+
+    n_cuerpo = len(df) - 1 if fila_total and len(df) > 0 else len(df)
+    cuerpo = _filas_xml([col.iloc[:n_cuerpo] for col in columnas], anchos, numericas)
+    total = ''
+    if fila_total and len(df) > 0:
+        total = _filas_xml([col.iloc[n_cuerpo:] for col in columnas], anchos, numericas, FONDO_TOTAL, True)
+
+    return _apertura_xml(estilo_id, anchos, fondo_cabecera, cabecera) + cuerpo + total + '</w:tbl>'
+
+
+def iterar_tabla_xml(df: pd.DataFrame, estilo_id: str = 'TableGrid', ancho_total: int = 9026,
+                     fondo_cabecera: Optional[str] = FONDO_CABECERA, truncar: Optional[int] = TRUNCAR_TEXTO,
+                     tamano_bloque: int = TAMANO_BLOQUE_FILAS) -> Iterator[str]:
+    """
+    Genera el XML de la tabla por bloques de filas, de modo que solo un bloque
+    formateado está en memoria a la vez (anexos de cientos de miles de filas).
+    Los anchos se calculan antes a partir de la longitud máxima de cada columna.
+    """
+    cabecera = [str(c) for c in df.columns]
+    longitudes = [
+        min(longitud_maxima(df.iloc[:, j]), truncar) if truncar else longitud_maxima(df.iloc[:, j])
+        for j in range(df.shape[1])
+    ]
+    anchos = calcular_anchos(cabecera, longitudes, ancho_total)
+    numericas = _columnas_numericas(df)
+
+    yield _apertura_xml(estilo_id, anchos, fondo_cabecera, cabecera)
+    for inicio in range(0, len(df), tamano_bloque):
+        bloque = df.iloc[inicio:inicio + tamano_bloque]
+        columnas = [_escapar(formatear_columna(bloque.iloc[:, j], truncar)) for j in range(bloque.shape[1])]
+        yield _filas_xml(columnas, anchos, numericas)
+    yield '</w:tbl>'
+
+
+def insertar_tabla(doc, df: pd.DataFrame, estilo: str = 'Table Grid',
+                   fondo_cabecera: Optional[str] = FONDO_CABECERA, fila_total: bool = False,
+                   anchos: Optional[List[int]] = None, truncar: Optional[int] = TRUNCAR_TEXTO) -> Table:
+    """
+    Inserta al final del documento una tabla con el contenido del DataFrame,
+    construida como un único subárbol XML. Devuelve la tabla de python-docx.
+    """
+    estilo_id = doc.styles[estilo].style_id
+    xml = tabla_xml(df, estilo_id, anchos, _ancho_util_twips(doc), fondo_cabecera, fila_total, truncar)
+    tbl = parse_xml(xml)
+
+    cuerpo = doc.element.body
+    if cuerpo.sectPr is not None:
+        cuerpo.sectPr.addprevious(tbl)
+    else:
+        cuerpo.append(tbl)
+    return Table(tbl, doc._body)
+
+
+def insertar_tabla_filas(doc, filas: List[List], estilo: str = 'Light Grid Accent 1') -> Table:
+    """
+    Inserta una tabla a partir de una lista de filas de texto cuya primera fila es
+    la cabecera (tablas de concepto/valor del informe).
+    """
+    df = pd.DataFrame([[str(v) for v in fila] for fila in filas[1:]], columns=[str(v) for v in filas[0]], dtype=object)
+    return insertar_tabla(doc, df, estilo=estilo, fondo_cabecera=None, truncar=None)
+
+
+def reservar_tabla(doc, tablas_diferidas: Dict[str, tuple], df: pd.DataFrame, estilo: str = 'Table Grid') -> None:
+    """
+    Reserva en el documento la posición de una tabla que se escribirá por bloques
+    al guardar (ver guardar_con_tablas_diferidas). En el documento solo queda un
+    párrafo marcador, de modo que el árbol XML en memoria no crece con la tabla.
+    La marca es única, así que documentos generados por separado pueden unirse.
+    """
+    marca = f'TABLA_DIFERIDA_{uuid.uuid4().hex}'
+    doc.add_paragraph(marca)
+    tablas_diferidas[marca] = (df, doc.styles[estilo].style_id)
+
+
+def guardar_con_tablas_diferidas(doc, tablas_diferidas: Dict[str, tuple],
+                                 tamano_bloque: int = TAMANO_BLOQUE_FILAS) -> bytes:
+    """
+    Guarda el documento sustituyendo cada párrafo marcador por su tabla, que se
+    escribe en word/document.xml bloque a bloque directamente en el ZIP de salida.
+    """
+    base = io.BytesIO()
+    doc.save(base)
+    if not tablas_diferidas:
+        return base.getvalue()
+
+    ancho_total = _ancho_util_twips(doc)
+    salida = io.BytesIO()
+    with zipfile.ZipFile(base) as origen, zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as destino:
+        for item in origen.infolist():
+            if item.filename != 'word/document.xml':
+                destino.writestr(item, origen.read(item.filename))
+                continue
+
+            xml = origen.read(item.filename).decode('utf-8')
+            with destino.open(item.filename, 'w', force_zip64=True) as f:
+                pos = 0
+                for marca, (df, estilo_id) in tablas_diferidas.items():
+                    i = xml.index(marca, pos)
+                    inicio_parrafo = max(xml.rfind('<w:p>', pos, i), xml.rfind('<w:p ', pos, i))
+                    fin_parrafo = xml.index('</w:p>', i) + len('</w:p>')
+                    f.write(xml[pos:inicio_parrafo].encode('utf-8'))
+                    for trozo in iterar_tabla_xml(df, estilo_id, ancho_total, tamano_bloque=tamano_bloque):
+                        f.write(trozo.encode('utf-8'))
+                    pos = fin_parrafo
+                f.write(xml[pos:].encode('utf-8'))
+
+    return salida.getvalue()
@@ -0,0 +1,291 @@
+"""
+Escritura de DataFrames en .xlsx en flujo, con memoria acotada.
+
+pd.ExcelWriter (motor openpyxl) crea un objeto por celda y guarda el libro
+completo en memoria antes de escribirlo. Aquí el XML de cada hoja se genera por
+bloques de BLOQUE_FILAS filas, formateando cada columna de forma vectorizada
+(texto escapado, números, fechas como número de serie de Excel), y se escribe
+directamente en el zip, de modo que la memoria depende del bloque y no del
+tamaño de la tabla.
+
+Las fechas y los importes se escriben como valores nativos con formato de
+número (dd/mm/aaaa, dd/mm/aaaa hh:mm:ss, #,##0.00) y el texto como cadena en
+línea (inlineStr), por lo que un texto que empiece por '=' nunca se interpreta
+como fórmula. Las tablas que superan el límite de filas de Excel se reparten
+en varias hojas (Datos, Datos_2, ...).
+"""
+
+import re
+import zipfile
+from typing import Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+# Filas por hoja de Excel, encabezado incluido
+MAX_FILAS_HOJA = 1_048_576
+BLOQUE_FILAS = 20_000
+
+# Índices de estilo (cellXfs de ESTILOS)
+ESTILO_ENCABEZADO, ESTILO_IMPORTE, ESTILO_FECHA, ESTILO_FECHA_HORA = 1, 2, 3, 4
+
+ESTILOS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/>'
+    '<numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm:ss"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+_EPOCA_EXCEL = pd.Timestamp('1899-12-30')
+_PRIMERA_FECHA = pd.Timestamp('1900-03-01')  # antes, el calendario de Excel no coincide
+_CARACTERES_NO_XML = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _letras_columna(indice: int) -> str:
+    """0 -> 'A', 25 -> 'Z', 26 -> 'AA'..."""
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _texto_xml(serie: pd.Series) -> pd.Series:
+    """Texto escapado para XML, sin los caracteres de control que XML no admite."""
+    texto = serie.astype(str)
+    texto = texto.str.replace('&', '&amp;', regex=False).str.replace('<', '&lt;', regex=False)
+    texto = texto.str.replace('>', '&gt;', regex=False)
+    return texto.str.replace(_CARACTERES_NO_XML.pattern, '', regex=True)
+
+
+def _clase(valor) -> str:
+    if isinstance(valor, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(valor, (int, float, np.integer, np.floating)):
+        return 'numero'
+    if isinstance(valor, (pd.Timestamp, np.datetime64)) or hasattr(valor, 'toordinal'):
+        return 'fecha'
+    if isinstance(valor, (pd.Timedelta, np.timedelta64)):
+        return 'duracion'
+    return 'texto'
+
+
+def _tipo_columna(serie: pd.Series) -> str:
+    """'numero', 'fecha', 'duracion', 'bool', 'texto' o 'mixta' según los valores de la columna."""
+    dtype = serie.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return _tipo_columna(serie.astype(dtype.categories.dtype))
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'bool'
+    if pd.api.types.is_numeric_dtype(dtype):
+        return 'numero'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'fecha'
+    if pd.api.types.is_timedelta64_dtype(dtype):
+        return 'duracion'
+    inferido = pd.api.types.infer_dtype(serie, skipna=True)
+    if inferido in ('string', 'empty', 'bytes'):
+        return 'texto'
+    if inferido in ('integer', 'floating', 'mixed-integer-float', 'decimal'):
+        return 'numero'
+    if inferido in ('datetime', 'datetime64', 'date'):
+        return 'fecha'
+    if inferido in ('timedelta', 'timedelta64'):
+        return 'duracion'
+    if inferido == 'boolean':
+        return 'bool'
+    return 'mixta'
+
+
+def _estilo(serie: pd.Series, tipo: str) -> int:
+    """Estilo de una columna: fecha u hora según tenga horas, importe si tiene decimales, o 0."""
+    if tipo == 'fecha':
+        fechas = pd.to_datetime(serie, errors='coerce').dropna()
+        return ESTILO_FECHA if (fechas == fechas.dt.normalize()).all() else ESTILO_FECHA_HORA
+    if tipo == 'numero':
+        numeros = pd.to_numeric(serie, errors='coerce')
+        if pd.api.types.is_float_dtype(numeros.dtype):
+            validos = numeros[np.isfinite(numeros.to_numpy(dtype='float64', na_value=np.nan))]
+            # Los importes con decimales llevan separador de miles y dos decimales
+            if len(validos) and not (validos % 1 == 0).all():
+                return ESTILO_IMPORTE
+    return 0
+
+
+def _celdas(serie: pd.Series, tipo: str, estilo: int, referencias: pd.Series) -> pd.Series:
+    """XML de las celdas de una columna del bloque ('' en las vacías)."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(serie.dtype.categories.dtype)
+    vacia = serie.isna().to_numpy()
+    if tipo == 'mixta':
+        # Cada valor con el formato de su tipo
+        celdas = pd.Series('', index=serie.index, dtype=str)
+        clases = serie.map(_clase)
+        for clase in clases[~vacia].unique():
+            mascara = (clases == clase).to_numpy() & ~vacia
+            parte = serie[mascara]
+            if clase == 'numero':
+                parte = pd.to_numeric(parte)
+            elif clase == 'fecha':
+                parte = pd.to_datetime(parte, errors='coerce')
+            celdas[mascara] = _celdas(parte, clase, _estilo(parte, clase), referencias[mascara])
+        return celdas
+
+    if tipo == 'texto':
+        valores = _texto_xml(serie)
+        celdas = ('<c r="' + referencias + '" t="inlineStr"><is><t xml:space="preserve">'
+                  + valores + '</t></is></c>')
+        return celdas.where(~vacia, '')
+
+    if tipo == 'bool':
+        valores = serie.map({True: '1', False: '0'}).astype(str)
+        celdas = '<c r="' + referencias + '" t="b"><v>' + valores + '</v></c>'
+        return celdas.where(~vacia, '')
+
+    if tipo == 'fecha':
+        fechas = pd.to_datetime(serie, errors='coerce')
+        if fechas.dt.tz is not None:
+            fechas = fechas.dt.tz_localize(None)
+        anteriores = (fechas < _PRIMERA_FECHA).to_numpy()
+        if anteriores.any():
+            # Sin equivalente en el calendario de Excel: se escriben como texto
+            celdas = _celdas(fechas.mask(anteriores), 'fecha', estilo, referencias)
+            celdas[anteriores] = _celdas(fechas[anteriores].astype(str), 'texto', 0, referencias[anteriores])
+            return celdas
+        dias = (fechas - _EPOCA_EXCEL) / pd.Timedelta(days=1)
+        vacia = vacia | dias.isna().to_numpy()
+        valores = dias.fillna(0).astype('int64').astype(str) if estilo == ESTILO_FECHA else dias.astype(str)
+    else:
+        if tipo == 'duracion':
+            numeros = pd.to_timedelta(serie) / pd.Timedelta(days=1)
+        else:
+            numeros = pd.to_numeric(serie, errors='coerce')
+        vacia = vacia | ~np.isfinite(numeros.to_numpy(dtype='float64', na_value=np.nan))
+        valores = numeros.astype(str)
+
+    atributo = f' s="{estilo}"' if estilo else ''
+    celdas = '<c r="' + referencias + '"' + atributo + '><v>' + valores + '</v></c>'
+    return celdas.where(~vacia, '')
+
+
+def _xml_filas(df: pd.DataFrame, formatos: List[Tuple[str, int]], primera_fila: int) -> str:
+    """XML de las filas de datos de df, la primera en la fila primera_fila de la hoja."""
+    numeros = pd.Series(np.arange(primera_fila, primera_fila + len(df)), dtype='int64').astype(str)
+    filas = '<row r="' + numeros + '">'
+    for posicion, (tipo, estilo) in enumerate(formatos):
+        serie = df.iloc[:, posicion].reset_index(drop=True)
+        filas = filas + _celdas(serie, tipo, estilo, _letras_columna(posicion) + numeros)
+    return ''.join((filas + '</row>').tolist())
+
+
+def _xml_encabezado(columnas) -> str:
+    celdas = ''.join(
+        f'<c r="{_letras_columna(i)}1" t="inlineStr" s="{ESTILO_ENCABEZADO}"><is><t xml:space="preserve">'
+        f'{_CARACTERES_NO_XML.sub("", escape(str(columna)))}</t></is></c>'
+        for i, columna in enumerate(columnas)
+    )
+    return f'<row r="1">{celdas}</row>'
+
+
+def _escribir_hoja(libro: zipfile.ZipFile, ruta: str, df: pd.DataFrame, formatos: List[Tuple[str, int]]) -> None:
+    ultima = _letras_columna(max(len(df.columns) - 1, 0))
+    with libro.open(ruta, 'w', force_zip64=True) as hoja:
+        hoja.write((
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<dimension ref="A1:{ultima}{len(df) + 1}"/><sheetData>'
+        ).encode('utf-8'))
+        hoja.write(_xml_encabezado(df.columns).encode('utf-8'))
+        for inicio in range(0, len(df), BLOQUE_FILAS):
+            bloque = df.iloc[inicio:inicio + BLOQUE_FILAS]
+            hoja.write(_xml_filas(bloque, formatos, inicio + 2).encode('utf-8'))
+        hoja.write(b'</sheetData></worksheet>')
+
+
+def _nombres_hoja(nombre: str, partes: int, usados: set) -> List[str]:
+    """Nombre (hasta 31 caracteres, único y sin caracteres prohibidos) de cada hoja de una tabla."""
+    base = re.sub(r'[\[\]:*?/\\]', '_', str(nombre)) or 'Datos'
+    nombres = []
+    for parte in range(1, partes + 1):
+        sufijo = '' if parte == 1 else f'_{parte}'
+        candidato, n = base[:31 - len(sufijo)] + sufijo, 1
+        # Excel no distingue mayúsculas en los nombres de hoja
+        while candidato.lower() in usados:
+            n += 1
+            candidato = base[:31 - len(sufijo) - len(str(n)) - 1] + f'{sufijo}_{n}'
+        usados.add(candidato.lower())
+        nombres.append(candidato)
+    return nombres
+
+
+def escribir_xlsx(hojas: Dict[str, pd.DataFrame], destino) -> None:
+    """
+    Escribe cada DataFrame {nombre de hoja: df} (sin el índice) en un libro .xlsx,
+    en una ruta o en un archivo abierto. Las tablas de más de MAX_FILAS_HOJA - 1
+    filas continúan en hojas nombre_2, nombre_3...
+    """
+    por_hoja = MAX_FILAS_HOJA - 1
+    usados: set = set()
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as libro:
+        nombres = []
+        for nombre, df in hojas.items():
+            # Tipo y estilo de cada columna, iguales en todos los bloques y hojas de la tabla
+            tipos = [_tipo_columna(df.iloc[:, i]) for i in range(len(df.columns))]
+            formatos = [(tipo, _estilo(df.iloc[:, i], tipo)) for i, tipo in enumerate(tipos)]
+            partes = max(1, -(-len(df) // por_hoja))
+            for parte, nombre_hoja in enumerate(_nombres_hoja(nombre, partes, usados)):
+                nombres.append(nombre_hoja)
+                _escribir_hoja(libro, f'xl/worksheets/sheet{len(nombres)}.xml',
+                               df.iloc[parte * por_hoja:(parte + 1) * por_hoja], formatos)
+        if not nombres:
+            # Un libro necesita al menos una hoja
+            nombres.append('Datos')
+            _escribir_hoja(libro, 'xl/worksheets/sheet1.xml', pd.DataFrame(), [])
+
+        hojas_xml = ''.join(f'<sheet name="{escape(n, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+                            for i, n in enumerate(nombres, 1))
+        relaciones = ''.join(
+            f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+            f'relationships/worksheet" Target="worksheets/sheet{i}.xml"/>' for i in range(1, len(nombres) + 1))
+        tipos_contenido = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="application/'
+            f'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>' for i in range(1, len(nombres) + 1))
+        cabecera = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+        libro.writestr('[Content_Types].xml', (
+            cabecera + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            + tipos_contenido + '</Types>'))
+        libro.writestr('_rels/.rels', (
+            cabecera + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+            'relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>'))
+        libro.writestr('xl/workbook.xml', (
+            cabecera + '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{hojas_xml}</sheets></workbook>'))
+        libro.writestr('xl/_rels/workbook.xml.rels', (
+            cabecera + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + relaciones + f'<Relationship Id="rId{len(nombres) + 1}" Type="http://schemas.openxmlformats.org/'
+            'officeDocument/2006/relationships/styles" Target="styles.xml"/></Relationships>'))
+        libro.writestr('xl/styles.xml', ESTILOS)
@@ -0,0 +1,212 @@
+"""
+Exportación de todos los resultados de la auditoría en un único ZIP.
+
+El ZIP contiene el informe Word, el informe PDF, un Excel por sección con sus
+tablas de detalle (sospechosas, retenidas, validaciones, anulaciones, pendientes,
+tiempos...) y manifiesto.json con las métricas de cada análisis y la relación
+de archivos incluidos.
+
+Los miembros se generan a la vez en un pool de hilos: los informes, con
+generar_informes_cacheados (que a su vez reparte las secciones en procesos), y
+cada Excel, con utils.escritor_xlsx sobre un archivo temporal en disco. Cada
+miembro se copia al ZIP por bloques en cuanto está listo y se descarta, de modo
+que la memoria no crece con el número ni el tamaño de los archivos exportados.
+"""
+
+import json
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import CONFIGURACION
+from utils.ciclo_vida import ejercicio_auditado
+from utils.escritor_xlsx import escribir_xlsx
+from utils.informe_pipeline import numero_procesos
+
+# Orden y nombre de los Excel de cada sección dentro del ZIP
+SECCIONES = {
+    'facturas_papel': '1_Facturas_Papel',
+    'anotacion': '2_Anotacion_RCF',
+    'validaciones': '3_Validaciones',
+    'rechazos': '3_Rechazos',
+    'tramitacion': '4_Tramitacion',
+    'obligaciones': '5_Obligaciones',
+}
+
+NOMBRES_INFORME = {
+    'word': 'Informe_Auditoria_RCF_{sufijo}.docx',
+    'pdf': 'Informe_Auditoria_RCF_Ejecutivo_{sufijo}.pdf',
+}
+
+BLOQUE_COPIA = 1024 * 1024
+
+
+def _tablas(nombre: str, valor) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Tablas (nombre, DataFrame no vacío) de un resultado de análisis, también las
+    anidadas en diccionarios: un diccionario de valores escalares (rechazos por
+    motivo) da una tabla clave/valor, uno de diccionarios (validaciones por código)
+    da además una tabla resumen con sus valores escalares, y una lista no vacía
+    (facturas incumplidoras) da una tabla con sus registros.
+    """
+    if isinstance(valor, pd.DataFrame):
+        if len(valor) > 0:
+            yield nombre, valor
+    elif isinstance(valor, dict):
+        if valor and all(np.isscalar(v) for v in valor.values()):
+            # Recuento por clave (rechazos por motivo)
+            yield nombre, pd.DataFrame({'clave': list(valor), 'valor': list(valor.values())})
+            return
+        if valor and all(isinstance(v, dict) for v in valor.values()):
+            resumen = pd.DataFrame.from_dict(
+                {clave: {k: v for k, v in sub.items() if np.isscalar(v)} for clave, sub in valor.items()},
+                orient='index',
+            )
+            if resumen.shape[1] > 0:
+                yield nombre, resumen.rename_axis('codigo').reset_index()
+        for clave, sub in valor.items():
+            yield from _tablas(f'{nombre}_{clave}', sub)
+    elif isinstance(valor, list) and valor:
+        if all(isinstance(v, dict) for v in valor):
+            yield nombre, pd.DataFrame(valor)
+        else:
+            yield nombre, pd.DataFrame({nombre: valor})
+
+
+def tablas_seccion(resultado: Dict) -> Dict[str, pd.DataFrame]:
+    """Tablas de detalle de una sección del análisis, por nombre de hoja (sin límite de longitud)."""
+    return dict(t for clave, valor in resultado.items() for t in _tablas(clave, valor))
+
+
+def _valor_json(valor):
+    if isinstance(valor, (bool, np.bool_)):
+        return bool(valor)
+    if isinstance(valor, (int, np.integer)):
+        return int(valor)
+    if isinstance(valor, (float, np.floating)):
+        return None if np.isnan(valor) else float(valor)
+    if isinstance(valor, (pd.Timestamp, datetime, date)):
+        return None if pd.isna(valor) else valor.isoformat()
+    return valor
+
+
+def metricas(analisis: Dict) -> Dict[str, Dict]:
+    """Valores escalares de cada análisis (los de diccionarios anidados, con clave 'a.b')."""
+    def _escalares(resultado: Dict, prefijo: str = '') -> Iterator[Tuple[str, object]]:
+        for clave, valor in resultado.items():
+            if isinstance(valor, dict):
+                yield from _escalares(valor, f'{prefijo}{clave}.')
+            elif valor is None or isinstance(valor, (str, pd.Timestamp, datetime, date)) or np.isscalar(valor):
+                yield f'{prefijo}{clave}', _valor_json(valor)
+
+    return {seccion: dict(_escalares(resultado)) for seccion, resultado in analisis.items()}
+
+
+def _excel_seccion(resultado: Dict):
+    """Escribe el Excel de una sección en un temporal; devuelve (archivo, {hoja: filas}) o None."""
+    tablas = tablas_seccion(resultado)
+    if not tablas:
+        return None
+    temporal = tempfile.TemporaryFile()
+    try:
+        escribir_xlsx(tablas, temporal)
+    except BaseException:
+        temporal.close()
+        raise
+    return temporal, {nombre: len(df) for nombre, df in tablas.items()}
+
+
+def _informes(datos: Dict, analisis: Dict, incluir_anexos: bool, procesos: int, ejercicio: int) -> Dict:
+    from utils.cache_informes import generar_informes_cacheados
+
+    return generar_informes_cacheados(datos, analisis, ('word', 'pdf'), incluir_anexos, procesos, ejercicio)
+
+
+def _cronometrar(funcion, *args):
+    inicio = time.perf_counter()
+    return funcion(*args), time.perf_counter() - inicio
+
+
+def _copiar(zf: zipfile.ZipFile, nombre: str, origen, tamano: int) -> None:
+    """Copia por bloques un archivo abierto a un miembro sin comprimir (ya lo están docx, pdf y xlsx)."""
+    info = zipfile.ZipInfo(nombre, date_time=datetime.now().timetuple()[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    with zf.open(info, 'w', force_zip64=tamano >= zipfile.ZIP64_LIMIT) as miembro:
+        shutil.copyfileobj(origen, miembro, BLOQUE_COPIA)
+
+
+def exportar_todo_zip(datos: Dict, analisis: Dict, destino, incluir_anexos: bool = False,
+                      procesos: int = None, hilos: int = None, ejercicio=None) -> Dict:
+    """
+    Escribe en destino (ruta o archivo abierto en modo binario) el ZIP con los
+    informes, los Excel de cada sección y manifiesto.json. Devuelve el manifiesto:
+    {'generado', 'entidad', 'ejercicio', 'filas_datos', 'metricas', 'archivos',
+    'tiempo_total'}, con cada archivo como {'nombre', 'bytes', 'segundos'} más
+    'hojas' ({hoja: filas}) en los Excel o 'desde_cache' en los informes.
+
+    procesos se pasa a la generación de los informes; hilos es el número de
+    miembros que se generan a la vez (por defecto CONFIGURACION['hilos_exportacion']
+    o las CPU disponibles, más uno para los informes). ejercicio es el auditado
+    (por defecto, el de CONFIGURACION).
+    """
+    inicio = time.perf_counter()
+    ejercicio = ejercicio_auditado(ejercicio)
+    sufijo = f"{ejercicio}_{datetime.now().strftime('%Y%m%d')}"
+    manifiesto = {
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'entidad': CONFIGURACION['nombre_entidad'],
+        'ejercicio': str(ejercicio),
+        'filas_datos': {clave: len(valor) for clave, valor in datos.items() if isinstance(valor, pd.DataFrame)},
+        'metricas': metricas(analisis),
+        'archivos': [],
+    }
+
+    secciones = [seccion for seccion in SECCIONES if seccion in analisis]
+    secciones += [seccion for seccion in analisis if seccion not in SECCIONES]
+    hilos = numero_procesos(hilos, 'hilos_exportacion') + 1
+
+    with ThreadPoolExecutor(max_workers=hilos) as pool, \
+            zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        futuros = {pool.submit(_cronometrar, _informes, datos, analisis, incluir_anexos, procesos, ejercicio): None}
+        for seccion in secciones:
+            futuros[pool.submit(_cronometrar, _excel_seccion, analisis[seccion])] = seccion
+
+        # Cada miembro se escribe en el ZIP (solo desde este hilo) en cuanto está listo
+        for futuro in as_completed(futuros):
+            seccion = futuros[futuro]
+            generado, segundos = futuro.result()
+            if seccion is None:
+                for formato, plantilla in NOMBRES_INFORME.items():
+                    nombre = plantilla.format(sufijo=sufijo)
+                    contenido = generado.pop(formato)
+                    zf.writestr(zipfile.ZipInfo(nombre, date_time=datetime.now().timetuple()[:6]),
+                                contenido, compress_type=zipfile.ZIP_STORED)
+                    manifiesto['archivos'].append({
+                        'nombre': nombre, 'bytes': len(contenido), 'segundos': round(segundos, 3),
+                        'desde_cache': generado['cache'][formato]['desde_cache'],
+                    })
+                    del contenido
+            elif generado is not None:
+                temporal, hojas = generado
+                nombre = f'tablas/{SECCIONES.get(seccion, seccion)}_{sufijo}.xlsx'
+                with temporal:
+                    tamano = temporal.seek(0, 2)
+                    temporal.seek(0)
+                    _copiar(zf, nombre, temporal, tamano)
+                manifiesto['archivos'].append({'nombre': nombre, 'bytes': tamano, 'segundos': round(segundos, 3),
+                                               'hojas': hojas})
+
+        orden = [NOMBRES_INFORME[f].format(sufijo=sufijo) for f in NOMBRES_INFORME]
+        orden += [f'tablas/{SECCIONES.get(s, s)}_{sufijo}.xlsx' for s in secciones]
+        manifiesto['archivos'].sort(key=lambda archivo: orden.index(archivo['nombre']))
+        manifiesto['tiempo_total'] = round(time.perf_counter() - inicio, 3)
+        zf.writestr('manifiesto.json', json.dumps(manifiesto, ensure_ascii=False, indent=1, default=str))
+
+    return manifiesto
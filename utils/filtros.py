@@ -0,0 +1,123 @@
+"""
+Filtros por periodo y oficina contable sobre posiciones de fila.
+
+Para cada conjunto de datos se construye una sola vez un índice con las
+posiciones de las filas con fecha ordenadas por fecha, las de las filas sin
+fecha y el código categórico de la oficina contable de cada fila. Un filtro
+(fecha_inicio, fecha_fin, oficina) se resuelve con dos búsquedas binarias sobre
+las fechas ordenadas y una comparación de enteros, y devuelve las posiciones
+seleccionadas en el orden original, que se memoizan por (conjunto de datos,
+fecha_inicio, fecha_fin, oficina) sin calcular huellas del DataFrame.
+
+Las filas sin fecha se conservan con cualquier periodo (p. ej. las 'PDTE DE
+ACEPTAR' aún no anotadas).
+"""
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import identificador_dataset, memoizar
+
+
+def _limite(fecha) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(fecha), 'ns')
+
+
+def _construir_indice(df: pd.DataFrame, fecha_col: str, oc_col: str,
+                      excluir_estados: Sequence[str]) -> Dict:
+    incluidas = np.ones(len(df), dtype=bool)
+    if excluir_estados and 'estado' in df.columns:
+        incluidas = ~df['estado'].astype(str).str.upper().isin(excluir_estados).to_numpy()
+
+    if fecha_col in df.columns:
+        fechas = pd.to_datetime(df[fecha_col]).to_numpy().astype('datetime64[ns]')
+        con_fecha = incluidas & ~np.isnat(fechas)
+    else:
+        fechas = None
+        con_fecha = np.zeros(len(df), dtype=bool)
+
+    posiciones_con_fecha = np.flatnonzero(con_fecha)
+    if fechas is not None:
+        orden = np.argsort(fechas[posiciones_con_fecha], kind='stable')
+        posiciones_con_fecha = posiciones_con_fecha[orden]
+        fechas_ordenadas = fechas[posiciones_con_fecha]
+    else:
+        fechas_ordenadas = np.array([], dtype='datetime64[ns]')
+
+    if oc_col in df.columns:
+        oficinas = pd.Categorical(df[oc_col])
+        codigos_oc, categorias_oc = oficinas.codes, oficinas.categories
+    else:
+        codigos_oc, categorias_oc = np.full(len(df), -1, dtype=np.int8), pd.Index([])
+
+    return {
+        'dataset': (identificador_dataset(df), fecha_col, oc_col, tuple(excluir_estados)),
+        'incluidas': np.flatnonzero(incluidas),
+        'posiciones_con_fecha': posiciones_con_fecha,
+        'fechas_ordenadas': fechas_ordenadas,
+        'posiciones_sin_fecha': np.flatnonzero(incluidas & ~con_fecha),
+        'codigos_oc': codigos_oc,
+        'categorias_oc': categorias_oc,
+        'fecha_min': pd.Timestamp(fechas_ordenadas[0]) if len(fechas_ordenadas) else pd.NaT,
+        'fecha_max': pd.Timestamp(fechas_ordenadas[-1]) if len(fechas_ordenadas) else pd.NaT,
+    }
+
+
+def indice_filtros(df: pd.DataFrame, fecha_col: str = 'fecha_anotacion_rcf', oc_col: str = 'codigo_oc',
+                   excluir_estados: Sequence[str] = ('BORRADA',)) -> Dict:
+    """
+    Índice de filtrado de df (se calcula una vez por objeto): excluye las filas
+    cuyo estado está en excluir_estados y guarda las fechas de fecha_col ordenadas
+    con sus posiciones, las posiciones sin fecha y los códigos de oc_col. Si falta
+    fecha_col, todas las filas se tratan como sin fecha. Incluye 'fecha_min' y
+    'fecha_max' de las filas con fecha (NaT si no hay ninguna).
+    """
+    excluir_estados = tuple(excluir_estados or ())
+    clave = (identificador_dataset(df), fecha_col, oc_col, excluir_estados)
+    return memoizar(
+        'indice_filtros', clave,
+        lambda: _construir_indice(df, fecha_col, oc_col, excluir_estados),
+        max_entradas=4,
+    )
+
+
+def _seleccionar(indice: Dict, fecha_inicio, fecha_fin, oficina) -> np.ndarray:
+    fechas = indice['fechas_ordenadas']
+    desde = np.searchsorted(fechas, _limite(fecha_inicio), 'left') if fecha_inicio else 0
+    hasta = np.searchsorted(fechas, _limite(fecha_fin), 'right') if fecha_fin else len(fechas)
+    posiciones = np.sort(np.concatenate([
+        indice['posiciones_con_fecha'][desde:max(desde, hasta)],
+        indice['posiciones_sin_fecha'],
+    ]))
+
+    if oficina is not None:
+        categorias = indice['categorias_oc']
+        if oficina not in categorias:
+            posiciones = posiciones[:0]
+        else:
+            posiciones = posiciones[indice['codigos_oc'][posiciones] == categorias.get_loc(oficina)]
+    posiciones.flags.writeable = False
+    return posiciones
+
+
+def seleccionar_filas(indice: Dict, fecha_inicio=None, fecha_fin=None, oficina: str = None) -> np.ndarray:
+    """
+    Posiciones (ordenadas) de las filas del índice con fecha entre fecha_inicio y
+    fecha_fin, ambas incluidas, más las filas sin fecha; con oficina, solo las de
+    esa oficina contable. Para obtener las filas: df.take(posiciones).
+    El resultado se comparte entre llamadas y no debe modificarse.
+    """
+    clave = (indice['dataset'], fecha_inicio, fecha_fin, oficina)
+    return memoizar(
+        'seleccion_filtros', clave,
+        lambda: _seleccionar(indice, fecha_inicio, fecha_fin, oficina),
+        max_entradas=64,
+    )
+
+
+def oficinas_presentes(indice: Dict, posiciones: np.ndarray) -> List[str]:
+    """Oficinas contables (ordenadas) de las filas seleccionadas."""
+    codigos = np.unique(indice['codigos_oc'][posiciones])
+    return sorted(indice['categorias_oc'][codigos[codigos >= 0]].tolist())
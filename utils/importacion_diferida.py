@@ -0,0 +1,36 @@
+"""
+Importación diferida de librerías pesadas (plotly) en las páginas.
+
+Streamlit ejecuta el script de la página en cada arranque en frío, incluso cuando
+aún no hay datos cargados y no se dibuja ningún gráfico. Con modulo_diferido la
+librería se importa la primera vez que se usa uno de sus atributos (px.bar,
+go.Figure, ...), no al ejecutar la línea de importación.
+"""
+
+import importlib
+import types
+from typing import Callable
+
+
+class _ModuloDiferido(types.ModuleType):
+    """Sustituto de un módulo que lo importa en el primer acceso a un atributo."""
+
+    def __getattr__(self, atributo: str):
+        return getattr(importlib.import_module(self.__name__), atributo)
+
+    def __dir__(self):
+        return dir(importlib.import_module(self.__name__))
+
+
+def modulo_diferido(nombre: str) -> types.ModuleType:
+    """Módulo que se importa al usarlo por primera vez: px = modulo_diferido('plotly.express')."""
+    return _ModuloDiferido(nombre)
+
+
+def funcion_diferida(modulo: str, nombre: str) -> Callable:
+    """Función de un módulo que se importa al llamarla por primera vez."""
+    def llamar(*args, **kwargs):
+        return getattr(importlib.import_module(modulo), nombre)(*args, **kwargs)
+
+    llamar.__name__ = llamar.__qualname__ = nombre
+    return llamar
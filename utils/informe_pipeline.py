@@ -0,0 +1,90 @@
+"""
+Ejecución por secciones de la generación de informes.
+
+Cada sección del informe es una tarea independiente que produce un fragmento
+serializable (XML de Word, lista de flowables de reportlab). Las tareas se reparten
+en un pool de procesos y los fragmentos se devuelven en el orden de las secciones
+para ensamblarlos en el documento final, junto con el tiempo de cada sección.
+
+Los datos y análisis se entregan a cada proceso una sola vez, en su inicialización
+(con 'fork' se heredan sin serializar; con 'spawn' se serializan una vez por
+proceso), y no con cada tarea. La aplicación Streamlit fija 'spawn' con
+configurar_metodo_inicio (ver utils/streamlit_adaptadores.py).
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config.settings import CONFIGURACION
+
+# Datos compartidos por las tareas de un proceso del pool
+_COMPARTIDO: Dict[str, Any] = {}
+
+# Método de arranque de los procesos del pool (None: el de la plataforma)
+_METODO_INICIO: Optional[str] = None
+
+
+def configurar_metodo_inicio(metodo: str = None) -> None:
+    """
+    Fija el método de arranque de los procesos del pool ('spawn', 'forkserver',
+    'fork' o None para el de la plataforma). En un servidor con varios hilos, como
+    el de Streamlit, debe usarse 'spawn': con 'fork' el proceso hijo hereda los
+    bloqueos que otros hilos tuvieran tomados y puede quedarse esperando.
+    """
+    global _METODO_INICIO
+    _METODO_INICIO = metodo
+
+
+def numero_procesos(procesos: int = None, clave: str = 'procesos_informe') -> int:
+    """Procesos a usar: el valor indicado, CONFIGURACION[clave] o las CPU disponibles."""
+    if procesos is None:
+        procesos = CONFIGURACION.get(clave)
+    if procesos is None:
+        procesos = os.cpu_count() or 1
+    return max(1, int(procesos))
+
+
+def _inicializar_proceso(datos: dict, analisis: dict, contexto: dict) -> None:
+    _COMPARTIDO.update(datos=datos, analisis=analisis, contexto=contexto)
+
+
+def _ejecutar_tarea(clave: Any, funcion: Callable) -> Tuple[Any, Any, float]:
+    inicio = time.perf_counter()
+    fragmento = funcion(_COMPARTIDO['datos'], _COMPARTIDO['analisis'], _COMPARTIDO['contexto'])
+    return clave, fragmento, time.perf_counter() - inicio
+
+
+def ejecutar_secciones(tareas: List[Tuple[Any, Callable]], datos: dict, analisis: dict,
+                       contexto: dict = None, procesos: int = None) -> Tuple[Dict[Any, Any], Dict[Any, float]]:
+    """
+    Ejecuta las tareas (clave, función) y devuelve (fragmentos, tiempos) por clave.
+
+    Cada función recibe (datos, analisis, contexto) y debe ser serializable
+    (función de módulo o functools.partial de una). Con un solo proceso, o una sola
+    tarea, se ejecutan en el proceso actual sin crear el pool.
+    """
+    contexto = contexto or {}
+    procesos = min(numero_procesos(procesos), len(tareas))
+    fragmentos, tiempos = {}, {}
+
+    if procesos <= 1:
+        _inicializar_proceso(datos, analisis, contexto)
+        try:
+            for clave, funcion in tareas:
+                _, fragmentos[clave], tiempos[clave] = _ejecutar_tarea(clave, funcion)
+        finally:
+            _COMPARTIDO.clear()
+        return fragmentos, tiempos
+
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context(_METODO_INICIO),
+                             initializer=_inicializar_proceso, initargs=(datos, analisis, contexto)) as pool:
+        futuros = [pool.submit(_ejecutar_tarea, clave, funcion) for clave, funcion in tareas]
+        for futuro in futuros:
+            clave, fragmento, segundos = futuro.result()
+            fragmentos[clave] = fragmento
+            tiempos[clave] = segundos
+
+    return fragmentos, tiempos
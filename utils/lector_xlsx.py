@@ -0,0 +1,191 @@
+"""
+Lectura de la primera hoja de un .xlsx decodificando solo las columnas pedidas.
+
+pd.read_excel (motor openpyxl) convierte todas las celdas del libro aunque se le
+pase usecols, que solo descarta columnas al final. Este lector recorre en flujo el
+XML de la hoja y solo convierte (cadenas compartidas, números, fechas) las celdas
+de las columnas pedidas; las demás se saltan sin decodificar. Cada celda se
+convierte igual que openpyxl y las filas se entregan al mismo TextParser que usa
+pd.read_excel, de modo que el DataFrame resultante es idéntico al de
+pd.read_excel(archivo, usecols=columnas).
+"""
+
+import zipfile
+from typing import Callable, Dict, Iterable, List, Optional
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from utils.cabecera_xlsx import NS_HOJA, _REFERENCIA, _indice_columna, _ruta_primera_hoja
+
+
+def _formatos_fecha(libro: zipfile.ZipFile):
+    """Índices de estilo (cellXfs) con formato de fecha y de duración, como openpyxl."""
+    from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+
+    if 'xl/styles.xml' not in libro.namelist():
+        return set(), set()
+    estilos = ElementTree.fromstring(libro.read('xl/styles.xml'))
+    formatos = dict(BUILTIN_FORMATS)
+    for formato in estilos.iter(f'{NS_HOJA}numFmt'):
+        formatos[int(formato.get('numFmtId'))] = formato.get('formatCode')
+
+    fechas, duraciones = set(), set()
+    xfs = estilos.find(f'{NS_HOJA}cellXfs')
+    for indice, xf in enumerate(xfs if xfs is not None else []):
+        codigo = formatos.get(int(xf.get('numFmtId', 0)))
+        if codigo and is_date_format(codigo):
+            fechas.add(indice)
+            if is_timedelta_format(codigo):
+                duraciones.add(indice)
+    return fechas, duraciones
+
+
+def _epoca(libro: zipfile.ZipFile):
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+
+    workbook = ElementTree.fromstring(libro.read('xl/workbook.xml'))
+    propiedades = workbook.find(f'{NS_HOJA}workbookPr')
+    en_1904 = propiedades is not None and propiedades.get('date1904') in ('1', 'true')
+    return CALENDAR_MAC_1904 if en_1904 else CALENDAR_WINDOWS_1900
+
+
+def _texto(elemento) -> str:
+    """Texto de un <si> o <is>: el <t> directo más los de cada <r>, sin los fonéticos (<rPh>)."""
+    partes = []
+    for hijo in elemento:
+        if hijo.tag == f'{NS_HOJA}t':
+            partes.append(hijo.text or '')
+        elif hijo.tag == f'{NS_HOJA}r':
+            t = hijo.find(f'{NS_HOJA}t')
+            if t is not None:
+                partes.append(t.text or '')
+    return ''.join(partes)
+
+
+def _cadenas(libro: zipfile.ZipFile) -> List[str]:
+    if 'xl/sharedStrings.xml' not in libro.namelist():
+        return []
+    cadenas = []
+    with libro.open('xl/sharedStrings.xml') as xml:
+        for _, elemento in ElementTree.iterparse(xml, events=('end',)):
+            if elemento.tag == f'{NS_HOJA}si':
+                cadenas.append(_texto(elemento))
+                elemento.clear()
+    return cadenas
+
+
+def _convertidor(libro: zipfile.ZipFile) -> Callable:
+    """Función (tipo, texto, estilo) -> valor, con las conversiones de openpyxl y pandas."""
+    from openpyxl.utils.datetime import from_excel
+
+    cadenas = _cadenas(libro)
+    fechas, duraciones = _formatos_fecha(libro)
+    epoca = _epoca(libro)
+
+    def convertir(tipo: str, texto: Optional[str], estilo: int):
+        if texto is None:
+            return ''
+        if tipo == 'n':
+            numero = float(texto) if ('.' in texto or 'E' in texto or 'e' in texto) else int(texto)
+            if estilo in fechas:
+                try:
+                    return from_excel(numero, epoca, timedelta=estilo in duraciones)
+                except (OverflowError, ValueError):
+                    return np.nan
+            # pd.read_excel devuelve como entero cualquier número sin decimales
+            entero = int(numero)
+            return entero if entero == numero else float(numero)
+        if tipo == 's':
+            return cadenas[int(texto)]
+        if tipo == 'b':
+            return bool(int(texto))
+        if tipo == 'e':
+            return np.nan
+        if tipo == 'd':
+            from openpyxl.utils.datetime import from_ISO8601
+            return from_ISO8601(texto)
+        return texto  # 'str' (resultado de fórmula) e 'inlineStr'
+
+    return convertir
+
+
+def _filas(archivo, seleccionar: Optional[Callable[[object], bool]]) -> List[list]:
+    """
+    Filas (encabezado incluido) de las columnas cuyo encabezado cumple seleccionar(),
+    o de todas si seleccionar es None, con los valores que daría pd.read_excel.
+    """
+    with zipfile.ZipFile(archivo) as libro:
+        convertir = _convertidor(libro)
+        etiqueta_fila, etiqueta_celda = f'{NS_HOJA}row', f'{NS_HOJA}c'
+        etiqueta_valor, etiqueta_inline = f'{NS_HOJA}v', f'{NS_HOJA}is'
+
+        filas: List[Dict[int, object]] = []
+        elegidas: Optional[set] = None   # índices de columna a decodificar (None: todos)
+        ultima_con_datos, ancho = -1, 0
+
+        with libro.open(_ruta_primera_hoja(libro)) as xml:
+            for _, fila in ElementTree.iterparse(xml, events=('end',)):
+                if fila.tag != etiqueta_fila:
+                    continue
+                # openpyxl rellena con filas vacías los huecos de numeración
+                r = fila.get('r')
+                while r and len(filas) + 1 < int(r):
+                    filas.append({})
+
+                valores: Dict[int, object] = {}
+                hay_datos = False
+                for posicion, celda in enumerate(fila.iter(etiqueta_celda)):
+                    referencia = celda.get('r')
+                    indice = _indice_columna(_REFERENCIA.match(referencia).group(1)) if referencia else posicion
+                    tipo = celda.get('t', 'n')
+                    if tipo == 'inlineStr':
+                        contenido = celda.find(etiqueta_inline)
+                        texto = _texto(contenido) if contenido is not None else None
+                    else:
+                        v = celda.find(etiqueta_valor)
+                        texto = v.text if v is not None else None
+                    if texto is None:
+                        continue
+                    hay_datos = True
+                    # Las celdas de columnas no elegidas se saltan sin decodificar
+                    if elegidas is None or indice in elegidas:
+                        valores[indice] = convertir(tipo, texto, int(celda.get('s', 0)))
+                fila.clear()
+
+                if seleccionar is not None and elegidas is None:
+                    # Fila de encabezado: fija las columnas que se decodifican
+                    elegidas = {i for i, nombre in valores.items() if seleccionar(nombre)}
+                filas.append(valores)
+                if hay_datos:
+                    ultima_con_datos = len(filas) - 1
+                if valores:
+                    ancho = max(ancho, max(valores) + 1)
+
+    # Como pd.read_excel: sin las filas vacías del final y todas con el mismo ancho
+    columnas = sorted(elegidas) if elegidas is not None else range(ancho)
+    return [[valores.get(i, '') for i in columnas] for valores in filas[:ultima_con_datos + 1]]
+
+
+def leer_excel_columnas(archivo, columnas: Optional[Iterable] = None) -> pd.DataFrame:
+    """
+    Primera hoja del libro con solo las columnas indicadas (por su encabezado, sin
+    espacios extremos). Sin columnas, con todas. Equivale a
+    pd.read_excel(archivo, usecols=...), pero sin decodificar las demás columnas.
+    """
+    posicion = archivo.tell() if hasattr(archivo, 'tell') else None
+    try:
+        seleccionar = None
+        if columnas is not None:
+            elegidas = {str(col).strip() for col in columnas}
+            seleccionar = lambda nombre: str(nombre).strip() in elegidas  # noqa: E731
+        datos = _filas(archivo, seleccionar)
+    finally:
+        if posicion is not None:
+            archivo.seek(posicion)
+
+    if not datos:
+        return pd.DataFrame()
+    return TextParser(datos, header=0, skip_blank_lines=False).read()
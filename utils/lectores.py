@@ -0,0 +1,278 @@
+"""
+Lectura de los archivos de entrada en cualquiera de los formatos admitidos.
+
+El formato se reconoce por la firma de los primeros bytes (zip: .xlsx, 'PAR1':
+Parquet) o, si no la tiene, por la extensión; cualquier otro archivo se trata
+como CSV. Cada formato registra en LECTORES su función de
+encabezado ({'columnas', 'filas'}, ver utils/cabecera_xlsx.py) y su función de
+lectura (archivo, columnas) -> DataFrame, de modo que data_loader no depende
+del formato de origen.
+
+CSV (exportaciones de SICAL y FACe): la codificación y el separador se detectan
+al inicio del archivo y todas las columnas se leen como texto, con pyarrow.csv si
+está instalado y con pd.read_csv si no. Después, una columna pasa a número o a
+fecha solo si todos sus valores tienen ese formato (coma decimal, punto de miles
+y fechas dd/mm/aaaa, ver FORMATO_CSV), igual que las celdas de Excel llegan ya
+tipadas. Parquet se lee con pd.read_parquet, que ya conserva los tipos.
+"""
+
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import FORMATO_CSV
+from utils.cabecera_xlsx import leer_cabecera_xlsx
+from utils.lector_xlsx import leer_excel_columnas
+
+# Firma de los primeros bytes de cada formato
+FIRMAS = {
+    'xlsx': b'PK\x03\x04',
+    'parquet': b'PAR1',
+}
+
+# Formato por extensión para los archivos sin firma reconocible
+EXTENSIONES = {
+    '.xlsx': 'xlsx', '.xlsm': 'xlsx',
+    '.parquet': 'parquet', '.pq': 'parquet',
+    '.csv': 'csv', '.txt': 'csv',
+}
+
+
+def _muestra(archivo, tamano: int = 64 * 1024) -> bytes:
+    """Primeros bytes de una ruta o de un archivo abierto (que queda en su posición)."""
+    if hasattr(archivo, 'read'):
+        posicion = archivo.tell()
+        try:
+            return archivo.read(tamano)
+        finally:
+            archivo.seek(posicion)
+    with open(archivo, 'rb') as f:
+        return f.read(tamano)
+
+
+def detectar_formato(archivo) -> str:
+    """'xlsx', 'parquet' o 'csv', por la firma del archivo o por su extensión."""
+    inicio = _muestra(archivo, 8)
+    for formato, firma in FIRMAS.items():
+        if inicio.startswith(firma):
+            return formato
+    nombre = str(getattr(archivo, 'name', archivo))
+    return EXTENSIONES.get(Path(nombre).suffix.lower(), 'csv')
+
+
+def _elegidas(nombres: Iterable, columnas: Optional[Iterable]) -> Optional[List]:
+    """Nombres del archivo cuyo encabezado (sin espacios extremos) está en columnas."""
+    if columnas is None:
+        return None
+    buscadas = {str(col).strip() for col in columnas}
+    return [nombre for nombre in nombres if str(nombre).strip() in buscadas]
+
+
+# --- Excel -----------------------------------------------------------------------
+
+def _leer_xlsx(archivo, columnas: Optional[List[str]]) -> pd.DataFrame:
+    try:
+        return leer_excel_columnas(archivo, columnas)
+    except (zipfile.BadZipFile, KeyError):
+        # Zip sin la estructura esperada: se deja a pd.read_excel
+        if hasattr(archivo, 'seek'):
+            archivo.seek(0)
+        if columnas is None:
+            return pd.read_excel(archivo)
+        buscadas = {str(col).strip() for col in columnas}
+        return pd.read_excel(archivo, usecols=lambda col: str(col).strip() in buscadas)
+
+
+# --- CSV -------------------------------------------------------------------------
+
+def _dialecto_csv(archivo) -> Tuple[str, str, str]:
+    """(codificación, separador, texto inicial) del archivo CSV."""
+    muestra = _muestra(archivo)
+    for codificacion in FORMATO_CSV['codificaciones']:
+        try:
+            texto = muestra.decode(codificacion)
+        except UnicodeDecodeError as error:
+            # La muestra puede cortar un carácter multibyte al final
+            if error.start < len(muestra) - 3:
+                continue
+            texto = muestra[:error.start].decode(codificacion)
+        break
+    else:
+        codificacion, texto = 'latin-1', muestra.decode('latin-1')
+
+    if texto.startswith('\ufeff'):
+        codificacion, texto = 'utf-8-sig', texto[1:]
+    primera = texto.split('\n', 1)[0]
+    separador = max(FORMATO_CSV['separadores'], key=primera.count)
+    return codificacion, separador, texto
+
+
+def _nombres_unicos(nombres: List[str]) -> List[str]:
+    """Como pd.read_csv: 'Unnamed: i' para encabezados vacíos y '.1', '.2'... para repetidos."""
+    unicos, vistos = [], {}
+    for posicion, nombre in enumerate(nombres):
+        nombre = nombre if nombre.strip() else f'Unnamed: {posicion}'
+        base, repeticion = nombre, vistos.get(nombre, 0)
+        while nombre in vistos:
+            repeticion += 1
+            nombre = f'{base}.{repeticion}'
+        vistos[base] = repeticion
+        vistos[nombre] = 0
+        unicos.append(nombre)
+    return unicos
+
+
+def _cabecera_csv(archivo) -> Dict:
+    _, separador, texto = _dialecto_csv(archivo)
+    nombres = next(csv.reader(io.StringIO(texto), delimiter=separador), [])
+    return {'columnas': _nombres_unicos(nombres), 'filas': None}
+
+
+def _patron_numero() -> re.Pattern:
+    decimal, miles = re.escape(FORMATO_CSV['decimal']), re.escape(FORMATO_CSV['miles'])
+    return re.compile(rf'[+-]?(?:\d{{1,3}}(?:{miles}\d{{3}})+|\d+)(?:{decimal}\d+)?')
+
+
+def _encaja(valor: str, formato: str) -> bool:
+    try:
+        datetime.strptime(valor, formato)
+        return True
+    except ValueError:
+        return False
+
+
+def _tipar_columnas(df: pd.DataFrame) -> pd.DataFrame:
+    """Convierte a número o a fecha las columnas de texto cuyos valores lo son todos."""
+    patron = _patron_numero()
+    for col in df.columns:
+        serie = df[col]
+        texto = serie.dropna().astype(str).str.strip()
+        if texto.empty:
+            # Columna sin valores: como pd.read_excel, numérica y vacía
+            df[col] = np.nan
+            continue
+        # Los códigos con ceros a la izquierda (00123) se mantienen como texto
+        if texto.str.fullmatch(patron).all() and not texto.str.match(r'[+-]?0\d').any():
+            numero = texto.str.replace(FORMATO_CSV['miles'], '', regex=False)
+            numero = numero.str.replace(FORMATO_CSV['decimal'], '.', regex=False)
+            df[col] = pd.to_numeric(numero).reindex(serie.index)
+            continue
+        if texto.str.match(r'\d{1,4}[/-]\d{1,2}[/-]\d{1,4}').all():
+            # Primero el formato del primer valor; cada formato solo se prueba con los
+            # valores que no encajaron en los anteriores
+            formatos = sorted(FORMATO_CSV['formatos_fecha'], key=lambda formato: not _encaja(texto.iloc[0], formato))
+            partes, pendientes = [], texto
+            for formato in formatos:
+                convertidas = pd.to_datetime(pendientes, format=formato, errors='coerce')
+                partes.append(convertidas.dropna())
+                pendientes = pendientes[convertidas.isna()]
+                if pendientes.empty:
+                    df[col] = pd.concat(partes).reindex(serie.index)
+                    break
+            if pendientes.empty:
+                continue
+        if serie.dtype == object:
+            # Solo los valores presentes: astype(str) convertiría None/NaN en 'None'/'nan'
+            df[col] = serie.where(serie.isna(), serie.astype(str))
+    return df
+
+
+def _leer_csv(archivo, columnas: Optional[List[str]]) -> pd.DataFrame:
+    codificacion, separador, texto = _dialecto_csv(archivo)
+    nombres = _nombres_unicos(next(csv.reader(io.StringIO(texto), delimiter=separador), []))
+    incluidas = _elegidas(nombres, columnas)
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        df = pd.read_csv(archivo, sep=separador, encoding=codificacion, header=0, names=nombres,
+                         usecols=incluidas, dtype=str, keep_default_na=False, na_values=[''])
+    else:
+        tabla = pa_csv.read_csv(
+            archivo,
+            read_options=pa_csv.ReadOptions(encoding=codificacion, column_names=nombres, skip_rows=1),
+            parse_options=pa_csv.ParseOptions(delimiter=separador, newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=nombres if incluidas is None else incluidas,
+                column_types={nombre: pa.string() for nombre in nombres},
+                strings_can_be_null=True, quoted_strings_can_be_null=True, null_values=[''],
+            ),
+        )
+        df = tabla.to_pandas()
+    return _tipar_columnas(df)
+
+
+# --- Parquet ---------------------------------------------------------------------
+
+def _cabecera_parquet(archivo) -> Dict:
+    try:
+        from pyarrow import parquet as pq
+    except ImportError:
+        return {'columnas': list(pd.read_parquet(archivo).columns), 'filas': None}
+    parquet = pq.ParquetFile(archivo)
+    # Sin las columnas con el índice que guarda pandas
+    nombres = [nombre for nombre in parquet.schema_arrow.names if not nombre.startswith('__index_level_')]
+    return {'columnas': nombres, 'filas': parquet.metadata.num_rows}
+
+
+def _leer_parquet(archivo, columnas: Optional[List[str]]) -> pd.DataFrame:
+    if columnas is not None:
+        columnas = _elegidas(_cabecera_parquet(archivo)['columnas'], columnas)
+        if hasattr(archivo, 'seek'):
+            archivo.seek(0)
+    # Índice por posición, como el de una hoja de Excel
+    return pd.read_parquet(archivo, columns=columnas).reset_index(drop=True)
+
+
+# formato -> {'cabecera': archivo -> {'columnas', 'filas'}, 'leer': (archivo, columnas) -> DataFrame}
+LECTORES: Dict[str, Dict[str, Callable]] = {
+    'xlsx': {'cabecera': leer_cabecera_xlsx, 'leer': _leer_xlsx},
+    'csv': {'cabecera': _cabecera_csv, 'leer': _leer_csv},
+    'parquet': {'cabecera': _cabecera_parquet, 'leer': _leer_parquet},
+}
+
+
+def registrar_lector(formato: str, cabecera: Callable, leer: Callable,
+                     extensiones: Iterable[str] = (), firma: bytes = None) -> None:
+    """Añade (o sustituye) el lector de un formato, reconocido por su extensión o su firma."""
+    LECTORES[formato] = {'cabecera': cabecera, 'leer': leer}
+    for extension in extensiones:
+        EXTENSIONES[extension.lower()] = formato
+    if firma:
+        FIRMAS[formato] = firma
+
+
+def leer_cabecera(archivo) -> Optional[Dict]:
+    """
+    Encabezados y número de filas de datos declarado ({'columnas', 'filas'}) de
+    cualquier formato admitido, o None si no se pueden leer. El archivo abierto
+    queda en la posición en que estaba.
+    """
+    posicion = archivo.tell() if hasattr(archivo, 'tell') else None
+    try:
+        return LECTORES[detectar_formato(archivo)]['cabecera'](archivo)
+    except Exception:
+        return None
+    finally:
+        if posicion is not None:
+            archivo.seek(posicion)
+
+
+def leer_tabla(archivo, columnas: Optional[Iterable] = None) -> pd.DataFrame:
+    """
+    Tabla del archivo con solo las columnas indicadas (por su encabezado, sin
+    espacios extremos), o con todas si es None, sea cual sea su formato.
+    """
+    posicion = archivo.tell() if hasattr(archivo, 'tell') else None
+    try:
+        return LECTORES[detectar_formato(archivo)]['leer'](archivo, None if columnas is None else list(columnas))
+    finally:
+        if posicion is not None:
+            archivo.seek(posicion)
@@ -0,0 +1,280 @@
+"""
+Auditoría en lote por entidad.
+
+El RCF mezcla varias entidades (Diputación, organismos autónomos, consorcios). Aquí
+el conjunto de datos cargado se reparte por la columna 'entidad' del RCF y se
+calcula el juego completo de análisis y los informes de cada entidad, más uno
+consolidado con todas, en un pool de procesos.
+
+Reparto de las tablas sin columna 'entidad' (FACe, anulaciones, estados): cada
+registro FACe pertenece a la entidad de su factura en el RCF o, si no llegó a
+anotarse, a la de su órgano contable (oc) cuando este corresponde a una sola
+entidad. Los registros que no pueden asignarse solo cuentan en el consolidado.
+
+Las tablas se publican una sola vez en memoria compartida en formato Arrow IPC
+(si pyarrow está disponible): cada proceso abre los bloques sin copiarlos y solo
+materializa en pandas las filas de la entidad que procesa. Las tablas que Arrow no
+puede representar (columnas object con tipos mezclados) se entregan al pool en su
+inicialización, como en utils.informe_pipeline.
+"""
+
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import CONFIGURACION
+from utils.analisis import precalcular_analisis_faltantes
+from utils.ciclo_vida import ejercicio_auditado
+from utils.data_loader import exportar_resultados_excel
+from utils.informe_pipeline import numero_procesos
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+CONSOLIDADO = 'CONSOLIDADO'
+
+# Valores no tabulares de datos que se entregan tal cual a cada entidad
+CLAVES_COMPARTIDAS = ('ids_face_en_rcf_total',)
+
+NOMBRES_INFORME = {
+    'word': 'Informe_Auditoria_RCF_{entidad}_{sufijo}.docx',
+    'pdf': 'Informe_Auditoria_RCF_Ejecutivo_{entidad}_{sufijo}.pdf',
+    'excel': 'Resultados_Auditoria_RCF_{entidad}_{sufijo}.xlsx',
+}
+
+# Estado de cada proceso del pool: tablas Arrow abiertas y tablas pandas recibidas
+_COMPARTIDO: Dict[str, Any] = {}
+
+
+def entidades_por_registro(datos: Dict) -> pd.Series:
+    """
+    Entidad de cada registro FACe (índice: registro como texto): la de su factura en
+    el RCF o, si no está en el RCF, la de su órgano contable cuando es de una sola entidad.
+    """
+    rcf = datos['rcf']
+    id_face = rcf['ID_FACE'].astype(str).str.strip()
+    con_face = id_face.ne('') & rcf['ID_FACE'].notna() & rcf['entidad'].notna()
+    por_registro = pd.Series(rcf.loc[con_face, 'entidad'].to_numpy(), index=id_face[con_face].to_numpy())
+    por_registro = por_registro[~por_registro.index.duplicated()]
+
+    face = datos.get('face')
+    if face is None or 'oc' not in face.columns or 'codigo_oc' not in rcf.columns:
+        return por_registro
+
+    entidades_oc = rcf.dropna(subset=['codigo_oc', 'entidad']).groupby('codigo_oc')['entidad']
+    oc_unica = entidades_oc.first()[entidades_oc.nunique() == 1]
+    por_oc = pd.Series(face['oc'].map(oc_unica).to_numpy(), index=face['registro'].astype(str).to_numpy()).dropna()
+    por_oc = por_oc[~por_oc.index.duplicated()]
+    return por_registro.combine_first(por_oc)
+
+
+def particionar_por_entidad(datos: Dict) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Posiciones de fila de cada tabla de datos por entidad:
+    {entidad: {tabla: array de posiciones}}, ordenado por número de facturas RCF.
+    """
+    mapa = None
+    etiquetas = {}
+    for clave, df in datos.items():
+        if not isinstance(df, pd.DataFrame):
+            continue
+        if 'entidad' in df.columns:
+            etiquetas[clave] = df['entidad'].to_numpy()
+        elif 'registro' in df.columns:
+            if mapa is None:
+                mapa = entidades_por_registro(datos)
+            etiquetas[clave] = df['registro'].astype(str).map(mapa).to_numpy()
+        else:
+            etiquetas[clave] = np.full(len(df), np.nan, dtype=object)
+
+    particiones: Dict[str, Dict[str, np.ndarray]] = {}
+    for clave, valores in etiquetas.items():
+        grupos = pd.Series(np.arange(len(valores))).groupby(valores, dropna=True).indices
+        for entidad, posiciones in grupos.items():
+            particiones.setdefault(str(entidad), {})[clave] = posiciones
+
+    vacio = np.array([], dtype=np.intp)
+    for entidad in particiones:
+        for clave in etiquetas:
+            particiones[entidad].setdefault(clave, vacio)
+    return dict(sorted(particiones.items(), key=lambda x: -len(x[1].get('rcf', vacio))))
+
+
+def _publicar_tablas(datos: Dict):
+    """
+    Copia cada tabla a un bloque de memoria compartida en formato Arrow IPC.
+    Devuelve ({tabla: (nombre_bloque, tamaño)}, {tabla: DataFrame no publicable}, bloques).
+    """
+    publicadas, locales, bloques = {}, {}, []
+    for clave, df in datos.items():
+        if not isinstance(df, pd.DataFrame):
+            continue
+        if pa is None:
+            locales[clave] = df
+            continue
+        try:
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            locales[clave] = df
+            continue
+        bloque, tamano = _escribir_en_bloque(tabla)
+        bloques.append(bloque)
+        publicadas[clave] = (bloque.name, tamano)
+    return publicadas, locales, bloques
+
+
+def _escribir_en_bloque(tabla):
+    """Serializa la tabla (Arrow IPC) directamente en un bloque compartido de su tamaño exacto."""
+    medida = pa.MockOutputStream()
+    with pa.ipc.new_file(medida, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    tamano = medida.size()
+    bloque = shared_memory.SharedMemory(create=True, size=max(tamano, 1))
+    with pa.ipc.new_file(pa.FixedSizeBufferWriter(pa.py_buffer(bloque.buf)), tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    return bloque, tamano
+
+
+def _inicializar_proceso(publicadas: Dict, locales: Dict, compartidos: Dict) -> None:
+    _COMPARTIDO.update(publicadas=publicadas, locales=locales, compartidos=compartidos, bloques={}, arrow={})
+
+
+def _tabla_arrow(clave: str):
+    """Tabla Arrow de un bloque compartido, abierta sin copia una vez por proceso."""
+    if clave not in _COMPARTIDO['arrow']:
+        nombre, tamano = _COMPARTIDO['publicadas'][clave]
+        bloque = shared_memory.SharedMemory(name=nombre)
+        _COMPARTIDO['bloques'][clave] = bloque
+        lector = pa.ipc.open_file(pa.py_buffer(bloque.buf[:tamano]))
+        _COMPARTIDO['arrow'][clave] = lector.read_all()
+    return _COMPARTIDO['arrow'][clave]
+
+
+def _datos_particion(posiciones: Optional[Dict[str, np.ndarray]]) -> Dict:
+    """Diccionario de datos de una entidad (o completo si posiciones es None)."""
+    datos = dict(_COMPARTIDO['compartidos'])
+    for clave in _COMPARTIDO['publicadas']:
+        tabla = _tabla_arrow(clave)
+        if posiciones is not None:
+            tabla = tabla.take(pa.array(posiciones[clave], type=pa.int64()))
+        datos[clave] = tabla.to_pandas()
+    for clave, df in _COMPARTIDO['locales'].items():
+        df = df if posiciones is None else df.iloc[posiciones[clave]]
+        datos[clave] = df.reset_index(drop=True)
+    return datos
+
+
+def _nombre_archivo(entidad: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', entidad).strip('_') or 'SIN_NOMBRE'
+
+
+def _auditar_entidad(entidad: str, posiciones: Optional[Dict[str, np.ndarray]], opciones: Dict) -> Dict:
+    """Tarea del pool: análisis completo e informes de una entidad."""
+    inicio = time.perf_counter()
+    datos = _datos_particion(posiciones)
+    nombre_entidad = opciones['nombre_entidad']
+    if entidad != CONSOLIDADO:
+        nombre_entidad = f'{nombre_entidad} - {entidad}'
+    analisis = precalcular_analisis_faltantes(datos, {}, opciones['fecha_corte'], opciones['ejercicio'])
+    archivos = []
+    directorio = Path(opciones['directorio'])
+    nombre = _nombre_archivo(entidad)
+    informes = tuple(f for f in opciones['formatos'] if f in ('word', 'pdf'))
+    if informes:
+        from utils.report_generator import generar_informes
+
+        # Sin pool anidado: el paralelismo está en las entidades
+        resultado = generar_informes(datos, analisis, informes, opciones['incluir_anexos'], procesos=1,
+                                     ejercicio=opciones['ejercicio'], nombre_entidad=nombre_entidad)
+        for formato in informes:
+            ruta = directorio / NOMBRES_INFORME[formato].format(entidad=nombre, sufijo=opciones['sufijo'])
+            ruta.write_bytes(resultado[formato])
+            archivos.append(str(ruta))
+    if 'excel' in opciones['formatos']:
+        ruta = directorio / NOMBRES_INFORME['excel'].format(entidad=nombre, sufijo=opciones['sufijo'])
+        exportar_resultados_excel(analisis, ruta)
+        archivos.append(str(ruta))
+
+    return {
+        'Entidad': entidad,
+        'Facturas RCF': len(datos['rcf']),
+        'Facturas FACe': len(datos.get('face', ())),
+        'Tiempo (s)': time.perf_counter() - inicio,
+        'Archivos': archivos,
+    }
+
+
+def auditar_entidades(datos: Dict, directorio, formatos=('word', 'pdf'), incluir_anexos: bool = False,
+                      fecha_corte=None, procesos: int = None, entidades: List[str] = None,
+                      consolidado: bool = True, ejercicio=None) -> pd.DataFrame:
+    """
+    Audita cada entidad (todas o las indicadas) y, si consolidado, el conjunto
+    completo, escribiendo sus informes del ejercicio (por defecto, el de
+    CONFIGURACION) en directorio. Devuelve una fila por
+    entidad con Facturas RCF, Facturas FACe, Tiempo (s) y Archivos.
+    """
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+
+    particiones = particionar_por_entidad(datos)
+    if entidades is not None:
+        particiones = {e: p for e, p in particiones.items() if e in entidades}
+    tareas = list(particiones.items())
+    if consolidado:
+        # El consolidado es la tarea más costosa: se lanza la primera
+        tareas.insert(0, (CONSOLIDADO, None))
+
+    opciones = {
+        'directorio': str(directorio),
+        'formatos': tuple(formatos),
+        'incluir_anexos': incluir_anexos,
+        'fecha_corte': fecha_corte,
+        'ejercicio': ejercicio_auditado(ejercicio),
+        'nombre_entidad': CONFIGURACION['nombre_entidad'],
+        'sufijo': f"{ejercicio_auditado(ejercicio)}_{datetime.now().strftime('%Y%m%d')}",
+    }
+    compartidos = {clave: datos[clave] for clave in CLAVES_COMPARTIDAS if clave in datos}
+    procesos = min(numero_procesos(procesos, 'procesos_lote'), max(len(tareas), 1))
+
+    publicadas, locales, bloques = _publicar_tablas(datos)
+    filas = []
+    try:
+        if procesos <= 1:
+            _inicializar_proceso(publicadas, locales, compartidos)
+            try:
+                filas = [_auditar_entidad(entidad, posiciones, opciones) for entidad, posiciones in tareas]
+            finally:
+                _cerrar_proceso()
+        else:
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso,
+                                     initargs=(publicadas, locales, compartidos)) as pool:
+                futuros = [pool.submit(_auditar_entidad, entidad, posiciones, opciones)
+                           for entidad, posiciones in tareas]
+                filas = [futuro.result() for futuro in futuros]
+    finally:
+        for bloque in bloques:
+            bloque.close()
+            bloque.unlink()
+
+    return pd.DataFrame(filas, columns=['Entidad', 'Facturas RCF', 'Facturas FACe', 'Tiempo (s)', 'Archivos'])
+
+
+def _cerrar_proceso() -> None:
+    """Libera las tablas Arrow antes de cerrar los bloques compartidos que las respaldan."""
+    _COMPARTIDO.get('arrow', {}).clear()
+    for bloque in _COMPARTIDO.get('bloques', {}).values():
+        try:
+            bloque.close()
+        except BufferError:
+            # Algún DataFrame aún comparte memoria con el bloque: se libera con él
+            pass
+    _COMPARTIDO.clear()
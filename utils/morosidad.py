@@ -0,0 +1,143 @@
+"""
+Análisis de morosidad: plazos de pago por factura y periodo medio de pago (PMP).
+
+Las fechas de pago y de conformidad se obtienen del histórico de cambios de estado
+(2500 Pagada y 2300 Conformada) y, en su defecto, de las columnas del propio RCF,
+lo que cubre también las facturas en papel. El plazo se cuenta desde la conformidad
+(Ley 15/2010) o, si no consta, desde la anotación en el RCF.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict
+
+from config.settings import CONFIGURACION
+from utils.ciclo_vida import primera_fecha_estado, columna_fecha_anotacion
+
+CODIGO_ESTADO_CONFORMADA = 2300
+CODIGO_ESTADO_PAGADA = 2500
+
+# Niveles del desglose y nombre de columna con el que se presentan
+_NIVELES_DESGLOSE = {'entidad': 'Entidad', 'codigo_oc': 'Código OC', 'mes_pago': 'Mes Pago'}
+
+
+def _fecha_desde_estados(df_rcf: pd.DataFrame, df_estados: pd.DataFrame, codigo: int) -> pd.Series:
+    """Primera fecha del código indicado para cada factura del RCF (vía ID_FACE)."""
+    if df_estados is None or 'ID_FACE' not in df_rcf.columns:
+        return pd.Series(pd.NaT, index=df_rcf.index, dtype='datetime64[ns]')
+    fechas = primera_fecha_estado(df_estados, [codigo])
+    return df_rcf['ID_FACE'].astype(str).map(fechas).astype('datetime64[ns]')
+
+
+def calcular_dias_pago(df_rcf: pd.DataFrame, df_estados: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Calcula el plazo de pago de cada factura pagada.
+
+    Devuelve un DataFrame (mismo índice que df_rcf, solo facturas con plazo válido)
+    con las columnas fecha_inicio_computo, fecha_pago_efectiva, dias_pago,
+    dias_exceso (días por encima del plazo legal) y con_retraso. Los plazos
+    negativos se consideran errores de datos en origen y se descartan.
+    """
+    plazo_legal = int(CONFIGURACION.get('plazo_legal_pago_dias', 30))
+
+    fecha_pago = _fecha_desde_estados(df_rcf, df_estados, CODIGO_ESTADO_PAGADA)
+    if 'fecha_pago' in df_rcf.columns:
+        fecha_pago = fecha_pago.fillna(df_rcf['fecha_pago'].astype('datetime64[ns]'))
+
+    fecha_inicio = _fecha_desde_estados(df_rcf, df_estados, CODIGO_ESTADO_CONFORMADA)
+    if 'fecha_conformidad' in df_rcf.columns:
+        fecha_inicio = fecha_inicio.fillna(df_rcf['fecha_conformidad'].astype('datetime64[ns]'))
+    col_anotacion = columna_fecha_anotacion(df_rcf)
+    if col_anotacion:
+        fecha_inicio = fecha_inicio.fillna(df_rcf[col_anotacion].astype('datetime64[ns]'))
+
+    dias = (fecha_pago.dt.normalize() - fecha_inicio.dt.normalize()).dt.days
+    validas = dias.notna() & (dias >= 0)
+
+    df = pd.DataFrame({
+        'fecha_inicio_computo': fecha_inicio[validas],
+        'fecha_pago_efectiva': fecha_pago[validas],
+        'dias_pago': dias[validas].astype(int),
+    })
+    df['dias_exceso'] = (df['dias_pago'] - plazo_legal).clip(lower=0)
+    df['con_retraso'] = df['dias_pago'] > plazo_legal
+    return df
+
+
+def _resumir(agregado: pd.DataFrame) -> pd.DataFrame:
+    """Añade PMP y porcentajes a una tabla de sumas parciales."""
+    importe = agregado['importe'].replace(0, np.nan)
+    return pd.DataFrame({
+        'Nº Facturas': agregado['n'].astype(int),
+        'Importe Pagado': agregado['importe'].round(2),
+        'PMP (días)': (agregado['dias_importe'] / importe).fillna(agregado['dias'] / agregado['n']).round(1),
+        'Con Retraso': agregado['n_retraso'].astype(int),
+        '% Retraso': (agregado['n_retraso'] / agregado['n'] * 100).round(1),
+        'Importe con Retraso': agregado['importe_retraso'].round(2),
+        'Plazo Máximo': agregado['dias_max'].astype(int),
+    }, index=agregado.index)
+
+
+def calcular_morosidad(df_rcf: pd.DataFrame, df_estados: pd.DataFrame = None) -> Dict:
+    """
+    Calcula los indicadores de morosidad del RCF.
+
+    El PMP se pondera por importe: suma(días de pago × importe) / suma(importe).
+    Los desgloses por entidad, oficina contable y mes de pago se obtienen de una
+    única agregación por (entidad, codigo_oc, mes_pago), consolidada después por nivel.
+    """
+    plazos = calcular_dias_pago(df_rcf, df_estados)
+    if plazos.empty:
+        return {}
+
+    df = df_rcf.loc[plazos.index, [c for c in ['entidad', 'codigo_oc'] if c in df_rcf.columns]].copy()
+    for col in ['entidad', 'codigo_oc']:
+        if col not in df.columns:
+            df[col] = 'N/D'
+        df[col] = df[col].fillna('N/D').astype(str).replace({'': 'N/D', 'nan': 'N/D'})
+    df['mes_pago'] = plazos['fecha_pago_efectiva'].dt.strftime('%Y-%m')
+
+    importe = (
+        pd.to_numeric(df_rcf.loc[plazos.index, 'importe_total'], errors='coerce').fillna(0)
+        if 'importe_total' in df_rcf.columns else pd.Series(0.0, index=plazos.index)
+    )
+    retraso = plazos['con_retraso']
+    df['n'] = 1
+    df['importe'] = importe
+    df['dias'] = plazos['dias_pago']
+    df['dias_importe'] = plazos['dias_pago'] * importe
+    df['n_retraso'] = retraso.astype(int)
+    df['importe_retraso'] = importe.where(retraso, 0.0)
+    df['dias_max'] = plazos['dias_pago']
+
+    sumas = ['n', 'importe', 'dias', 'dias_importe', 'n_retraso', 'importe_retraso']
+    agregado = df.groupby(list(_NIVELES_DESGLOSE), sort=False).agg(
+        {**{c: 'sum' for c in sumas}, 'dias_max': 'max'}
+    )
+
+    desgloses = {}
+    for nivel, etiqueta in _NIVELES_DESGLOSE.items():
+        parcial = agregado.groupby(level=nivel).agg({**{c: 'sum' for c in sumas}, 'dias_max': 'max'})
+        tabla = _resumir(parcial).rename_axis(etiqueta).reset_index()
+        orden = etiqueta if nivel == 'mes_pago' else 'Importe Pagado'
+        desgloses[nivel] = tabla.sort_values(orden, ascending=(nivel == 'mes_pago')).reset_index(drop=True)
+
+    total = agregado[sumas].sum()
+    dias_retraso = plazos.loc[retraso, 'dias_pago']
+
+    return {
+        'total_pagadas': int(total['n']),
+        'importe_pagado': round(float(total['importe']), 2),
+        'pmp': round(float(total['dias_importe'] / total['importe'] if total['importe'] else plazos['dias_pago'].mean()), 1),
+        'dias_pago_medio': float(plazos['dias_pago'].mean()),
+        'total_con_retraso': int(total['n_retraso']),
+        'porcentaje_con_retraso': float(total['n_retraso'] / total['n'] * 100),
+        'importe_con_retraso': round(float(total['importe_retraso']), 2),
+        'dias_retraso_medio': float(dias_retraso.mean()) if len(dias_retraso) > 0 else 0,
+        'dias_retraso_max': int(dias_retraso.max()) if len(dias_retraso) > 0 else 0,
+        'dias_exceso_medio': float(plazos.loc[retraso, 'dias_exceso'].mean()) if len(dias_retraso) > 0 else 0,
+        'plazos': plazos,
+        'por_entidad': desgloses['entidad'],
+        'por_oc': desgloses['codigo_oc'],
+        'por_mes': desgloses['mes_pago'],
+    }
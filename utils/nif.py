@@ -0,0 +1,169 @@
+"""
+Clasificación y validación vectorizada de identificadores fiscales (NIF/CIF/NIE).
+
+Trabaja sobre la columna completa: la estructura se reconoce con expresiones
+regulares del accesor .str y los dígitos de control se calculan con NumPy sobre
+una matriz de bytes (una fila de 9 caracteres por identificador), sin recorrer
+las filas en Python.
+
+Tipos (categoría 'tipo_nif'):
+  - CIF: personas jurídicas y entidades sin personalidad (A-H, J, N, P-S, U-W)
+  - DNI: personas físicas españolas (8 dígitos + letra)
+  - NIE: extranjeros residentes (X, Y, Z)
+  - NIF_ESPECIAL: personas físicas sin DNI/NIE (K, L, M)
+  - EXTRANJERO: NIF-IVA de otro país (prefijo de país distinto de ES)
+  - OTRO: cualquier otro valor no vacío
+  - VACIO: sin identificador
+"""
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+TIPOS_NIF = ['CIF', 'DNI', 'NIE', 'NIF_ESPECIAL', 'EXTRANJERO', 'OTRO', 'VACIO']
+
+# Estructura de cada tipo (valores ya limpios: mayúsculas, sin separadores ni prefijo ES)
+PATRONES_NIF = {
+    'CIF': r'[ABCDEFGHJNPQRSUVW]\d{7}[0-9A-J]',
+    'DNI': r'\d{8}[A-Z]',
+    'NIE': r'[XYZ]\d{7}[A-Z]',
+    'NIF_ESPECIAL': r'[KLM]\d{7}[A-Z]',
+}
+
+# Prefijos de NIF-IVA de la UE (EL = Grecia, XI = Irlanda del Norte) y otros habituales
+PREFIJOS_IVA = (
+    'AT', 'BE', 'BG', 'CY', 'CZ', 'DE', 'DK', 'EE', 'EL', 'FI', 'FR', 'HR', 'HU', 'IE',
+    'IT', 'LT', 'LU', 'LV', 'MT', 'NL', 'PL', 'PT', 'RO', 'SE', 'SI', 'SK', 'XI',
+    'GB', 'CH', 'NO',
+)
+
+LETRAS_DNI = np.frombuffer(b'TRWAGMYFPDXBNJZSQVHLCKE', dtype=np.uint8)
+LETRAS_CIF = np.frombuffer(b'JABCDEFGHI', dtype=np.uint8)
+
+# Control del CIF: letra obligatoria (P, Q, R, S, N, W), dígito obligatorio (A, B, E, H)
+CIF_CONTROL_LETRA = b'PQRSNW'
+CIF_CONTROL_DIGITO = b'ABEH'
+
+
+def limpiar_nif(serie: pd.Series) -> pd.Series:
+    """Mayúsculas, sin espacios, puntos ni guiones, y sin el prefijo ES de los NIF-IVA españoles."""
+    limpio = serie.astype('string').str.upper().str.replace(r'[\s.\-/]', '', regex=True)
+    return limpio.mask(limpio.str.fullmatch(r'ES[0-9A-Z]\d{7}[0-9A-Z]', na=False), limpio.str.slice(2))
+
+
+def _matriz_bytes(valores: pd.Series) -> np.ndarray:
+    """Matriz (n, 9) de bytes ASCII de identificadores de exactamente 9 caracteres."""
+    if valores.empty:
+        return np.empty((0, 9), dtype=np.uint8)
+    return np.frombuffer(''.join(valores.tolist()).encode('ascii'), dtype=np.uint8).reshape(-1, 9)
+
+
+def _numero(digitos: np.ndarray) -> np.ndarray:
+    """Valor entero de cada fila de una matriz de dígitos."""
+    pesos = 10 ** np.arange(digitos.shape[1] - 1, -1, -1, dtype=np.int64)
+    return digitos.astype(np.int64) @ pesos
+
+
+def _control_dni(matriz: np.ndarray, prefijo: np.ndarray) -> np.ndarray:
+    """Letra de control correcta de DNI/NIE/NIF especial (prefijo: valor de la 1ª posición)."""
+    numero = prefijo * 10_000_000 + _numero(matriz[:, 1:8] - 48)
+    return LETRAS_DNI[numero % 23] == matriz[:, 8]
+
+
+def _prefijo(matriz: np.ndarray, tipo: str) -> np.ndarray:
+    """Valor numérico de la primera posición: el dígito del DNI, X=0/Y=1/Z=2 en el NIE, 0 en K/L/M."""
+    inicial = matriz[:, 0].astype(np.int64)
+    if tipo == 'DNI':
+        return inicial - ord('0')
+    if tipo == 'NIE':
+        return inicial - ord('X')
+    return np.zeros(len(matriz), dtype=np.int64)
+
+
+def _control_cif(matriz: np.ndarray) -> np.ndarray:
+    """Dígito o letra de control correcto del CIF."""
+    digitos = (matriz[:, 1:8] - 48).astype(np.int64)
+    pares = digitos[:, 1::2].sum(axis=1)
+    dobles = digitos[:, 0::2] * 2
+    impares = (dobles // 10 + dobles % 10).sum(axis=1)
+    control = (10 - (pares + impares) % 10) % 10
+
+    final = matriz[:, 8]
+    es_digito = final == (control + 48)
+    es_letra = final == LETRAS_CIF[control]
+    inicial = matriz[:, 0]
+    return np.where(np.isin(inicial, np.frombuffer(CIF_CONTROL_LETRA, dtype=np.uint8)), es_letra,
+                    np.where(np.isin(inicial, np.frombuffer(CIF_CONTROL_DIGITO, dtype=np.uint8)), es_digito,
+                             es_digito | es_letra))
+
+
+def analizar_nif(serie: pd.Series) -> pd.DataFrame:
+    """
+    Tipo ('tipo_nif', categórico) y validez del dígito de control ('nif_valido') de
+    cada identificador. Los NIF-IVA extranjeros y los valores sin estructura
+    reconocible se marcan como no válidos; los vacíos, como nulos.
+    """
+    limpio = limpiar_nif(serie)
+    tipo = pd.Series('OTRO', index=serie.index, dtype=object)
+    valido = pd.Series(False, index=serie.index, dtype='boolean')
+
+    vacio = limpio.isna() | (limpio == '') | limpio.isin(['NAN', 'NONE'])
+    tipo[vacio.to_numpy()] = 'VACIO'
+    valido[vacio.to_numpy()] = pd.NA
+
+    extranjero = ~vacio & limpio.str.slice(0, 2).isin(PREFIJOS_IVA) & limpio.str.fullmatch(r'[A-Z]{2}[0-9A-Z+*]{2,13}', na=False)
+
+    for nombre, patron in PATRONES_NIF.items():
+        mascara = (~vacio & limpio.str.fullmatch(patron, na=False)).to_numpy()
+        if not mascara.any():
+            continue
+        tipo[mascara] = nombre
+        matriz = _matriz_bytes(limpio[mascara])
+        valido[mascara] = _control_cif(matriz) if nombre == 'CIF' else _control_dni(matriz, _prefijo(matriz, nombre))
+
+    # Solo lo que no encaja en ningún patrón español puede ser un NIF-IVA extranjero
+    tipo[(extranjero & (tipo == 'OTRO')).to_numpy()] = 'EXTRANJERO'
+
+    return pd.DataFrame({
+        'tipo_nif': pd.Categorical(tipo, categories=TIPOS_NIF),
+        'nif_valido': valido,
+    }, index=serie.index)
+
+
+def clasificar_nif(serie: pd.Series) -> pd.Series:
+    """Tipo de cada identificador como serie categórica (categorías TIPOS_NIF)."""
+    return analizar_nif(serie)['tipo_nif']
+
+
+def agregar_tipo_nif(df: pd.DataFrame, columna: str = 'nif_emisor') -> pd.DataFrame:
+    """Añade 'tipo_nif' y 'nif_valido' a partir de la columna de NIF (si existe)."""
+    if columna in df.columns:
+        analisis = analizar_nif(df[columna])
+        df['tipo_nif'] = analisis['tipo_nif']
+        df['nif_valido'] = analisis['nif_valido']
+    return df
+
+
+def mascara_persona_juridica(df: pd.DataFrame, columna: str = 'nif_emisor') -> pd.Series:
+    """
+    Filas cuyo emisor es persona jurídica española (CIF), usando la columna
+    'tipo_nif' calculada al cargar o, si falta, clasificando la columna de NIF.
+    """
+    if 'tipo_nif' in df.columns:
+        tipo = df['tipo_nif']
+    elif columna in df.columns:
+        tipo = clasificar_nif(df[columna])
+    else:
+        return pd.Series(False, index=df.index)
+    return (tipo == 'CIF').fillna(False).astype(bool)
+
+
+def resumen_nif(df: pd.DataFrame) -> Dict[str, int]:
+    """Número de identificadores por tipo y número de identificadores españoles con control erróneo."""
+    if 'tipo_nif' not in df.columns:
+        return {}
+    resumen = {tipo: int(n) for tipo, n in df['tipo_nif'].value_counts().items()}
+    erroneo = ~df['nif_valido'].fillna(True).astype(bool) & df['tipo_nif'].isin(list(PATRONES_NIF))
+    resumen['control_erroneo'] = int(erroneo.sum())
+    return resumen
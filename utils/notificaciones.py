@@ -0,0 +1,35 @@
+"""
+Avisos y progreso de los cálculos, independientes de la interfaz.
+
+Los módulos de cálculo informan con notificar(nivel, mensaje), con nivel 'progreso',
+'info', 'warning' o 'error'. Por defecto los avisos se escriben en stderr (CLI,
+scripts de diagnóstico); la aplicación registra su receptor con
+configurar_notificador (ver utils/streamlit_adaptadores.py).
+"""
+
+import sys
+from typing import Callable
+
+Notificador = Callable[[str, str], None]
+
+NIVELES = ('progreso', 'info', 'warning', 'error')
+
+
+def notificar_stderr(nivel: str, mensaje: str) -> None:
+    """Receptor por defecto: una línea por aviso en stderr."""
+    prefijo = '' if nivel in ('progreso', 'info') else f'{nivel.upper()}: '
+    print(f'{prefijo}{mensaje}', file=sys.stderr)
+
+
+_NOTIFICADOR: Notificador = notificar_stderr
+
+
+def configurar_notificador(notificador: Notificador = None) -> None:
+    """Registra el receptor de los avisos (None: el de stderr)."""
+    global _NOTIFICADOR
+    _NOTIFICADOR = notificador or notificar_stderr
+
+
+def notificar(nivel: str, mensaje: str) -> None:
+    """Envía un aviso al receptor registrado."""
+    _NOTIFICADOR(nivel, mensaje)
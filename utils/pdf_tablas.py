@@ -0,0 +1,100 @@
+"""
+Tablas de DataFrames para el informe PDF (reportlab).
+
+Una Table con anchos automáticos obliga a reportlab a medir cada celda y, si no
+cabe en la página, a partirla repetidamente, con un coste que crece mucho más que
+el número de filas. Aquí los anchos de columna se calculan de antemano a partir de
+la longitud máxima del texto de cada columna (vectorizado con pandas), el texto se
+recorta a lo que cabe en cada columna y la tabla se divide en bloques de una página,
+cada uno como LongTable con cabecera y alto de fila fijos. Así el coste es lineal
+en el número de filas.
+"""
+
+from typing import List, Optional
+
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.platypus import LongTable, TableStyle, Flowable
+
+from utils.docx_tablas import formatear_columna, longitud_maxima, calcular_anchos, TRUNCAR_TEXTO
+
+TAMANO_FUENTE_TABLA = 6.5
+FONDO_CABECERA_PDF = '#0066CC'
+
+# Alto útil por defecto: A4 con márgenes de 2 cm (como el informe ejecutivo)
+ALTO_UTIL_A4 = A4[1] - 4 * cm
+ANCHO_UTIL_A4 = A4[0] - 4 * cm
+
+# Ancho medio de un carácter respecto al tamaño de fuente (Helvetica)
+_ANCHO_CARACTER = 0.5
+_RELLENO_CELDA = 4
+
+
+def _alto_fila(tamano_fuente: float) -> float:
+    return tamano_fuente * 1.2 + _RELLENO_CELDA
+
+
+def filas_por_pagina(alto_util: float = ALTO_UTIL_A4, tamano_fuente: float = TAMANO_FUENTE_TABLA) -> int:
+    """Filas de datos (además de la cabecera) que caben en una página."""
+    return max(1, int(alto_util // _alto_fila(tamano_fuente)) - 2)
+
+
+def _estilo_tabla(numericas: List[bool], fondo_cabecera: str, tamano_fuente: float) -> TableStyle:
+    comandos = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(fondo_cabecera)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), tamano_fuente),
+        ('LEADING', (0, 0), (-1, -1), tamano_fuente * 1.2),
+        ('TOPPADDING', (0, 0), (-1, -1), _RELLENO_CELDA / 2),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), _RELLENO_CELDA / 2),
+        ('LEFTPADDING', (0, 0), (-1, -1), 2),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 2),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCCCCC')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F5F5F5')]),
+    ]
+    comandos += [('ALIGN', (j, 1), (j, -1), 'RIGHT') for j, numerica in enumerate(numericas) if numerica]
+    return TableStyle(comandos)
+
+
+def tabla_pdf(df: pd.DataFrame, ancho_total: float = ANCHO_UTIL_A4, alto_util: float = ALTO_UTIL_A4,
+              fondo_cabecera: str = FONDO_CABECERA_PDF, tamano_fuente: float = TAMANO_FUENTE_TABLA,
+              truncar: Optional[int] = TRUNCAR_TEXTO) -> List[Flowable]:
+    """
+    Convierte un DataFrame en una lista de LongTable de una página cada una, con la
+    cabecera repetida, anchos de columna precalculados y texto recortado al ancho.
+    """
+    cabecera = [str(c) for c in df.columns]
+    longitudes = [
+        min(longitud_maxima(df.iloc[:, j]), truncar) if truncar else longitud_maxima(df.iloc[:, j])
+        for j in range(df.shape[1])
+    ]
+    anchos = calcular_anchos(cabecera, longitudes, ancho_total)
+    numericas = [
+        pd.api.types.is_numeric_dtype(df.iloc[:, j]) and not pd.api.types.is_bool_dtype(df.iloc[:, j])
+        for j in range(df.shape[1])
+    ]
+    # Caracteres que caben en cada columna con la fuente indicada
+    capacidad = [max(1, int((ancho - 4) / (tamano_fuente * _ANCHO_CARACTER))) for ancho in anchos]
+    cabecera = [titulo[:n] for titulo, n in zip(cabecera, capacidad)]
+
+    estilo = _estilo_tabla(numericas, fondo_cabecera, tamano_fuente)
+    alto_fila = _alto_fila(tamano_fuente)
+    por_pagina = filas_por_pagina(alto_util, tamano_fuente)
+
+    # Formateo vectorizado de cada columna completa; los bloques solo reparten las filas
+    columnas = [
+        formatear_columna(df.iloc[:, j], truncar).astype(str).str.slice(0, capacidad[j]).tolist()
+        for j in range(df.shape[1])
+    ]
+    filas = [list(fila) for fila in zip(*columnas)]
+
+    flowables = []
+    for inicio in range(0, max(len(filas), 1), por_pagina):
+        bloque = [cabecera] + filas[inicio:inicio + por_pagina]
+        tabla = LongTable(bloque, colWidths=anchos, rowHeights=[alto_fila] * len(bloque), repeatRows=1)
+        tabla.setStyle(estilo)
+        flowables.append(tabla)
+    return flowables
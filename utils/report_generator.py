@@ -1,5 +1,9 @@
 """
 Modulo para generacion de informes completos de auditoria RCF
+
+Cada seccion del informe es una funcion independiente (_word_* y _pdf_*) que
+escribe en su propio documento. Las secciones se renderizan en paralelo y se
+ensamblan en orden (ver generar_informes y utils.informe_pipeline).
 """
 
 import pandas as pd
@@ -7,16 +11,24 @@ from docx import Document
 from docx.shared import Inches, Pt, RGBColor, Cm
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_TABLE_ALIGNMENT
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
+from docx.oxml.ns import qn, nsdecls
+from docx.oxml import OxmlElement, parse_xml
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch, cm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, KeepTogether
 from reportlab.lib import colors
 from datetime import datetime
+from functools import partial
 import io
+import time
+from lxml import etree
 from config.settings import CONFIGURACION_INFORME, CONFIGURACION
+from utils.analisis import resumen_por_entidad
+from utils.ciclo_vida import ejercicio_auditado
+from utils.docx_tablas import insertar_tabla, insertar_tabla_filas, reservar_tabla, guardar_con_tablas_diferidas
+from utils.informe_pipeline import ejecutar_secciones
+from utils.pdf_tablas import tabla_pdf
 
 
 def set_cell_shading(cell, color):
@@ -37,33 +49,7 @@ def add_table_to_doc(doc, df, title=None, max_rows=20):
     # Limitar filas si es necesario
     df_display = df.head(max_rows) if len(df) > max_rows else df
 
-    # Crear tabla
-    table = doc.add_table(rows=1, cols=len(df_display.columns))
-    table.style = 'Table Grid'
-    table.alignment = WD_TABLE_ALIGNMENT.CENTER
-
-    # Encabezados
-    header_cells = table.rows[0].cells
-    for i, col in enumerate(df_display.columns):
-        header_cells[i].text = str(col)
-        header_cells[i].paragraphs[0].runs[0].bold = True
-        set_cell_shading(header_cells[i], '0066CC')
-        header_cells[i].paragraphs[0].runs[0].font.color.rgb = RGBColor(255, 255, 255)
-
-    # Datos
-    for _, row in df_display.iterrows():
-        row_cells = table.add_row().cells
-        for i, value in enumerate(row):
-            if pd.isna(value):
-                row_cells[i].text = ''
-            elif isinstance(value, float):
-                row_cells[i].text = f'{value:,.2f}'
-            elif isinstance(value, int):
-                row_cells[i].text = f'{value:,}'
-            elif isinstance(value, pd.Timestamp):
-                row_cells[i].text = value.strftime('%d/%m/%Y')
-            else:
-                row_cells[i].text = str(value)[:50]  # Truncar texto largo
+    insertar_tabla(doc, df_display)
 
     if len(df) > max_rows:
         doc.add_paragraph(f'(Mostrando {max_rows} de {len(df)} registros)')
@@ -71,17 +57,45 @@ def add_table_to_doc(doc, df, title=None, max_rows=20):
     doc.add_paragraph()  # Espacio
 
 
-def generar_informe_word(datos: dict, analisis: dict) -> bytes:
+def tablas_anexos(datos: dict, analisis: dict) -> list:
     """
-    Genera un informe completo en formato Word con todas las tablas y analisis
+    Relaciones completas que se incluyen como anexos del informe Word:
+    lista de (titulo, DataFrame) sin limite de filas.
     """
-    doc = Document()
+    anexos = []
 
-    # Configurar estilos
-    style = doc.styles['Normal']
-    style.font.name = 'Calibri'
-    style.font.size = Pt(11)
+    papel = analisis.get('facturas_papel', {})
+    if len(papel.get('facturas_sospechosas', [])) > 0:
+        anexos.append(('Anexo I. Facturas en papel susceptibles de incumplir la obligatoriedad de factura electronica',
+                       papel['facturas_sospechosas']))
+
+    anot = analisis.get('anotacion', {})
+    if len(anot.get('df_retenidas', [])) > 0:
+        anexos.append(('Anexo II. Facturas retenidas en FACe no anotadas en el RCF', anot['df_retenidas']))
 
+    tram = analisis.get('tramitacion', {})
+    if len(tram.get('detalle_anulaciones', [])) > 0:
+        anexos.append(('Anexo III. Solicitudes de anulacion', tram['detalle_anulaciones']))
+
+    oblig = analisis.get('obligaciones', {})
+    if len(oblig.get('detalle_pendientes', [])) > 0:
+        anexos.append(('Anexo IV. Facturas con mas de 3 meses sin reconocimiento de obligacion', oblig['detalle_pendientes']))
+
+    plazos = (oblig.get('morosidad') or {}).get('plazos')
+    if plazos is not None and plazos['con_retraso'].any():
+        retraso = plazos[plazos['con_retraso']]
+        cols = [c for c in ['entidad', 'id_fra_rcf', 'numero_factura', 'nif_emisor', 'razon_social',
+                            'importe_total', 'codigo_oc'] if c in datos['rcf'].columns]
+        detalle = datos['rcf'][cols].reindex(retraso.index).join(
+            retraso[['fecha_inicio_computo', 'fecha_pago_efectiva', 'dias_pago']]
+        ).sort_values('dias_pago', ascending=False)
+        anexos.append(('Anexo V. Facturas pagadas fuera del plazo legal', detalle))
+
+    return anexos
+
+
+def _word_portada(doc, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe Word: Portada e indice."""
     # ============================================
     # PORTADA
     # ============================================
@@ -101,9 +115,9 @@ def generar_informe_word(datos: dict, analisis: dict) -> bytes:
     info = doc.add_paragraph()
     info.alignment = WD_ALIGN_PARAGRAPH.CENTER
     info.add_run('Entidad: ').bold = True
-    info.add_run(CONFIGURACION['nombre_entidad'] + '\n\n')
+    info.add_run(contexto['entidad'] + '\n\n')
     info.add_run('Ejercicio auditado: ').bold = True
-    info.add_run(CONFIGURACION['ejercicio_auditado'] + '\n\n')
+    info.add_run(contexto['ejercicio'] + '\n\n')
     info.add_run('Fecha del informe: ').bold = True
     info.add_run(datetime.now().strftime('%d/%m/%Y'))
 
@@ -124,6 +138,8 @@ def generar_informe_word(datos: dict, analisis: dict) -> bytes:
         '7. Obligaciones de Control y Morosidad (Seccion V.5)',
         '8. Conclusiones y Recomendaciones'
     ]
+    if contexto.get('anexos'):
+        indice_items.append('9. Anexos')
 
     for item in indice_items:
         p = doc.add_paragraph(item)
@@ -131,6 +147,9 @@ def generar_informe_word(datos: dict, analisis: dict) -> bytes:
 
     doc.add_page_break()
 
+
+def _word_resumen(doc, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe Word: 1. Resumen ejecutivo."""
     # ============================================
     # 1. RESUMEN EJECUTIVO
     # ============================================
@@ -138,7 +157,7 @@ def generar_informe_word(datos: dict, analisis: dict) -> bytes:
 
     doc.add_paragraph(f"""
 El presente informe recoge los resultados de la auditoria del Registro Contable de Facturas (RCF)
-de {CONFIGURACION['nombre_entidad']} correspondiente al ejercicio {CONFIGURACION['ejercicio_auditado']},
+de {contexto['entidad']} correspondiente al ejercicio {contexto['ejercicio']},
 en cumplimiento del articulo 12.3 de la Ley 25/2013, de 27 de diciembre, de impulso de la factura
 electronica y creacion del registro contable de facturas en el Sector Publico.
     """)
@@ -159,13 +178,7 @@ electronica y creacion del registro contable de facturas en el Sector Publico.
         ['Solicitudes de anulacion', f'{len(datos["anulaciones"]):,}'],
     ]
 
-    table = doc.add_table(rows=len(tabla_resumen), cols=2)
-    table.style = 'Light Grid Accent 1'
-    for i, fila in enumerate(tabla_resumen):
-        for j, valor in enumerate(fila):
-            table.rows[i].cells[j].text = str(valor)
-            if i == 0:
-                table.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+    insertar_tabla_filas(doc, tabla_resumen)
 
     doc.add_paragraph()
 
@@ -200,6 +213,9 @@ electronica y creacion del registro contable de facturas en el Sector Publico.
 
     doc.add_page_break()
 
+
+def _word_introduccion(doc, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe Word: 2. Introduccion y marco normativo."""
     # ============================================
     # 2. INTRODUCCION Y MARCO NORMATIVO
     # ============================================
@@ -240,16 +256,13 @@ La presente auditoria se realiza en cumplimiento de la siguiente normativa:
         ['Historico de Estados', f'{len(datos["estados"]):,}'],
     ]
 
-    table = doc.add_table(rows=len(archivos_tabla), cols=2)
-    table.style = 'Light Grid Accent 1'
-    for i, fila in enumerate(archivos_tabla):
-        for j, valor in enumerate(fila):
-            table.rows[i].cells[j].text = str(valor)
-            if i == 0:
-                table.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+    insertar_tabla_filas(doc, archivos_tabla)
 
     doc.add_page_break()
 
+
+def _word_papel(doc, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe Word: 3. Facturas en papel."""
     # ============================================
     # 3. FACTURAS EN PAPEL
     # ============================================
@@ -299,7 +312,7 @@ La presente auditoria se realiza en cumplimiento de la siguiente normativa:
     parrafo_intro = (
         f"Entrando ya a exponer los resultados arrojados por las pruebas realizadas con respecto al presente "
         f"apartado lo primero a resenar es que de los datos proporcionados por el RCF para el ejercicio "
-        f"{CONFIGURACION['ejercicio_auditado']} se desprende la recepcion de un total de {total_rcf_inf:,} "
+        f"{contexto['ejercicio']} se desprende la recepcion de un total de {total_rcf_inf:,} "
         f"facturas, de las cuales {n_elec_all_inf:,} ({porc_elec_p_inf:.2f}%) han sido recibidas por FACe "
         f"en formato electronico y {n_papel_all_inf:,} ({porc_papel_p_inf:.2f}%) han sido recibidas en "
         f"papel.{frase_anuladas} "
@@ -315,53 +328,17 @@ La presente auditoria se realiza en cumplimiento de la siguiente normativa:
     if 'entidad' in df_vivas_inf.columns:
         doc.add_heading('Desglose de facturas vivas por entidad', level=3)
 
-        tabla_ent = (
-            df_vivas_inf.groupby('entidad')
-            .apply(lambda g: pd.Series({
-                'Facturas FACe':  int((g['es_papel'] == False).sum()),
-                'Facturas Papel': int((g['es_papel'] == True).sum()),
-            }))
-            .reset_index()
-            .rename(columns={'entidad': 'Entidad'})
-        )
-        tabla_ent['Total'] = tabla_ent['Facturas FACe'] + tabla_ent['Facturas Papel']
-        tabla_ent = tabla_ent.sort_values('Total', ascending=False)
-
-        encabezados = ['Entidad', 'Facturas FACe', 'Facturas Papel', 'Total']
-        tbl = doc.add_table(rows=1, cols=len(encabezados))
-        tbl.style = 'Table Grid'
-        tbl.alignment = WD_TABLE_ALIGNMENT.CENTER
-
-        # Cabecera
-        hdr = tbl.rows[0].cells
-        for i, h in enumerate(encabezados):
-            hdr[i].text = h
-            hdr[i].paragraphs[0].runs[0].bold = True
-            set_cell_shading(hdr[i], '0066CC')
-            hdr[i].paragraphs[0].runs[0].font.color.rgb = RGBColor(255, 255, 255)
-
-        # Filas de datos
-        for _, row in tabla_ent.iterrows():
-            cells = tbl.add_row().cells
-            cells[0].text = str(row['Entidad'])
-            cells[1].text = f"{int(row['Facturas FACe']):,}"
-            cells[2].text = f"{int(row['Facturas Papel']):,}"
-            cells[3].text = f"{int(row['Total']):,}"
-
-        # Fila de totales
-        total_row = tbl.add_row().cells
-        total_row[0].text = 'TOTAL'
-        total_row[0].paragraphs[0].runs[0].bold = True
-        total_row[1].text = f"{int(tabla_ent['Facturas FACe'].sum()):,}"
-        total_row[1].paragraphs[0].runs[0].bold = True
-        total_row[2].text = f"{int(tabla_ent['Facturas Papel'].sum()):,}"
-        total_row[2].paragraphs[0].runs[0].bold = True
-        total_row[3].text = f"{int(tabla_ent['Total'].sum()):,}"
-        total_row[3].paragraphs[0].runs[0].bold = True
-        set_cell_shading(total_row[0], 'D9E1F2')
-        set_cell_shading(total_row[1], 'D9E1F2')
-        set_cell_shading(total_row[2], 'D9E1F2')
-        set_cell_shading(total_row[3], 'D9E1F2')
+        resumen_ent = resumen_por_entidad(df_vivas_inf, fila_totales=False)
+        tabla_ent = pd.DataFrame({
+            'Entidad': resumen_ent['Entidad'],
+            'Facturas FACe': resumen_ent['Face_Tram'] + resumen_ent['Face_Anul'],
+            'Facturas Papel': resumen_ent['Papel_Tram'] + resumen_ent['Papel_Anul'],
+            'Total': resumen_ent['Total'],
+        })
+
+        fila_total = {'Entidad': 'TOTAL', **tabla_ent.drop(columns='Entidad').sum().to_dict()}
+        tabla_ent = pd.concat([tabla_ent, pd.DataFrame([fila_total])], ignore_index=True)
+        insertar_tabla(doc, tabla_ent, fila_total=True)
 
         doc.add_paragraph()
 
@@ -383,13 +360,7 @@ que podrian estar incumpliendo esta obligatoriedad.
             ['Importe total sospechoso', f'{papel.get("importe_sospechoso", 0):,.2f} EUR'],
         ]
 
-        table = doc.add_table(rows=len(resumen_papel), cols=2)
-        table.style = 'Light Grid Accent 1'
-        for i, fila in enumerate(resumen_papel):
-            for j, valor in enumerate(fila):
-                table.rows[i].cells[j].text = str(valor)
-                if i == 0:
-                    table.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+        insertar_tabla_filas(doc, resumen_papel)
 
         doc.add_paragraph()
 
@@ -417,6 +388,9 @@ que podrian estar incumpliendo esta obligatoriedad.
 
     doc.add_page_break()
 
+
+def _word_anotacion(doc, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe Word: 4. Tiempos de anotacion."""
     # ============================================
     # 4. TIEMPOS DE ANOTACION
     # ============================================
@@ -479,13 +453,7 @@ que podrian estar incumpliendo esta obligatoriedad.
             ['Facturas rechazadas antes de anotacion', '-', str(n_rechazo)],
             ['Facturas retenidas en FACe', str(anot.get('facturas_retenidas', 0)), '0'],
         ]
-        table = doc.add_table(rows=len(cruce_tabla), cols=3)
-        table.style = 'Light Grid Accent 1'
-        for i, fila in enumerate(cruce_tabla):
-            for j, valor in enumerate(fila):
-                table.rows[i].cells[j].text = str(valor)
-                if i == 0:
-                    table.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+        insertar_tabla_filas(doc, cruce_tabla)
         doc.add_paragraph()
 
         if n_s_post > 0:
@@ -524,13 +492,7 @@ que podrian estar incumpliendo esta obligatoriedad.
             ['Tiempo medio S-F (permanencia estado previo)', _fmt_min_word(anot.get('tiempo_medio_s_f_min'))],
             ['Tiempo medio FACe-F (registro definitivo)', _fmt_min_word(anot.get('tiempo_medio_face_f_anterior_min'))],
         ]
-        table2 = doc.add_table(rows=len(tiempos_ant), cols=2)
-        table2.style = 'Light Grid Accent 1'
-        for i, fila in enumerate(tiempos_ant):
-            for j, valor in enumerate(fila):
-                table2.rows[i].cells[j].text = str(valor)
-                if i == 0:
-                    table2.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+        insertar_tabla_filas(doc, tiempos_ant)
         doc.add_paragraph()
 
         # --- 4.4 Tiempos procedimiento nuevo ---
@@ -552,13 +514,7 @@ que podrian estar incumpliendo esta obligatoriedad.
             ['Facturas rechazadas antes de anotacion', str(n_rechazo)],
             ['Rechazos sin causa suficiente', str(anot.get('n_rechazadas_sin_causa', 0))],
         ]
-        table3 = doc.add_table(rows=len(tiempos_nvo), cols=2)
-        table3.style = 'Light Grid Accent 1'
-        for i, fila in enumerate(tiempos_nvo):
-            for j, valor in enumerate(fila):
-                table3.rows[i].cells[j].text = str(valor)
-                if i == 0:
-                    table3.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+        insertar_tabla_filas(doc, tiempos_nvo)
         doc.add_paragraph()
 
         # --- 4.5 Conclusion del apartado ---
@@ -597,6 +553,9 @@ que podrian estar incumpliendo esta obligatoriedad.
 
     doc.add_page_break()
 
+
+def _word_validaciones(doc, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe Word: 5. Validaciones HAP/1650/2015."""
     # ============================================
     # 5. VALIDACIONES HAP/1650/2015
     # ============================================
@@ -619,13 +578,7 @@ de expedicion posterior al 15 de octubre de 2015. Se analiza el cumplimiento de
             ['Porcentaje cumplimiento', f'{val.get("porcentaje_cumplimiento", 100):.2f}%'],
         ]
 
-        table = doc.add_table(rows=len(resumen_val), cols=2)
-        table.style = 'Light Grid Accent 1'
-        for i, fila in enumerate(resumen_val):
-            for j, valor in enumerate(fila):
-                table.rows[i].cells[j].text = str(valor)
-                if i == 0:
-                    table.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+        insertar_tabla_filas(doc, resumen_val)
 
         doc.add_paragraph()
 
@@ -641,13 +594,7 @@ de expedicion posterior al 15 de octubre de 2015. Se analiza el cumplimiento de
                     f"{resultado['porcentaje']:.2f}%"
                 ])
 
-            table = doc.add_table(rows=len(tabla_val), cols=4)
-            table.style = 'Light Grid Accent 1'
-            for i, fila in enumerate(tabla_val):
-                for j, valor in enumerate(fila):
-                    table.rows[i].cells[j].text = str(valor)
-                    if i == 0:
-                        table.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+            insertar_tabla_filas(doc, tabla_val)
 
         doc.add_paragraph()
 
@@ -666,18 +613,15 @@ de expedicion posterior al 15 de octubre de 2015. Se analiza el cumplimiento de
                 for motivo, cantidad in motivos_list:
                     tabla_motivos.append([str(motivo)[:60], str(cantidad)])
 
-                table = doc.add_table(rows=len(tabla_motivos), cols=2)
-                table.style = 'Light Grid Accent 1'
-                for i, fila in enumerate(tabla_motivos):
-                    for j, valor in enumerate(fila):
-                        table.rows[i].cells[j].text = str(valor)
-                        if i == 0:
-                            table.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+                insertar_tabla_filas(doc, tabla_motivos)
     else:
         doc.add_paragraph('No se ha realizado el analisis de validaciones. Navegue por la seccion correspondiente de la aplicacion.')
 
     doc.add_page_break()
 
+
+def _word_tramitacion(doc, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe Word: 6. Tramitacion."""
     # ============================================
     # 6. TRAMITACION DE FACTURAS
     # ============================================
@@ -700,13 +644,7 @@ de estados y el reconocimiento de obligaciones.
             ['Con comentario', f'{tram.get("anulaciones_con_comentario", 0):,}'],
         ]
 
-        table = doc.add_table(rows=len(anulaciones_tabla), cols=2)
-        table.style = 'Light Grid Accent 1'
-        for i, fila in enumerate(anulaciones_tabla):
-            for j, valor in enumerate(fila):
-                table.rows[i].cells[j].text = str(valor)
-                if i == 0:
-                    table.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+        insertar_tabla_filas(doc, anulaciones_tabla)
 
         doc.add_paragraph()
 
@@ -729,13 +667,7 @@ de estados y el reconocimiento de obligaciones.
             ['Facturas contabilizadas', f'{tram.get("facturas_contabilizadas", 0):,}'],
         ]
 
-        table = doc.add_table(rows=len(pagos_tabla), cols=2)
-        table.style = 'Light Grid Accent 1'
-        for i, fila in enumerate(pagos_tabla):
-            for j, valor in enumerate(fila):
-                table.rows[i].cells[j].text = str(valor)
-                if i == 0:
-                    table.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+        insertar_tabla_filas(doc, pagos_tabla)
 
         # Secuencias de estados
         if 'secuencias_estados' in tram and len(tram['secuencias_estados']) > 0:
@@ -745,6 +677,9 @@ de estados y el reconocimiento de obligaciones.
 
     doc.add_page_break()
 
+
+def _word_obligaciones(doc, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe Word: 7. Obligaciones y morosidad."""
     # ============================================
     # 7. OBLIGACIONES Y MOROSIDAD
     # ============================================
@@ -760,6 +695,9 @@ de reconocimiento de obligacion. Se analizan especialmente las facturas con mas
 
         doc.add_heading('7.1. Facturas Pendientes mas de 3 Meses', 2)
 
+        if oblig.get('fecha_corte') is not None:
+            doc.add_paragraph(f'Fecha de corte del analisis: {pd.Timestamp(oblig["fecha_corte"]).strftime("%d/%m/%Y")}')
+
         if oblig.get('facturas_3_meses', 0) > 0:
             p = doc.add_paragraph()
             p.add_run('ALERTA: ').bold = True
@@ -773,13 +711,7 @@ de reconocimiento de obligacion. Se analizan especialmente las facturas con mas
                 ['Antiguedad maxima', f'{oblig.get("dias_max_pendiente", 0):.0f} dias'],
             ]
 
-            table = doc.add_table(rows=len(pendientes_tabla), cols=2)
-            table.style = 'Light Grid Accent 1'
-            for i, fila in enumerate(pendientes_tabla):
-                for j, valor in enumerate(fila):
-                    table.rows[i].cells[j].text = str(valor)
-                    if i == 0:
-                        table.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+            insertar_tabla_filas(doc, pendientes_tabla)
 
             doc.add_paragraph()
 
@@ -797,30 +729,55 @@ de reconocimiento de obligacion. Se analizan especialmente las facturas con mas
         else:
             doc.add_paragraph('No se han detectado facturas con mas de 3 meses pendientes de reconocimiento de obligacion.')
 
+        evolucion = oblig.get('evolucion_pendientes_3_meses')
+        if evolucion is not None and len(evolucion) > 0:
+            evolucion_tabla = evolucion.rename(columns={
+                'fecha': 'Cierre de Mes',
+                'facturas_pendientes': 'Facturas >3 Meses',
+                'importe_pendiente': 'Importe Pendiente',
+            })
+            add_table_to_doc(doc, evolucion_tabla, 'Evolucion mensual de facturas con mas de 3 meses sin reconocimiento (segun historico de estados)', 12)
+
+        antiguedad = oblig.get('antiguedad') or {}
+        if antiguedad.get('total_pendientes', 0) > 0:
+            add_table_to_doc(doc, antiguedad['total'], 'Distribucion por antiguedad de las facturas pendientes a la fecha de corte', 10)
+            if 'por_entidad' in antiguedad:
+                add_table_to_doc(doc, antiguedad['por_entidad']['importe'], 'Importe pendiente por entidad y tramo de antiguedad (EUR)', 20)
+
         # Morosidad
-        if oblig.get('morosidad') and oblig['morosidad'].get('total_con_retraso', 0) > 0:
+        if oblig.get('morosidad') and oblig['morosidad'].get('total_pagadas', 0) > 0:
             doc.add_heading('7.5. Analisis de Morosidad', 2)
 
             morosidad = oblig['morosidad']
+            plazo_legal = CONFIGURACION.get('plazo_legal_pago_dias', 30)
             morosidad_tabla = [
                 ['Concepto', 'Valor'],
-                ['Facturas pagadas con retraso (>30 dias)', f'{morosidad.get("total_con_retraso", 0):,}'],
+                ['Facturas pagadas analizadas', f'{morosidad.get("total_pagadas", 0):,}'],
+                ['Periodo medio de pago (ponderado por importe)', f'{morosidad.get("pmp", 0):.1f} dias'],
+                [f'Facturas pagadas con retraso (>{plazo_legal} dias)', f'{morosidad.get("total_con_retraso", 0):,} ({morosidad.get("porcentaje_con_retraso", 0):.1f}%)'],
+                ['Importe pagado con retraso', f'{morosidad.get("importe_con_retraso", 0):,.2f} EUR'],
                 ['Dias medio de retraso', f'{morosidad.get("dias_retraso_medio", 0):.0f} dias'],
                 ['Retraso maximo', f'{morosidad.get("dias_retraso_max", 0):.0f} dias'],
             ]
 
-            table = doc.add_table(rows=len(morosidad_tabla), cols=2)
-            table.style = 'Light Grid Accent 1'
-            for i, fila in enumerate(morosidad_tabla):
-                for j, valor in enumerate(fila):
-                    table.rows[i].cells[j].text = str(valor)
-                    if i == 0:
-                        table.rows[i].cells[j].paragraphs[0].runs[0].bold = True
+            insertar_tabla_filas(doc, morosidad_tabla)
+
+            if len(morosidad.get('por_entidad', [])) > 0:
+                add_table_to_doc(doc, morosidad['por_entidad'], '7.6. Periodo Medio de Pago por Entidad', 20)
+
+            if len(morosidad.get('por_oc', [])) > 0:
+                add_table_to_doc(doc, morosidad['por_oc'], '7.7. Periodo Medio de Pago por Oficina Contable', 10)
+
+            if len(morosidad.get('por_mes', [])) > 0:
+                add_table_to_doc(doc, morosidad['por_mes'], '7.8. Evolucion Mensual del Periodo Medio de Pago', 24)
     else:
         doc.add_paragraph('No se ha realizado el analisis de obligaciones. Navegue por la seccion correspondiente de la aplicacion.')
 
     doc.add_page_break()
 
+
+def _word_conclusiones(doc, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe Word: 8. Conclusiones y recomendaciones."""
     # ============================================
     # 8. CONCLUSIONES Y RECOMENDACIONES
     # ============================================
@@ -872,102 +829,62 @@ de reconocimiento de obligacion. Se analizan especialmente las facturas con mas
         p = doc.add_paragraph(style='List Bullet')
         p.add_run(recomendacion)
 
+
+def _word_anexos(doc, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe Word: 9. Anexos."""
+    # ============================================
+    # 9. ANEXOS
+    # ============================================
+    anexos = contexto.get('anexos', [])
+    if anexos:
+        doc.add_page_break()
+        doc.add_heading('9. ANEXOS', 1)
+        doc.add_paragraph('Se incluyen a continuacion las relaciones completas de facturas que sustentan las incidencias descritas en el informe.')
+        for titulo, df_anexo in anexos:
+            doc.add_heading(titulo, 2)
+            doc.add_paragraph(f'Numero de registros: {len(df_anexo):,}')
+            reservar_tabla(doc, contexto['tablas_diferidas'], df_anexo)
+
+
+def _word_pie(doc, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe Word: Pie del informe."""
     # Footer
     doc.add_page_break()
     footer = doc.add_paragraph()
     footer.alignment = WD_ALIGN_PARAGRAPH.CENTER
     footer.add_run('\n\n')
     footer.add_run(CONFIGURACION_INFORME['footer']).italic = True
-    footer.add_run(f'\n\nGenerado el {datetime.now().strftime("%d/%m/%Y a las %H:%M")}')
-
-    # Guardar en bytes
-    buffer = io.BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-
-    return buffer.getvalue()
-
-
-def generar_informe_pdf(datos: dict, analisis: dict) -> bytes:
-    """
-    Genera un informe ejecutivo en formato PDF con resumen completo
-    """
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=2*cm,
-        bottomMargin=2*cm
-    )
-    story = []
-    styles = getSampleStyleSheet()
+    # Solo la fecha: el informe se reutiliza desde la caché durante todo el día
+    footer.add_run(f'\n\nGenerado el {datetime.now().strftime("%d/%m/%Y")}')
 
-    # Estilos personalizados
-    titulo_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        textColor=colors.HexColor('#0066CC'),
-        spaceAfter=30,
-        alignment=1
-    )
-
-    subtitulo_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#333333'),
-        spaceAfter=12,
-        spaceBefore=20
-    )
-
-    seccion_style = ParagraphStyle(
-        'SeccionTitle',
-        parent=styles['Heading2'],
-        fontSize=12,
-        textColor=colors.HexColor('#0066CC'),
-        spaceAfter=10,
-        spaceBefore=15
-    )
-
-    alerta_style = ParagraphStyle(
-        'Alerta',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.HexColor('#CC0000'),
-        spaceBefore=5,
-        spaceAfter=5
-    )
-
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=8
-    )
 
+def _pdf_portada(story: list, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe PDF: Portada."""
+    estilos = contexto['estilos']
     # ============================================
     # PORTADA
     # ============================================
     story.append(Spacer(1, 2*cm))
-    story.append(Paragraph(CONFIGURACION_INFORME['titulo'], titulo_style))
-    story.append(Paragraph('INFORME EJECUTIVO', subtitulo_style))
+    story.append(Paragraph(CONFIGURACION_INFORME['titulo'], estilos['titulo']))
+    story.append(Paragraph('INFORME EJECUTIVO', estilos['subtitulo']))
     story.append(Spacer(1, 1*cm))
 
     info_text = f"""
-    <b>Entidad:</b> {CONFIGURACION['nombre_entidad']}<br/>
-    <b>Ejercicio:</b> {CONFIGURACION['ejercicio_auditado']}<br/>
+    <b>Entidad:</b> {contexto['entidad']}<br/>
+    <b>Ejercicio:</b> {contexto['ejercicio']}<br/>
     <b>Fecha:</b> {datetime.now().strftime('%d/%m/%Y')}
     """
-    story.append(Paragraph(info_text, normal_style))
+    story.append(Paragraph(info_text, estilos['normal']))
     story.append(PageBreak())
 
+
+def _pdf_resumen(story: list, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe PDF: Resumen ejecutivo y principales hallazgos."""
+    estilos = contexto['estilos']
     # ============================================
     # RESUMEN EJECUTIVO
     # ============================================
-    story.append(Paragraph('RESUMEN EJECUTIVO', subtitulo_style))
+    story.append(Paragraph('RESUMEN EJECUTIVO', estilos['subtitulo']))
 
     # Tabla de cifras principales
     total_facturas = len(datos['rcf'])
@@ -1000,7 +917,7 @@ def generar_informe_pdf(datos: dict, analisis: dict) -> bytes:
     # ============================================
     # PRINCIPALES HALLAZGOS
     # ============================================
-    story.append(Paragraph('PRINCIPALES HALLAZGOS', subtitulo_style))
+    story.append(Paragraph('PRINCIPALES HALLAZGOS', estilos['subtitulo']))
 
     hallazgos = []
     alertas = []
@@ -1033,25 +950,25 @@ def generar_informe_pdf(datos: dict, analisis: dict) -> bytes:
 
     # Mostrar alertas primero
     if alertas:
-        story.append(Paragraph('<b>ALERTAS:</b>', alerta_style))
+        story.append(Paragraph('<b>ALERTAS:</b>', estilos['alerta']))
         for alerta in alertas:
-            story.append(Paragraph(f"- {alerta}", alerta_style))
+            story.append(Paragraph(f"- {alerta}", estilos['alerta']))
         story.append(Spacer(1, 0.3*cm))
 
     # Mostrar hallazgos
     for hallazgo in hallazgos:
-        story.append(Paragraph(f"- {hallazgo}", normal_style))
+        story.append(Paragraph(f"- {hallazgo}", estilos['normal']))
 
     story.append(PageBreak())
 
-    # ============================================
-    # DETALLE POR SECCION
-    # ============================================
 
+def _pdf_papel(story: list, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe PDF: Facturas en papel."""
+    estilos = contexto['estilos']
     # Facturas en papel
     if 'facturas_papel' in analisis:
         papel = analisis['facturas_papel']
-        story.append(Paragraph('FACTURAS EN PAPEL', seccion_style))
+        story.append(Paragraph('FACTURAS EN PAPEL', estilos['seccion']))
 
         papel_data = [
             ['Metrica', 'Valor'],
@@ -1072,10 +989,14 @@ def generar_informe_pdf(datos: dict, analisis: dict) -> bytes:
         story.append(tabla)
         story.append(Spacer(1, 0.3*cm))
 
+
+def _pdf_anotacion(story: list, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe PDF: Tiempos de anotacion."""
+    estilos = contexto['estilos']
     # Tiempos de anotacion
     if 'anotacion' in analisis:
         anot = analisis['anotacion']
-        story.append(Paragraph('TIEMPOS DE ANOTACION', seccion_style))
+        story.append(Paragraph('TIEMPOS DE ANOTACION', estilos['seccion']))
 
         anot_data = [
             ['Metrica', 'Valor'],
@@ -1096,10 +1017,14 @@ def generar_informe_pdf(datos: dict, analisis: dict) -> bytes:
         story.append(tabla)
         story.append(Spacer(1, 0.3*cm))
 
+
+def _pdf_validaciones(story: list, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe PDF: Validaciones HAP/1650/2015."""
+    estilos = contexto['estilos']
     # Validaciones
     if 'validaciones' in analisis:
         val = analisis['validaciones']
-        story.append(Paragraph('VALIDACIONES HAP/1650/2015', seccion_style))
+        story.append(Paragraph('VALIDACIONES HAP/1650/2015', estilos['seccion']))
 
         val_data = [
             ['Metrica', 'Valor'],
@@ -1120,10 +1045,14 @@ def generar_informe_pdf(datos: dict, analisis: dict) -> bytes:
         story.append(tabla)
         story.append(Spacer(1, 0.3*cm))
 
+
+def _pdf_obligaciones(story: list, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe PDF: Obligaciones pendientes y morosidad."""
+    estilos = contexto['estilos']
     # Obligaciones
     if 'obligaciones' in analisis:
         oblig = analisis['obligaciones']
-        story.append(Paragraph('OBLIGACIONES PENDIENTES', seccion_style))
+        story.append(Paragraph('OBLIGACIONES PENDIENTES', estilos['seccion']))
 
         oblig_data = [
             ['Metrica', 'Valor'],
@@ -1131,6 +1060,15 @@ def generar_informe_pdf(datos: dict, analisis: dict) -> bytes:
             ['Importe pendiente', f'{oblig.get("importe_pendiente", 0):,.2f} EUR'],
             ['Dias medio pendiente', f'{oblig.get("dias_medio_pendiente", 0):.0f} dias'],
         ]
+        antiguedad = oblig.get('antiguedad') or {}
+        for _, fila in (antiguedad['total'].iterrows() if antiguedad.get('total_pendientes', 0) > 0 else []):
+            oblig_data.append([f'Pendientes {fila["Tramo"]}', f'{fila["Nº Facturas"]:,} ({fila["Importe"]:,.2f} EUR)'])
+        morosidad = oblig.get('morosidad') or {}
+        if morosidad.get('total_pagadas', 0) > 0:
+            oblig_data += [
+                ['Periodo medio de pago (ponderado)', f'{morosidad.get("pmp", 0):.1f} dias'],
+                ['Facturas pagadas con retraso', f'{morosidad.get("total_con_retraso", 0):,} ({morosidad.get("porcentaje_con_retraso", 0):.1f}%)'],
+            ]
 
         tabla = Table(oblig_data, colWidths=[10*cm, 5*cm])
         tabla.setStyle(TableStyle([
@@ -1143,14 +1081,247 @@ def generar_informe_pdf(datos: dict, analisis: dict) -> bytes:
         ]))
         story.append(tabla)
 
+
+def _pdf_anexos(story: list, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe PDF: Anexos."""
+    estilos = contexto['estilos']
+    anexos = contexto.get('anexos', [])
+    if not anexos:
+        return
+
+    story.append(PageBreak())
+    story.append(Paragraph('ANEXOS', estilos['subtitulo']))
+    for titulo, df_anexo in anexos:
+        story.append(Paragraph(titulo, estilos['seccion']))
+        story.append(Paragraph(f'Numero de registros: {len(df_anexo):,}', estilos['normal']))
+        story.extend(tabla_pdf(df_anexo))
+        story.append(Spacer(1, 0.5*cm))
+
+
+def _pdf_pie(story: list, datos: dict, analisis: dict, contexto: dict) -> None:
+    """Seccion del informe PDF: Pie del informe."""
+    estilos = contexto['estilos']
     # Footer
     story.append(Spacer(1, 1*cm))
-    story.append(Paragraph('<hr/>', normal_style))
-    footer_text = f"<i>{CONFIGURACION_INFORME['footer']}</i><br/><br/>Generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M')}"
-    story.append(Paragraph(footer_text, normal_style))
+    story.append(Paragraph('<hr/>', estilos['normal']))
+    # Solo la fecha: el informe se reutiliza desde la caché durante todo el día
+    footer_text = f"<i>{CONFIGURACION_INFORME['footer']}</i><br/><br/>Generado el {datetime.now().strftime('%d/%m/%Y')}"
+    story.append(Paragraph(footer_text, estilos['normal']))
+
+
+def _estilos_pdf() -> dict:
+    """Estilos de parrafo del informe PDF."""
+    styles = getSampleStyleSheet()
+
+    titulo_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        textColor=colors.HexColor('#0066CC'),
+        spaceAfter=30,
+        alignment=1
+    )
+
+    subtitulo_style = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Heading2'],
+        fontSize=14,
+        textColor=colors.HexColor('#333333'),
+        spaceAfter=12,
+        spaceBefore=20
+    )
+
+    seccion_style = ParagraphStyle(
+        'SeccionTitle',
+        parent=styles['Heading2'],
+        fontSize=12,
+        textColor=colors.HexColor('#0066CC'),
+        spaceAfter=10,
+        spaceBefore=15
+    )
+
+    alerta_style = ParagraphStyle(
+        'Alerta',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=colors.HexColor('#CC0000'),
+        spaceBefore=5,
+        spaceAfter=5
+    )
+
+    normal_style = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=10,
+        spaceAfter=8
+    )
+
+    return {
+        'titulo': titulo_style,
+        'subtitulo': subtitulo_style,
+        'seccion': seccion_style,
+        'alerta': alerta_style,
+        'normal': normal_style,
+    }
+
+
+# Secciones de cada informe, en orden: (clave, titulo, renderer)
+SECCIONES_WORD = [
+    ('portada', 'Portada e indice', _word_portada),
+    ('resumen', '1. Resumen ejecutivo', _word_resumen),
+    ('introduccion', '2. Introduccion y marco normativo', _word_introduccion),
+    ('papel', '3. Facturas en papel', _word_papel),
+    ('anotacion', '4. Tiempos de anotacion', _word_anotacion),
+    ('validaciones', '5. Validaciones HAP/1650/2015', _word_validaciones),
+    ('tramitacion', '6. Tramitacion', _word_tramitacion),
+    ('obligaciones', '7. Obligaciones y morosidad', _word_obligaciones),
+    ('conclusiones', '8. Conclusiones y recomendaciones', _word_conclusiones),
+    ('anexos', '9. Anexos', _word_anexos),
+    ('pie', 'Pie del informe', _word_pie),
+]
+
+SECCIONES_PDF = [
+    ('portada', 'Portada', _pdf_portada),
+    ('resumen', 'Resumen ejecutivo y hallazgos', _pdf_resumen),
+    ('papel', 'Facturas en papel', _pdf_papel),
+    ('anotacion', 'Tiempos de anotacion', _pdf_anotacion),
+    ('validaciones', 'Validaciones HAP/1650/2015', _pdf_validaciones),
+    ('obligaciones', 'Obligaciones pendientes', _pdf_obligaciones),
+    ('anexos', 'Anexos', _pdf_anexos),
+    ('pie', 'Pie del informe', _pdf_pie),
+]
+
+
+def _documento_word() -> Document:
+    doc = Document()
+
+    # Configurar estilos
+    style = doc.styles['Normal']
+    style.font.name = 'Calibri'
+    style.font.size = Pt(11)
+    return doc
+
+
+def _fragmento_word(renderer, datos: dict, analisis: dict, contexto: dict) -> dict:
+    """
+    Renderiza una seccion en un documento propio y devuelve el XML de su cuerpo
+    junto con las tablas de anexos reservadas (ver reservar_tabla).
+    """
+    doc = Document()
+    contexto = dict(contexto, tablas_diferidas={})
+    renderer(doc, datos, analisis, contexto)
+    xml = b''.join(etree.tostring(el) for el in doc.element.body if el.tag != qn('w:sectPr'))
+    return {'xml': xml, 'tablas_diferidas': contexto['tablas_diferidas']}
 
-    # Construir PDF
-    doc.build(story)
+
+def _ensamblar_word(fragmentos: list) -> bytes:
+    """Une los fragmentos de las secciones en un documento y lo guarda en bytes."""
+    doc = _documento_word()
+    sect_pr = doc.element.body.sectPr
+    tablas_diferidas = {}
+    for fragmento in fragmentos:
+        cuerpo = parse_xml(f'<w:body {nsdecls("w")}>'.encode() + fragmento['xml'] + b'</w:body>')
+        for elemento in list(cuerpo):
+            sect_pr.addprevious(elemento)
+        tablas_diferidas.update(fragmento['tablas_diferidas'])
+
+    # Las tablas de anexos se escriben por bloques al guardar
+    return guardar_con_tablas_diferidas(doc, tablas_diferidas)
+
+
+def _fragmento_pdf(renderer, datos: dict, analisis: dict, contexto: dict) -> list:
+    """Renderiza una seccion y devuelve su lista de flowables."""
+    story = []
+    renderer(story, datos, analisis, dict(contexto, estilos=_estilos_pdf()))
+    return story
+
+
+def _ensamblar_pdf(fragmentos: list) -> bytes:
+    """Une los flowables de las secciones y construye el PDF."""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm
+    )
+    doc.build([flowable for fragmento in fragmentos for flowable in fragmento])
     buffer.seek(0)
 
     return buffer.getvalue()
+
+
+_FORMATOS_INFORME = {
+    'word': (SECCIONES_WORD, _fragmento_word, _ensamblar_word),
+    'pdf': (SECCIONES_PDF, _fragmento_pdf, _ensamblar_pdf),
+}
+
+
+def generar_informes(datos: dict, analisis: dict, formatos=('word', 'pdf'),
+                     incluir_anexos: bool = False, procesos: int = None, ejercicio=None,
+                     nombre_entidad: str = None) -> dict:
+    """
+    Genera los informes indicados ('word', 'pdf') seccion a seccion, para el
+    ejercicio y la entidad indicados (por defecto, los de CONFIGURACION).
+
+    Las secciones de todos los formatos se renderizan en un pool de procesos
+    (ver utils.informe_pipeline) y se ensamblan despues en orden. Devuelve un
+    diccionario con los bytes de cada formato y 'tiempos', un DataFrame con el
+    tiempo de cada seccion y del ensamblado, ademas de 'tiempo_total'.
+    """
+    inicio_total = time.perf_counter()
+    contexto = {
+        'anexos': tablas_anexos(datos, analisis) if incluir_anexos else [],
+        'ejercicio': str(ejercicio_auditado(ejercicio)),
+        'entidad': nombre_entidad or CONFIGURACION['nombre_entidad'],
+    }
+
+    tareas = [
+        ((formato, clave), partial(_FORMATOS_INFORME[formato][1], renderer))
+        for formato in formatos
+        for clave, _, renderer in _FORMATOS_INFORME[formato][0]
+    ]
+    fragmentos, tiempos = ejecutar_secciones(tareas, datos, analisis, contexto, procesos)
+
+    resultado = {}
+    filas_tiempos = []
+    for formato in formatos:
+        secciones, _, ensamblar = _FORMATOS_INFORME[formato]
+        inicio = time.perf_counter()
+        resultado[formato] = ensamblar([fragmentos[(formato, clave)] for clave, _, _ in secciones])
+        tiempos[(formato, 'ensamblado')] = time.perf_counter() - inicio
+
+        for clave, titulo, _ in secciones + [('ensamblado', 'Ensamblado y guardado', None)]:
+            filas_tiempos.append({
+                'Formato': formato.upper(),
+                'Seccion': titulo,
+                'Tiempo (s)': round(tiempos[(formato, clave)], 3),
+            })
+
+    resultado['tiempos'] = pd.DataFrame(filas_tiempos)
+    resultado['tiempo_total'] = time.perf_counter() - inicio_total
+    return resultado
+
+
+def generar_informe_word(datos: dict, analisis: dict, incluir_anexos: bool = False, ejercicio=None) -> bytes:
+    """
+    Genera un informe completo en formato Word con todas las tablas y analisis.
+
+    Con incluir_anexos se anaden las relaciones completas (sin limite de filas) de
+    facturas sospechosas, retenidas, anulaciones, pendientes y pagadas fuera de plazo.
+    Estas tablas se escriben por bloques al guardar el documento, de modo que la
+    memoria no crece con el numero de filas.
+    """
+    return generar_informes(datos, analisis, ('word',), incluir_anexos, ejercicio=ejercicio)['word']
+
+
+def generar_informe_pdf(datos: dict, analisis: dict, incluir_anexos: bool = False, ejercicio=None) -> bytes:
+    """
+    Genera un informe ejecutivo en formato PDF con resumen completo.
+
+    Con incluir_anexos se anaden las relaciones completas como tablas paginadas
+    (ver utils.pdf_tablas).
+    """
+    return generar_informes(datos, analisis, ('pdf',), incluir_anexos, ejercicio=ejercicio)['pdf']
@@ -0,0 +1,49 @@
+"""
+Adaptadores de Streamlit para el núcleo de cálculo.
+
+El núcleo (utils.data_loader, utils.analisis, ...) no importa Streamlit: usa el
+backend de caché de utils.cache y el receptor de avisos de utils.notificaciones.
+La aplicación y cada página llaman a activar_streamlit() para que las funciones
+@cacheable usen st.cache_data, los avisos se muestren en pantalla y los procesos
+de generación de informes se arranquen con 'spawn' (el servidor tiene varios hilos).
+"""
+
+import streamlit as st
+
+from utils.cache import configurar_backend_cache
+from utils.ciclo_vida import ejercicio_auditado
+from utils.data_loader import ejercicio_configurado
+from utils.informe_pipeline import configurar_metodo_inicio
+from utils.notificaciones import configurar_notificador
+
+
+def notificar_streamlit(nivel: str, mensaje: str) -> None:
+    """Muestra los avisos de carga en la barra lateral y los errores en la página."""
+    if nivel == 'progreso':
+        # El progreso ya lo indica el spinner de la página
+        return
+    if nivel == 'info':
+        st.sidebar.info(mensaje)
+    elif nivel == 'warning':
+        st.sidebar.warning(mensaje)
+    else:
+        st.error(mensaje)
+
+
+def ejercicio_sesion() -> int:
+    """
+    Ejercicio auditado de la sesión: el elegido en app.py o, si no hay ninguno, el
+    configurado. Se pasa explícitamente a cargas, análisis e informes; CONFIGURACION
+    es común a todas las sesiones del servidor y no se modifica.
+    """
+    return ejercicio_auditado(st.session_state.get('ejercicio_seleccionado') or ejercicio_configurado())
+
+
+def activar_streamlit() -> None:
+    """
+    Registra st.cache_data como backend de caché, la pantalla como receptor de
+    avisos y 'spawn' como método de arranque de los procesos de los informes.
+    """
+    configurar_backend_cache(st.cache_data)
+    configurar_notificador(notificar_streamlit)
+    configurar_metodo_inicio('spawn')
@@ -0,0 +1,162 @@
+"""
+Tablas HTML con estilo de informe para st.markdown.
+
+Las páginas muestran algunos cuadros como tablas HTML propias (cabeceras
+agrupadas, fila de totales destacada, alternancia de fondos). Aquí se formatea
+el DataFrame columna a columna, se construye cada fila sumando las columnas de
+celdas ya formateadas y el cuerpo se une con un único join. El HTML se memoiza
+por (huella del DataFrame, especificación de estilo), de modo que en las
+reejecuciones de Streamlit en que la tabla no cambia (p. ej. al mover un widget
+de la barra lateral) no se vuelve a generar.
+"""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import huella_dataframe, memoizar
+
+SIN_VALOR = '—'
+
+# Estilos de tabla: 'informe' (cuadros de la página 3), 'informe_compacto'
+# (tablas 4.x de la página 5) y 'resumen' (cuadros del Dashboard)
+ESTILOS = {
+    'informe': {
+        'tabla': 'border-collapse:collapse;font-size:13px;',
+        'cabecera_fila': '',
+        'th': 'background:#1f4e79;color:white;padding:7px 10px;border:1px solid #555;text-align:center;white-space:nowrap;',
+        'th_etiqueta': 'background:#1f4e79;color:white;padding:7px 14px;border:1px solid #555;text-align:left;min-width:220px;',
+        'td': 'padding:6px 10px;border:1px solid #ccc;text-align:center;',
+        'td_etiqueta': 'padding:6px 14px;border:1px solid #ccc;text-align:left;font-size:13px;',
+        'fila_par': 'background:#f5f9ff;',
+        'fila_total': 'background:#dce6f1;',
+    },
+    'informe_compacto': {
+        'tabla': 'border-collapse:collapse;',
+        'cabecera_fila': '',
+        'th': 'background:#1f4e79;color:white;padding:6px 9px;border:1px solid #555;text-align:center;white-space:nowrap;font-size:12px;',
+        'th_etiqueta': 'background:#1f4e79;color:white;padding:6px 12px;border:1px solid #555;text-align:left;min-width:160px;font-size:12px;',
+        'td': 'padding:5px 9px;border:1px solid #ccc;text-align:center;font-size:12px;',
+        'td_etiqueta': 'padding:5px 12px;border:1px solid #ccc;text-align:left;font-size:12px;',
+        'fila_par': 'background:#f5f9ff;',
+        'fila_total': 'background:#dce6f1;',
+    },
+    'resumen': {
+        'tabla': 'border-collapse:collapse;font-size:14px;',
+        'cabecera_fila': 'background:#1f4e79;color:white;text-align:center;',
+        'th': 'padding:8px;border:1px solid #888;',
+        'th_etiqueta': 'padding:8px;border:1px solid #888;text-align:left;',
+        'td': 'padding:7px;border:1px solid #ddd;text-align:right;',
+        'td_etiqueta': 'padding:7px;border:1px solid #ddd;',
+        'fila_par': '',
+        'fila_total': 'background:#dce6f1;',
+    },
+}
+
+NEGRITA = 'font-weight:bold;'
+
+
+def _numero(valores: np.ndarray) -> np.ndarray:
+    return pd.to_numeric(valores, errors='coerce').astype(float)
+
+
+def _aplicar(patron: str, valores: np.ndarray) -> np.ndarray:
+    """Aplica patron.format a cada valor (ufunc de objetos, sin crear Series)."""
+    return np.frompyfunc(patron.format, 1, 1)(valores)
+
+
+def _tiempo(valores: np.ndarray, con_horas: bool) -> np.ndarray:
+    """Minutos como 'x min', 'x.x h' (si con_horas) o 'x.x d' según su magnitud."""
+    valores = _numero(valores)
+    magnitud = np.abs(valores)
+    dias = magnitud >= 1440
+    horas = (magnitud >= 60) & ~dias & con_horas
+    return np.select(
+        [np.isnan(valores), dias, horas],
+        [SIN_VALOR, _aplicar('{:.1f} d', valores / 1440), _aplicar('{:.1f} h', valores / 60)],
+        _aplicar('{:.0f} min', valores),
+    )
+
+
+def _sin_nulos(texto: np.ndarray, valores: np.ndarray) -> np.ndarray:
+    return np.where(np.isnan(valores), SIN_VALOR, texto)
+
+
+def _entero(valores: np.ndarray) -> np.ndarray:
+    # Como f'{int(v):,}': se trunca hacia cero (+ 0.0 evita el '-0')
+    valores = np.trunc(_numero(valores)) + 0.0
+    return _sin_nulos(_aplicar('{:,.0f}', valores), valores)
+
+
+def _porcentaje(valores: np.ndarray) -> np.ndarray:
+    valores = _numero(valores)
+    return _sin_nulos(_aplicar('{:.0f} %', valores), valores)
+
+
+def _texto(valores: np.ndarray) -> np.ndarray:
+    return np.where(pd.isna(valores), SIN_VALOR, _aplicar('{}', valores))
+
+
+# Formato de columna -> función vectorizada array -> array de texto
+FORMATOS = {
+    'texto': _texto,
+    'entero': _entero,
+    'tiempo': lambda valores: _tiempo(valores, con_horas=True),
+    'tiempo_dias': lambda valores: _tiempo(valores, con_horas=False),
+    'porcentaje': _porcentaje,
+}
+
+
+def _construir(df: pd.DataFrame, formatos: Dict[str, str], estilo: dict, total_ultima: bool,
+               negrita_total: Optional[Sequence[str]], ancho: str, cabecera: Optional[str]) -> str:
+    n = len(df)
+    posicion = np.arange(n)
+    es_total = (posicion == n - 1) & total_ultima
+    fondo = np.where(es_total, estilo['fila_total'], np.where(posicion % 2 == 0, estilo['fila_par'], '')).astype(object)
+
+    filas = np.full(n, '<tr>', dtype=object)
+    for j, columna in enumerate(df.columns):
+        texto = FORMATOS[formatos.get(columna, 'texto')](df[columna].to_numpy(dtype=object))
+        estilo_celda = (estilo['td_etiqueta'] if j == 0 else estilo['td']) + fondo
+        if negrita_total is None or columna in negrita_total:
+            estilo_celda = np.where(es_total, estilo_celda + NEGRITA, estilo_celda)
+        filas = filas + '<td style="' + estilo_celda + '">' + texto + '</td>'
+    filas = filas + '</tr>'
+
+    if cabecera is None:
+        celdas = [f'<th style="{estilo["th_etiqueta"] if j == 0 else estilo["th"]}">{columna}</th>'
+                  for j, columna in enumerate(df.columns)]
+        cabecera = f'<tr style="{estilo["cabecera_fila"]}">{"".join(celdas)}</tr>'
+
+    return ''.join([
+        f'<table style="{estilo["tabla"]}width:{ancho};">',
+        f'<thead>{cabecera}</thead><tbody>',
+        *filas,
+        '</tbody></table>',
+    ])
+
+
+def tabla_html(df: pd.DataFrame, formatos: Dict[str, str] = None, estilo: str = 'informe',
+               total_ultima: bool = True, negrita_total: Sequence[str] = None, ancho: str = '100%',
+               cabecera: str = None) -> str:
+    """
+    Tabla HTML de df para st.markdown(..., unsafe_allow_html=True).
+
+    La primera columna es la de etiquetas (alineada a la izquierda). formatos
+    asigna a cada columna uno de FORMATOS ('texto' si no se indica); los nombres
+    de columna forman la cabecera, salvo que se pase cabecera con las filas <tr>
+    propias (cabeceras agrupadas). Con total_ultima, la última fila es la de
+    totales: fondo destacado y negrita en las columnas de negrita_total (todas
+    si es None). Los textos de celdas y cabeceras se insertan sin escapar.
+    """
+    formatos = formatos or {}
+    clave = (
+        huella_dataframe(df), tuple(sorted(formatos.items())), estilo, total_ultima,
+        None if negrita_total is None else tuple(negrita_total), ancho, cabecera,
+    )
+    return memoizar(
+        'tabla_html', clave,
+        lambda: _construir(df, formatos, ESTILOS[estilo], total_ultima, negrita_total, ancho, cabecera),
+        max_entradas=64,
+    )
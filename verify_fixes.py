@@ -16,11 +16,6 @@ def test_loading():
     archivo_estados = os.path.join(datadir, '5-Cambio de estado de facturas.xlsx')
     
     print("--- Cargando datos ---")
-    # Mocking st.cache_data and st.error for the test
-    import streamlit as st
-    st.cache_data = lambda x: x
-    st.error = print
-    
     try:
         datos = cargar_datos(archivo_rcf, archivo_face, archivo_anulaciones, archivo_estados)
         df_rcf = datos['rcf']